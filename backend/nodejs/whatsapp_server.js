@@ -59,7 +59,8 @@ async function enviarParaPython(messageData) {
 
     if (response.ok) {
       const result = await response.json();
-      console.log(`🐍 Python: ${result.success ? 'Processado' : 'Erro'}`, 
+      const situacao = result.enfileirado ? 'Enfileirado' : 'Processado';
+      console.log(`🐍 Python: ${result.success ? situacao : 'Erro'}`, 
                   result.despesa_registrada ? '💰 Despesa criada' : '');
       return result;
     } else {
@@ -215,7 +216,8 @@ wppconnect
               filename: message.mediaData.filename || `arquivo_${Date.now()}.bin`,
               mimetype: message.mediaData.mimetype || 'application/octet-stream',
               url: message.mediaData.url || '',
-              size: message.mediaData.size || 0
+              size: message.mediaData.size || 0,
+              filehash: message.filehash || ''
             }
           }),
 
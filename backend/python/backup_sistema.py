@@ -1,111 +1,806 @@
 #!/usr/bin/env python3
 """
 Sistema de Backup para WhatsApp Manager
+
+Cada backup traz um manifesto com (caminho, tamanho, mtime, hash) de todos os
+arquivos dos clientes naquele momento e em qual backup está o conteúdo de
+cada um. O backup incremental só arquiva o que é novo ou mudou desde o
+anterior (arquivos com o mesmo tamanho e mtime nem são lidos), e conteúdos
+repetidos são guardados uma única vez. Mídias já comprimidas (JPEG, MP4,
+PDF...) entram sem recompressão.
+
+Os arquivos são lidos e resumidos (hash) num pool de threads, enquanto a
+thread principal grava no zip, em sequência e em blocos, os conteúdos ainda
+não guardados (a compressão roda nessa thread: o zipfile não aceita dados
+já comprimidos por outra). O pool fica no máximo BACKUP_MB_EM_MEMORIA à
+frente da gravação, então o arquivo ainda está no cache do sistema quando
+é relido para o zip.
+
+O repositório de blobs (PASTA_BLOBS) não entra no backup: todo blob
+referenciado é um hardlink (ou cópia) de um arquivo nas pastas dos contatos,
+que já está no backup. Após uma restauração os blobs voltam a ser criados
+conforme o mesmo conteúdo é recebido de novo.
+
+O catálogo (backup_catalogo.json, na pasta de backups) registra tamanho,
+data, quantidade de arquivos, base, backups necessários para restaurar e o
+SHA-256 de cada backup; listagem e retenção só leem o catálogo.
+
+Uso:
+    python backup_sistema.py criar | incremental | listar | verificar
+    python backup_sistema.py limpar [--dias 30]
+    python backup_sistema.py reter [--diarios 7] [--semanais 4] [--mensais 12]
+    python backup_sistema.py restaurar <backup ou AAAAMMDD_HHMMSS> [--destino PASTA]
+    python backup_sistema.py reconstruir-catalogo
 """
 
+import argparse
 import os
 import sqlite3
 import shutil
+import time
 import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import json
 from config import Config
+import calculo_hash
+
+PREFIXO_BACKUP = 'whatsapp_backup_'
+ARQUIVO_MANIFESTO = 'backup_manifest.json'
+ARQUIVO_CATALOGO = 'backup_catalogo.json'
+ARCO_BANCO = 'database/whatsapp_dados.db'
+ARCO_ENV = 'config/.env'
+
+# Formatos que já são comprimidos: deflate gasta CPU e não reduz o tamanho
+EXTENSOES_COMPRIMIDAS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic',
+    'mp4', 'mov', 'webm', 'mkv', '3gp',
+    'mp3', 'ogg', 'opus', 'm4a', 'aac',
+    'pdf', 'docx', 'xlsx', 'pptx', 'odt',
+    'zip', 'gz', 'bz2', 'xz', '7z', 'rar',
+}
+
+
+def momento_backup(backup: Path) -> datetime:
+    """Data do backup pelo nome (whatsapp_backup_[inc_]AAAAMMDD_HHMMSS.zip)"""
+    partes = backup.stem.split('_')
+    return datetime.strptime(partes[-2] + '_' + partes[-1], '%Y%m%d_%H%M%S')
+
+
+class _CopiaReiniciada(Exception):
+    """Escritas concorrentes reiniciaram a cópia do banco vezes demais"""
+
+
+def snapshot_banco(origem: str, destino: Path, paginas: int = 1024,
+                   pausa: float = 0.05, max_reinicios: int = 3) -> Dict:
+    """
+    Copia consistente do banco em uso, pela API de backup do SQLite
+
+    Copia `paginas` páginas por passo e dorme `pausa` segundos entre os
+    passos, sem nenhuma trava no banco, para não atrasar os escritores. A
+    pausa é feita só no callback de progresso: o `sleep` de
+    Connection.backup é outra coisa (espera antes de repetir um passo que
+    achou o banco ocupado) e fica no padrão do sqlite3.
+    Uma escrita de outra conexão reinicia a cópia; se isso acontecer mais de
+    `max_reinicios` vezes (carga alta), copia tudo num único passo: em modo
+    WAL ele só mantém um snapshot de leitura, e as escritas continuam.
+
+    Args:
+        origem: Arquivo do banco em uso
+        destino: Arquivo da cópia (substituído se existir)
+
+    Returns:
+        Dict com paginas, reinicios e segundos
+    """
+    inicio = time.time()
+    estado = {'restantes': None, 'reinicios': 0, 'paginas': 0, 'percentual': 0}
+
+    def _progresso(status, restantes, total):
+        if estado['restantes'] is not None and restantes > estado['restantes']:
+            estado['reinicios'] += 1
+            if estado['reinicios'] > max_reinicios:
+                raise _CopiaReiniciada()
+        estado['restantes'], estado['paginas'] = restantes, total
+
+        percentual = 100 * (total - restantes) // total if total else 100
+        if percentual >= estado['percentual'] + 10:
+            estado['percentual'] = percentual
+            print(f"   💾 Banco: {percentual}% de {total} páginas")
+        if restantes:
+            time.sleep(pausa)
+
+    if destino.exists():
+        destino.unlink()
+
+    fonte = sqlite3.connect(origem, timeout=Config.DB_TIMEOUT)
+    copia = sqlite3.connect(destino)
+    try:
+        try:
+            fonte.backup(copia, pages=paginas, progress=_progresso)
+        except _CopiaReiniciada:
+            print(f"   ⚠️ Cópia reiniciada {estado['reinicios']} vez(es) por escritas: copiando num único passo")
+            fonte.backup(copia, pages=-1)
+
+        # Cópia autossuficiente (sem -wal) e íntegra
+        copia.execute('PRAGMA journal_mode=DELETE')
+        resultado = copia.execute('PRAGMA quick_check').fetchone()[0]
+        if resultado != 'ok':
+            raise sqlite3.DatabaseError(f"Cópia do banco com problemas: {resultado}")
+    finally:
+        copia.close()
+        fonte.close()
+
+    return {'paginas': estado['paginas'], 'reinicios': estado['reinicios'],
+            'segundos': round(time.time() - inicio, 2)}
+
+
+def compressao_arquivo(caminho: str) -> int:
+    """ZIP_STORED para formatos já comprimidos, ZIP_DEFLATED para o resto"""
+    if os.path.splitext(caminho)[1].lower().lstrip('.') in EXTENSOES_COMPRIMIDAS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def preparar_arquivo(caminho: str, algoritmo: str) -> Dict:
+    """
+    Hash e tipo de compressão de um arquivo, sem guardar o conteúdo
+
+    Roda no pool de threads do backup (leitura e hash liberam o GIL); com o
+    hash, conteúdos já guardados nem chegam a ser relidos pela gravação.
+
+    Returns:
+        Dict com hash, tamanho e compressao
+    """
+    resumo = calculo_hash.hash_arquivo(caminho, algoritmo)
+    return {'hash': resumo['hash'], 'tamanho': resumo['bytes'],
+            'compressao': compressao_arquivo(caminho)}
+
+
+def gravar_arquivo(zipf: zipfile.ZipFile, arc_path: str, caminho: str, compressao: int,
+                   mtime_ns: int, algoritmo: str) -> Dict:
+    """
+    Grava um arquivo no zip em blocos (memória constante para qualquer tamanho)
+
+    O hash é recalculado sobre o que foi gravado: se o arquivo mudou depois de
+    preparar_arquivo, o manifesto registra o conteúdo que está no zip.
+
+    Returns:
+        Dict com hash e tamanho do conteúdo gravado
+    """
+    data = max(time.localtime(mtime_ns / 1e9)[:6], (1980, 1, 1, 0, 0, 0))
+    zinfo = zipfile.ZipInfo(arc_path, date_time=data)
+    zinfo.external_attr = 0o644 << 16
+    zinfo.compress_type = compressao
+    resumo = calculo_hash.novo_hash(algoritmo)
+    tamanho = 0
+
+    with open(caminho, 'rb') as origem:
+        zinfo.file_size = os.fstat(origem.fileno()).st_size
+        with zipf.open(zinfo, 'w') as destino:
+            while True:
+                bloco = origem.read(calculo_hash.TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                resumo.update(bloco)
+                destino.write(bloco)
+                tamanho += len(bloco)
+    return {'hash': resumo.hexdigest(), 'tamanho': tamanho}
+
 
 class BackupManager:
     def __init__(self):
         self.backup_dir = Path(Config.BACKUP_PATH)
         self.backup_dir.mkdir(exist_ok=True)
-    
+        self.pasta_raiz = Path(Config.PASTA_RAIZ)
+        self.arquivo_catalogo = self.backup_dir / ARQUIVO_CATALOGO
+
+    def catalogo(self) -> Dict[str, Dict]:
+        """
+        Backups registrados no catálogo (nome -> entrada)
+
+        Sem catálogo (primeira execução ou backups antigos), ele é
+        reconstruído a partir da pasta de backups.
+        """
+        try:
+            with open(self.arquivo_catalogo, encoding='utf-8') as f:
+                return json.load(f)['backups']
+        except FileNotFoundError:
+            return self.reconstruir_catalogo()
+
+    def _salvar_catalogo(self, backups: Dict[str, Dict]):
+        """Grava o catálogo num arquivo temporário e troca de uma vez (nunca fica pela metade)"""
+        temporario = self.arquivo_catalogo.with_name(ARQUIVO_CATALOGO + '.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'versao': 1, 'backups': backups}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.arquivo_catalogo)
+
+    def _entrada_catalogo(self, backup_file: Path, manifesto: Optional[Dict]) -> Dict:
+        """Entrada do catálogo de um backup já gravado (lê o arquivo uma vez para o SHA-256)"""
+        with zipfile.ZipFile(backup_file) as zipf:
+            entradas = len(zipf.filelist)
+        if manifesto:
+            necessarios = {entrada[3] for entrada in manifesto['arquivos'].values()}
+        else:
+            necessarios = set()
+        necessarios.add(backup_file.name)
+
+        return {
+            'nome': backup_file.name,
+            'tipo': manifesto['tipo'] if manifesto else 'completo',
+            'base': manifesto['base'] if manifesto else None,
+            'criado_em': momento_backup(backup_file).isoformat(),
+            'tamanho': backup_file.stat().st_size,
+            'entradas': entradas,
+            'arquivos': len(manifesto['arquivos']) if manifesto else None,
+            'manifesto': manifesto is not None,
+            'necessarios': sorted(necessarios),
+            'sha256': calculo_hash.hash_arquivo(str(backup_file), 'sha256')['hash']
+        }
+
+    def reconstruir_catalogo(self) -> Dict[str, Dict]:
+        """Refaz o catálogo lendo todos os backups da pasta (lento: lê cada arquivo)"""
+        backups = {}
+        for backup_file in self.backup_dir.glob(f"{PREFIXO_BACKUP}*.zip"):
+            try:
+                momento_backup(backup_file)
+                manifesto = self.ler_manifesto(backup_file)
+            except (ValueError, IndexError, zipfile.BadZipFile):
+                print(f"⚠️ Backup inválido ignorado: {backup_file.name}")
+                continue
+            backups[backup_file.name] = self._entrada_catalogo(backup_file, manifesto)
+
+        self._salvar_catalogo(backups)
+        print(f"📇 Catálogo reconstruído: {len(backups)} backup(s)")
+        return backups
+
+    @staticmethod
+    def _em_ordem(backups: Dict[str, Dict]) -> List[Dict]:
+        """Entradas do catálogo, da mais antiga para a mais recente"""
+        return sorted(backups.values(), key=lambda entrada: (entrada['criado_em'], entrada['nome']))
+
+    def backups(self) -> List[Path]:
+        """Backups existentes, do mais antigo para o mais recente"""
+        return [self.backup_dir / entrada['nome'] for entrada in self._em_ordem(self.catalogo())]
+
+    def backup_em(self, momento: datetime) -> Optional[Path]:
+        """Backup mais recente criado até o momento informado"""
+        anteriores = [entrada for entrada in self._em_ordem(self.catalogo())
+                      if entrada['criado_em'] <= momento.isoformat()]
+        return self.backup_dir / anteriores[-1]['nome'] if anteriores else None
+
+    @staticmethod
+    def ler_manifesto(backup_path: Path) -> Optional[Dict]:
+        """Manifesto do backup (None para backups antigos, sem manifesto)"""
+        with zipfile.ZipFile(backup_path) as zipf:
+            try:
+                return json.loads(zipf.read(ARQUIVO_MANIFESTO))
+            except KeyError:
+                return None
+
+    def _ultimo_manifesto(self) -> Optional[Dict]:
+        """Manifesto do backup mais recente que tenha um"""
+        for entrada in reversed(self._em_ordem(self.catalogo())):
+            if entrada['manifesto']:
+                return self.ler_manifesto(self.backup_dir / entrada['nome'])
+        return None
+
+    def _varrer_arquivos(self) -> Dict[str, Tuple[str, int, int]]:
+        """
+        Arquivos dos clientes: caminho no zip -> (caminho, tamanho, mtime em ns)
+
+        os.scandir traz o tipo de cada entrada junto com a listagem, então só
+        os arquivos precisam de stat.
+        """
+        arquivos = {}
+        if not self.pasta_raiz.exists():
+            return arquivos
+
+        inicio_relativo = len(str(self.pasta_raiz.parent).rstrip(os.sep)) + 1
+        pastas = [str(self.pasta_raiz)]
+        while pastas:
+            try:
+                entradas = os.scandir(pastas.pop())
+            except FileNotFoundError:
+                continue  # removida durante a varredura
+            with entradas:
+                for entrada in entradas:
+                    try:
+                        if entrada.is_dir(follow_symlinks=False):
+                            pastas.append(entrada.path)
+                            continue
+                        if not entrada.is_file():
+                            continue
+                        info = entrada.stat()
+                    except FileNotFoundError:
+                        continue  # removido durante a varredura
+                    arc_path = entrada.path[inicio_relativo:].replace(os.sep, '/')
+                    arquivos[arc_path] = (entrada.path, info.st_size, info.st_mtime_ns)
+        return arquivos
+
+    def _arquivar_clientes(self, zipf: zipfile.ZipFile, alterados: List[str],
+                           atuais: Dict[str, Tuple[str, int, int]], guardados: Dict[str, Tuple[str, str]],
+                           backup_name: str, algoritmo: str) -> Tuple[Dict[str, List], int, int]:
+        """
+        Prepara os arquivos no pool e grava no zip os conteúdos ainda não guardados
+
+        Os resultados são consumidos na ordem de envio, com no máximo
+        BACKUP_MB_EM_MEMORIA de arquivos já lidos pelo pool esperando a gravação.
+
+        Returns:
+            (entradas do manifesto dos arquivos alterados, arquivados, bytes arquivados)
+        """
+        entradas = {}
+        arquivados = 0
+        bytes_arquivados = 0
+        limite_bytes = Config.BACKUP_MB_EM_MEMORIA * 1024 * 1024
+        trabalhadores = max(1, Config.BACKUP_WORKERS)
+
+        pendentes = deque()
+        a_frente = 0
+
+        with ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix='backup') as pool:
+            def _gravar_proximo():
+                nonlocal a_frente, arquivados, bytes_arquivados
+                arc_path, futuro = pendentes.popleft()
+                file_path, tamanho, mtime = atuais[arc_path]
+                a_frente -= tamanho
+                try:
+                    preparado = futuro.result()
+                except OSError as e:
+                    print(f"⚠️ Arquivo ignorado ({e}): {file_path}")
+                    return
+
+                origem = guardados.get(preparado['hash'])
+                if origem is None:
+                    try:
+                        preparado = gravar_arquivo(zipf, arc_path, file_path, preparado['compressao'],
+                                                   mtime, algoritmo)
+                    except FileNotFoundError as e:
+                        print(f"⚠️ Arquivo ignorado ({e}): {file_path}")
+                        return
+                    origem = guardados[preparado['hash']] = (backup_name, arc_path)
+                    arquivados += 1
+                    bytes_arquivados += preparado['tamanho']
+                entradas[arc_path] = [preparado['tamanho'], mtime, preparado['hash'], *origem]
+
+            for arc_path in alterados:
+                while pendentes and (a_frente >= limite_bytes or len(pendentes) >= 4 * trabalhadores):
+                    _gravar_proximo()
+                file_path, tamanho, _ = atuais[arc_path]
+                pendentes.append((arc_path, pool.submit(preparar_arquivo, file_path, algoritmo)))
+                a_frente += tamanho
+
+            while pendentes:
+                _gravar_proximo()
+
+        return entradas, arquivados, bytes_arquivados
+
     def criar_backup_completo(self):
-        """Cria backup completo do sistema"""
+        """Cria backup completo do sistema (independente dos anteriores)"""
+        return self._criar_backup(incremental=False)
+
+    def criar_backup_incremental(self):
+        """
+        Cria backup só com os arquivos novos ou alterados desde o último backup
+
+        Sem backup anterior com manifesto, ou com a cadeia já com
+        BACKUP_INCREMENTAIS_MAX incrementais, cria um completo.
+        """
+        return self._criar_backup(incremental=True)
+
+    def _criar_backup(self, incremental: bool) -> Path:
+        algoritmo = Config.HASH_ALGORITMO
+        anterior = self._ultimo_manifesto() if incremental else None
+
+        if incremental:
+            if anterior is None or anterior.get('algoritmo') != algoritmo:
+                print("ℹ️ Nenhum backup anterior com manifesto compatível: criando backup completo")
+                incremental = False
+            elif anterior['cadeia'] >= Config.BACKUP_INCREMENTAIS_MAX:
+                print(f"ℹ️ Cadeia com {anterior['cadeia']} incrementais: criando backup completo")
+                incremental = False
+
+        registrados = self.catalogo()
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_name = f"whatsapp_backup_{timestamp}.zip"
-        backup_path = self.backup_dir / backup_name
-        
-        print(f"📦 Criando backup: {backup_name}")
-        
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Backup do banco de dados
-            if os.path.exists(Config.DATABASE_PATH):
-                zipf.write(Config.DATABASE_PATH, 'database/whatsapp_dados.db')
-                print("✅ Banco de dados incluído no backup")
-            
-            # Backup dos arquivos de clientes
-            pasta_raiz = Path(Config.PASTA_RAIZ)
-            if pasta_raiz.exists():
-                for root, dirs, files in os.walk(pasta_raiz):
-                    for file in files:
-                        file_path = Path(root) / file
-                        arc_path = file_path.relative_to(pasta_raiz.parent)
-                        zipf.write(file_path, arc_path)
-                print(f"✅ Arquivos de {pasta_raiz} incluídos no backup")
-            
-            # Backup das configurações
-            if os.path.exists('.env'):
-                zipf.write('.env', 'config/.env')
-            
-            # Metadados do backup
-            metadata = {
-                'timestamp': timestamp,
-                'version': '1.0',
-                'files_count': len(zipf.namelist()),
-                'created_by': 'WhatsApp Manager Backup System'
-            }
-            
-            zipf.writestr('backup_metadata.json', json.dumps(metadata, indent=2))
-        
+        while True:
+            backup_name = f"{PREFIXO_BACKUP}{'inc_' if incremental else ''}{timestamp}.zip"
+            backup_path = self.backup_dir / backup_name
+            if not any(nome.endswith(f"{timestamp}.zip") for nome in registrados):
+                break
+            # Dois backups no mesmo segundo teriam o mesmo momento
+            time.sleep(1)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        print(f"📦 Criando backup {'incremental' if incremental else 'completo'}: {backup_name}")
+
+        # Entrada do manifesto: [tamanho, mtime_ns, hash, backup com o conteúdo, caminho no zip]
+        anteriores = anterior['arquivos'] if incremental else {}
+        guardados = {entrada[2]: (entrada[3], entrada[4]) for entrada in anteriores.values()}
+
+        atuais = self._varrer_arquivos()
+        arquivos = {}
+        alterados = []
+        for arc_path, (file_path, tamanho, mtime) in atuais.items():
+            entrada = anteriores.get(arc_path)
+            if entrada and entrada[0] == tamanho and entrada[1] == mtime:
+                arquivos[arc_path] = entrada
+            else:
+                alterados.append(arc_path)
+
+        # Escrito com outro nome e renomeado no fim: um backup interrompido
+        # nunca é tomado como base do próximo incremental
+        temporario = backup_path.with_name(backup_name + '.tmp')
+        try:
+            with zipfile.ZipFile(temporario, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                # Backup do banco de dados: cópia consistente, com a API em funcionamento
+                if os.path.exists(Config.DATABASE_PATH):
+                    copia_banco = backup_path.with_name(backup_name + '.db.tmp')
+                    try:
+                        info = snapshot_banco(Config.DATABASE_PATH, copia_banco,
+                                              Config.BACKUP_PAGINAS_POR_PASSO, Config.BACKUP_PAUSA_PASSO)
+                        zipf.write(copia_banco, ARCO_BANCO)
+                    finally:
+                        copia_banco.unlink(missing_ok=True)
+                    print(f"✅ Banco de dados incluído no backup ({info['paginas']} páginas "
+                          f"em {info['segundos']}s, {info['reinicios']} reinício(s))")
+
+                # Backup dos arquivos de clientes (só conteúdos ainda não guardados)
+                inicio = time.time()
+                novos, arquivados, bytes_arquivados = self._arquivar_clientes(
+                    zipf, alterados, atuais, guardados, backup_name, algoritmo)
+                arquivos.update(novos)
+
+                if atuais:
+                    segundos = time.time() - inicio
+                    print(f"✅ Arquivos de {self.pasta_raiz}: {len(arquivos)} no manifesto, "
+                          f"{arquivados} arquivado(s) ({bytes_arquivados / 1024 / 1024:.2f} MB "
+                          f"em {segundos:.1f}s)")
+
+                # Backup das configurações
+                if os.path.exists('.env'):
+                    zipf.write('.env', ARCO_ENV)
+
+                manifesto = {
+                    'versao': 1,
+                    'nome': backup_name,
+                    'tipo': 'incremental' if incremental else 'completo',
+                    'base': anterior['nome'] if incremental else None,
+                    'cadeia': anterior['cadeia'] + 1 if incremental else 0,
+                    'timestamp': timestamp,
+                    'algoritmo': algoritmo,
+                    'arquivos': arquivos
+                }
+                zipf.writestr(ARQUIVO_MANIFESTO, json.dumps(manifesto, separators=(',', ':')))
+
+                # Metadados do backup
+                metadata = {
+                    'timestamp': timestamp,
+                    'version': '2.0',
+                    'tipo': manifesto['tipo'],
+                    'base': manifesto['base'],
+                    'files_count': len(zipf.filelist) + 1,  # + este arquivo
+                    'arquivos_manifesto': len(arquivos),
+                    'created_by': 'WhatsApp Manager Backup System'
+                }
+
+                zipf.writestr('backup_metadata.json', json.dumps(metadata, indent=2))
+        except BaseException:
+            temporario.unlink(missing_ok=True)
+            raise
+
+        os.replace(temporario, backup_path)
+        registrados[backup_name] = self._entrada_catalogo(backup_path, manifesto)
+        self._salvar_catalogo(registrados)
         print(f"✅ Backup criado com sucesso: {backup_path}")
         print(f"📊 Tamanho do arquivo: {backup_path.stat().st_size / 1024 / 1024:.2f} MB")
-        
+
         return backup_path
-    
+
+    @staticmethod
+    def _com_dependencias(backups: Dict[str, Dict], manter: Iterable[str]) -> Set[str]:
+        """Backups a manter mais todos aqueles de que dependem para serem restaurados"""
+        resultado: Set[str] = set()
+        pendentes = [nome for nome in manter if nome in backups]
+        while pendentes:
+            nome = pendentes.pop()
+            if nome in resultado:
+                continue
+            resultado.add(nome)
+            pendentes.extend(n for n in backups[nome]['necessarios'] if n in backups)
+        return resultado
+
+    def _remover_fora(self, backups: Dict[str, Dict], manter: Set[str]) -> List[str]:
+        """
+        Remove os backups fora de `manter` (com as dependências já incluídas)
+
+        O catálogo é gravado antes de apagar os arquivos: uma interrupção
+        deixa no máximo arquivos sobrando, nunca entradas sem arquivo.
+        """
+        remover = [entrada['nome'] for entrada in self._em_ordem(backups) if entrada['nome'] not in manter]
+        if not remover:
+            return remover
+
+        self._salvar_catalogo({nome: entrada for nome, entrada in backups.items() if nome in manter})
+        for nome in remover:
+            (self.backup_dir / nome).unlink(missing_ok=True)
+            print(f"🗑️ Backup antigo removido: {nome}")
+        return remover
+
     def limpar_backups_antigos(self, dias_manter=30):
-        """Remove backups mais antigos que X dias"""
-        cutoff_date = datetime.now() - timedelta(days=dias_manter)
-        
-        backups_removidos = 0
-        for backup_file in self.backup_dir.glob("whatsapp_backup_*.zip"):
-            # Extrair data do nome do arquivo
-            try:
-                timestamp_str = backup_file.stem.split('_')[-2] + '_' + backup_file.stem.split('_')[-1]
-                backup_date = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-                
-                if backup_date < cutoff_date:
-                    backup_file.unlink()
-                    backups_removidos += 1
-                    print(f"🗑️ Backup antigo removido: {backup_file.name}")
-            
-            except (ValueError, IndexError):
-                print(f"⚠️ Nome de backup inválido ignorado: {backup_file.name}")
-        
+        """
+        Remove backups mais antigos que X dias
+
+        Um backup antigo que ainda guarda conteúdo usado por um backup mantido
+        (a base de uma cadeia de incrementais) não é removido.
+        """
+        cutoff_date = (datetime.now() - timedelta(days=dias_manter)).isoformat()
+        backups = self.catalogo()
+
+        recentes = [nome for nome, entrada in backups.items() if entrada['criado_em'] >= cutoff_date]
+        manter = self._com_dependencias(backups, recentes)
+        for nome in sorted(manter - set(recentes)):
+            print(f"🔗 Backup antigo mantido (base de backups mais novos): {nome}")
+
+        backups_removidos = len(self._remover_fora(backups, manter))
+
         if backups_removidos == 0:
             print("ℹ️ Nenhum backup antigo encontrado para remoção")
         else:
             print(f"✅ {backups_removidos} backup(s) antigo(s) removido(s)")
-    
+
+    def aplicar_retencao(self, diarios: Optional[int] = None, semanais: Optional[int] = None,
+                         mensais: Optional[int] = None) -> Dict:
+        """
+        Retenção avô-pai-filho (GFS): mantém o backup mais recente de cada um
+        dos últimos dias, semanas e meses que têm backup
+
+        O backup mais recente (base do próximo incremental) e os backups de que
+        os mantidos dependem nunca são removidos.
+
+        Args:
+            diarios, semanais, mensais: Quantos períodos manter (padrão: BACKUP_RETER_*)
+
+        Returns:
+            Dict com mantidos e removidos (nomes)
+        """
+        politica = (
+            (Config.BACKUP_RETER_DIARIOS if diarios is None else diarios,
+             lambda data: data.date()),
+            (Config.BACKUP_RETER_SEMANAIS if semanais is None else semanais,
+             lambda data: data.isocalendar()[:2]),
+            (Config.BACKUP_RETER_MENSAIS if mensais is None else mensais,
+             lambda data: (data.year, data.month)),
+        )
+        backups = self.catalogo()
+        do_mais_novo = self._em_ordem(backups)[::-1]
+
+        escolhidos = set(entrada['nome'] for entrada in do_mais_novo[:1])
+        for quantidade, periodo_de in politica:
+            periodos = {}
+            for entrada in do_mais_novo:
+                periodo = periodo_de(datetime.fromisoformat(entrada['criado_em']))
+                if periodo not in periodos:
+                    if len(periodos) >= quantidade:
+                        break
+                    periodos[periodo] = entrada['nome']
+            escolhidos.update(periodos.values())
+
+        manter = self._com_dependencias(backups, escolhidos)
+        removidos = self._remover_fora(backups, manter)
+        print(f"✅ Retenção: {len(manter)} backup(s) mantido(s) "
+              f"({len(manter - escolhidos)} só como base), {len(removidos)} removido(s)")
+        return {'mantidos': sorted(manter), 'removidos': removidos}
+
     def listar_backups(self):
-        """Lista todos os backups disponíveis"""
-        backups = list(self.backup_dir.glob("whatsapp_backup_*.zip"))
-        backups.sort(reverse=True)  # Mais recentes primeiro
-        
+        """Lista todos os backups disponíveis (pelo catálogo, sem ler a pasta)"""
+        backups = self._em_ordem(self.catalogo())[::-1]  # Mais recentes primeiro
+
         print(f"📋 Backups disponíveis ({len(backups)}):")
         print("-" * 60)
-        
-        for backup in backups:
-            size_mb = backup.stat().st_size / 1024 / 1024
-            mod_time = datetime.fromtimestamp(backup.stat().st_mtime)
-            print(f"📦 {backup.name}")
-            print(f"   Tamanho: {size_mb:.2f} MB")
-            print(f"   Criado: {mod_time.strftime('%d/%m/%Y %H:%M:%S')}")
+
+        for entrada in backups:
+            print(f"📦 {entrada['nome']}")
+            print(f"   Tipo: {entrada['tipo']}" + (f" (base: {entrada['base']})" if entrada['base'] else ''))
+            print(f"   Tamanho: {entrada['tamanho'] / 1024 / 1024:.2f} MB")
+            print(f"   Criado: {datetime.fromisoformat(entrada['criado_em']).strftime('%d/%m/%Y %H:%M:%S')}")
+            if entrada['arquivos'] is not None:
+                print(f"   Arquivos: {entrada['arquivos']}")
             print()
-    
-    def restaurar_backup(self, backup_path):
-        """Restaura um backup (USE COM CUIDADO!)"""
+
+    @staticmethod
+    def _primeiro_corrompido(backup_file: Path) -> Optional[str]:
+        """Descomprime todas as entradas conferindo o CRC (None se tudo estiver certo)"""
+        try:
+            with zipfile.ZipFile(backup_file) as zipf:
+                return zipf.testzip()
+        except zipfile.BadZipFile as e:
+            return str(e)
+
+    def verificar_backups(self) -> List[str]:
+        """
+        Confere cada backup do catálogo com o SHA-256 registrado e relê
+        todas as entradas do zip (CRC de cada arquivo)
+
+        Returns:
+            Nomes dos backups ausentes ou alterados
+        """
+        problemas = []
+        entradas = self._em_ordem(self.catalogo())
+        # SHA-256 de todos os backups em paralelo (pool compartilhado do calculo_hash)
+        hashes = calculo_hash.hash_varios(
+            [str(self.backup_dir / entrada['nome']) for entrada in entradas
+             if (self.backup_dir / entrada['nome']).exists()], 'sha256')
+        for entrada in entradas:
+            backup_file = self.backup_dir / entrada['nome']
+            if str(backup_file) not in hashes:
+                print(f"❌ Ausente: {entrada['nome']}")
+                problemas.append(entrada['nome'])
+            elif hashes[str(backup_file)].get('hash') != entrada['sha256']:
+                print(f"❌ Conteúdo diferente do catálogo: {entrada['nome']}")
+                problemas.append(entrada['nome'])
+            elif (corrompido := self._primeiro_corrompido(backup_file)) is not None:
+                print(f"❌ Zip com entrada corrompida ({corrompido}): {entrada['nome']}")
+                problemas.append(entrada['nome'])
+            else:
+                print(f"✅ {entrada['nome']}")
+        return problemas
+
+    def _destino(self, arc_path: str, destino: Optional[Path]) -> Path:
+        """Onde restaurar um item do backup (na pasta de destino ou nos caminhos do sistema)"""
+        if Path(arc_path).is_absolute() or '..' in Path(arc_path).parts:
+            raise ValueError(f"Caminho inválido no backup: {arc_path}")
+        if destino is not None:
+            return destino / arc_path
+        if arc_path == ARCO_BANCO:
+            return Path(Config.DATABASE_PATH)
+        if arc_path == ARCO_ENV:
+            return Path('.env')
+        return self.pasta_raiz.parent / arc_path
+
+    @staticmethod
+    def _extrair(zipf: zipfile.ZipFile, arc_path: str, caminho: Path):
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        with zipf.open(arc_path) as origem, open(caminho, 'wb') as saida:
+            shutil.copyfileobj(origem, saida, 1024 * 1024)
+
+    def _restaurar_banco(self, zipf: zipfile.ZipFile, destino: Optional[Path]):
+        caminho = self._destino(ARCO_BANCO, destino)
+        if destino is None and caminho.exists():
+            # O banco atual (e o WAL, que não vale para o banco restaurado) fica ao lado
+            sufixo = f".antes_restauracao_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            for extra in ('', '-wal', '-shm'):
+                atual = Path(f"{caminho}{extra}")
+                if atual.exists():
+                    atual.rename(f"{atual}{sufixo}")
+            print(f"💾 Banco atual preservado com o sufixo {sufixo}")
+        self._extrair(zipf, ARCO_BANCO, caminho)
+
+        conn = sqlite3.connect(caminho)
+        try:
+            resultado = conn.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            conn.close()
+        print(f"✅ Banco de dados restaurado ({resultado})")
+
+    def restaurar_backup(self, backup_path, destino=None):
+        """
+        Restaura um backup (USE COM CUIDADO!)
+
+        Restaura o estado exato do momento do backup: o banco e as
+        configurações vêm dele, e cada arquivo de cliente vem do backup da
+        cadeia (completo + incrementais) indicado no manifesto. Sobre os
+        caminhos atuais, arquivos criados depois daquele momento não são
+        apagados; para um estado limpo, use uma pasta de destino vazia.
+
+        Args:
+            backup_path: Arquivo do backup (ou só o nome, na pasta de backups)
+            destino: Pasta onde restaurar (database/, arquivos_clientes/, config/);
+                     None restaura sobre os caminhos do sistema (com a API parada)
+        """
         backup_file = Path(backup_path)
-        
+        if not backup_file.exists() and (self.backup_dir / backup_file.name).exists():
+            backup_file = self.backup_dir / backup_file.name
+
         if not backup_file.exists():
             raise FileNotFoundError(f"Backup não encontrado: {backup_path}")
-        
+
+        destino = Path(destino) if destino else None
         print(f"🔄 Restaurando backup: {backup_file.name}")
-     
\ No newline at end of file
+
+        manifesto = self.ler_manifesto(backup_file)
+
+        with zipfile.ZipFile(backup_file) as zipf:
+            nomes = set(zipf.namelist())
+            if ARCO_BANCO in nomes:
+                self._restaurar_banco(zipf, destino)
+            if ARCO_ENV in nomes:
+                self._extrair(zipf, ARCO_ENV, self._destino(ARCO_ENV, destino))
+
+            if manifesto is None:
+                # Backup antigo: tudo está neste zip
+                itens = [n for n in nomes if n not in (ARCO_BANCO, ARCO_ENV, 'backup_metadata.json')
+                         and not n.endswith('/')]
+                for arc_path in itens:
+                    self._extrair(zipf, arc_path, self._destino(arc_path, destino))
+                print(f"✅ {len(itens)} arquivo(s) restaurado(s)")
+                return
+
+        # Arquivos agrupados pelo backup que guarda o conteúdo
+        por_backup: Dict[str, List[Tuple[str, List]]] = {}
+        for arc_path, entrada in manifesto['arquivos'].items():
+            por_backup.setdefault(entrada[3], []).append((arc_path, entrada))
+
+        faltando = [nome for nome in por_backup if not (backup_file.parent / nome).exists()]
+        if faltando:
+            raise FileNotFoundError(f"Backups da cadeia não encontrados: {', '.join(sorted(faltando))}")
+
+        restaurados = 0
+        for nome, itens in por_backup.items():
+            with zipfile.ZipFile(backup_file.parent / nome) as zipf:
+                for arc_path, (tamanho, mtime, _, _, arco_conteudo) in itens:
+                    caminho = self._destino(arc_path, destino)
+                    self._extrair(zipf, arco_conteudo, caminho)
+                    # Mesmo mtime do original: o próximo incremental não relê o arquivo
+                    os.utime(caminho, ns=(mtime, mtime))
+                    restaurados += 1
+            print(f"📂 {len(itens)} arquivo(s) de {nome}")
+
+        print(f"✅ Backup restaurado: {restaurados} arquivo(s) de {len(por_backup)} backup(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup do WhatsApp Manager")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('criar', help="Backup completo")
+    sub.add_parser('incremental', help="Só arquivos novos ou alterados desde o último backup")
+    sub.add_parser('listar', help="Lista os backups")
+    p = sub.add_parser('limpar', help="Remove backups antigos")
+    p.add_argument('--dias', type=int, default=30)
+    p = sub.add_parser('reter', help="Retenção diária/semanal/mensal (GFS)")
+    p.add_argument('--diarios', type=int)
+    p.add_argument('--semanais', type=int)
+    p.add_argument('--mensais', type=int)
+    sub.add_parser('verificar', help="Confere os backups com os checksums do catálogo")
+    sub.add_parser('reconstruir-catalogo', help="Refaz o catálogo a partir da pasta de backups")
+    p = sub.add_parser('restaurar', help="Restaura um backup (ou o estado num momento)")
+    p.add_argument('backup', help="Arquivo/nome do backup ou momento AAAAMMDD_HHMMSS")
+    p.add_argument('--destino', help="Pasta de destino (padrão: caminhos do sistema)")
+    args = parser.parse_args()
+
+    backup_manager = BackupManager()
+
+    if args.comando == 'criar':
+        backup_manager.criar_backup_completo()
+    elif args.comando == 'incremental':
+        backup_manager.criar_backup_incremental()
+    elif args.comando == 'listar':
+        backup_manager.listar_backups()
+    elif args.comando == 'limpar':
+        backup_manager.limpar_backups_antigos(args.dias)
+    elif args.comando == 'reter':
+        backup_manager.aplicar_retencao(args.diarios, args.semanais, args.mensais)
+    elif args.comando == 'verificar':
+        if backup_manager.verificar_backups():
+            raise SystemExit(1)
+    elif args.comando == 'reconstruir-catalogo':
+        backup_manager.reconstruir_catalogo()
+    elif args.comando == 'restaurar':
+        backup = args.backup
+        try:
+            momento = datetime.strptime(backup, '%Y%m%d_%H%M%S')
+        except ValueError:
+            momento = None
+        if momento is not None:
+            backup = backup_manager.backup_em(momento)
+            if backup is None:
+                raise SystemExit(f"❌ Nenhum backup até {momento:%d/%m/%Y %H:%M:%S}")
+        backup_manager.restaurar_backup(backup, args.destino)
+
+
+if __name__ == "__main__":
+    main()
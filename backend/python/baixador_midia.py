@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Download das mídias recebidas pelo webhook
+Sessão HTTP compartilhada (keep-alive), limite de downloads simultâneos por
+host, timeouts, novas tentativas com atraso exponencial e retomada de
+downloads interrompidos via cabeçalho Range
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from calculo_hash import novo_hash
+
+# Status HTTP que indicam falha temporária do servidor
+STATUS_TRANSITORIOS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ErroDownload(Exception):
+    """Falha definitiva ao baixar uma mídia"""
+
+
+class BaixadorMidia:
+    """
+    Baixa arquivos por uma única requests.Session compartilhada entre threads
+
+    - Conexões reaproveitadas (pool por host do urllib3)
+    - No máximo `conexoes_por_host` downloads simultâneos para o mesmo host
+    - Falhas de rede e status 429/5xx são repetidos com atraso exponencial;
+      o que já foi recebido fica em `<destino>.parcial` e a próxima tentativa
+      pede só o restante (Range + If-Range)
+    """
+
+    def __init__(self, conexoes_por_host: int = 8, timeout_conexao: float = 5.0,
+                 timeout_leitura: float = 30.0, tentativas: int = 3,
+                 atraso_base: float = 0.5, tamanho_bloco: int = 64 * 1024):
+        """
+        Args:
+            conexoes_por_host: Downloads simultâneos permitidos por host
+            timeout_conexao: Segundos para estabelecer a conexão
+            timeout_leitura: Segundos sem receber dados antes de desistir
+            tentativas: Número total de tentativas por arquivo
+            atraso_base: Espera antes da 2ª tentativa (dobra a cada falha)
+            tamanho_bloco: Bytes lidos do socket por iteração
+        """
+        self.conexoes_por_host = max(1, conexoes_por_host)
+        self.timeout = (timeout_conexao, timeout_leitura)
+        self.tentativas = max(1, tentativas)
+        self.atraso_base = atraso_base
+        self.tamanho_bloco = tamanho_bloco
+
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=16, pool_maxsize=self.conexoes_por_host)
+        self.sessao.mount('http://', adaptador)
+        self.sessao.mount('https://', adaptador)
+
+        self._limites: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._contadores = {'downloads': 0, 'bytes': 0, 'novas_tentativas': 0,
+                            'retomadas': 0, 'falhas': 0}
+
+    def _limite_host(self, url: str) -> threading.BoundedSemaphore:
+        """Semáforo do host da URL (criado no primeiro uso)"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            limite = self._limites.get(host)
+            if limite is None:
+                limite = self._limites[host] = threading.BoundedSemaphore(self.conexoes_por_host)
+            return limite
+
+    def _contar(self, **incrementos):
+        with self._lock:
+            for chave, valor in incrementos.items():
+                self._contadores[chave] += valor
+
+    def baixar(self, url: str, destino: str, algoritmo_hash: Optional[str] = None) -> Dict:
+        """
+        Baixa a URL para o caminho de destino
+
+        Args:
+            url: Endereço da mídia
+            destino: Caminho final do arquivo
+            algoritmo_hash: Se informado (ex.: 'sha256'), calcula o hash enquanto grava
+
+        Returns:
+            Dict com caminho, bytes, hash, tentativas e retomado
+
+        Raises:
+            ErroDownload: status definitivo (ex.: 404) ou tentativas esgotadas
+        """
+        parcial = destino + '.parcial'
+        validador = None  # ETag/Last-Modified da 1ª resposta, para o If-Range
+        retomado = False
+        resumo = None
+        ultimo_erro: Optional[Exception] = None
+
+        with self._limite_host(url):
+            for tentativa in range(1, self.tentativas + 1):
+                if tentativa > 1:
+                    self._contar(novas_tentativas=1)
+                    time.sleep(self._atraso(tentativa, ultimo_erro))
+
+                try:
+                    recebidos = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+                    cabecalhos = {}
+                    if recebidos and validador:
+                        cabecalhos['Range'] = f'bytes={recebidos}-'
+                        cabecalhos['If-Range'] = validador
+
+                    with self.sessao.get(url, headers=cabecalhos, stream=True,
+                                         timeout=self.timeout) as resposta:
+                        if resposta.status_code in STATUS_TRANSITORIOS:
+                            ultimo_erro = requests.HTTPError(
+                                f"{resposta.status_code} ao baixar {url}", response=resposta)
+                            continue
+                        if resposta.status_code >= 400:
+                            raise ErroDownload(f"{resposta.status_code} ao baixar {url}")
+
+                        validador = (resposta.headers.get('ETag')
+                                     or resposta.headers.get('Last-Modified') or validador)
+
+                        # 206 continua do ponto onde parou; 200 recomeça do zero
+                        continuar = resposta.status_code == 206 and recebidos > 0
+                        if continuar:
+                            retomado = True
+                            self._contar(retomadas=1)
+                        else:
+                            recebidos = 0
+                            resumo = novo_hash(algoritmo_hash) if algoritmo_hash else None
+
+                        esperado = resposta.headers.get('Content-Length')
+                        esperado = recebidos + int(esperado) if esperado else None
+
+                        with open(parcial, 'ab' if continuar else 'wb') as f:
+                            for bloco in resposta.iter_content(chunk_size=self.tamanho_bloco):
+                                f.write(bloco)
+                                if resumo is not None:
+                                    resumo.update(bloco)
+                                recebidos += len(bloco)
+
+                    if esperado is not None and recebidos < esperado:
+                        ultimo_erro = IOError(f"Download incompleto ({recebidos}/{esperado} bytes)")
+                        continue
+
+                    os.replace(parcial, destino)
+                    self._contar(downloads=1, bytes=recebidos)
+                    return {'caminho': destino, 'bytes': recebidos,
+                            'hash': resumo.hexdigest() if resumo is not None else None,
+                            'tentativas': tentativa, 'retomado': retomado}
+
+                except ErroDownload:
+                    self._descartar(parcial)
+                    self._contar(falhas=1)
+                    raise
+                except (requests.ConnectionError, requests.Timeout,
+                        requests.exceptions.ChunkedEncodingError) as e:
+                    ultimo_erro = e
+
+        self._descartar(parcial)
+        self._contar(falhas=1)
+        raise ErroDownload(f"Falha ao baixar {url} após {self.tentativas} tentativas: {ultimo_erro}")
+
+    def _atraso(self, tentativa: int, erro: Optional[Exception]) -> float:
+        """Espera antes da tentativa: Retry-After do servidor ou exponencial com jitter"""
+        resposta = getattr(erro, 'response', None)
+        if resposta is not None and resposta.headers.get('Retry-After', '').isdigit():
+            return min(float(resposta.headers['Retry-After']), 60.0)
+        atraso = self.atraso_base * (2 ** (tentativa - 2))
+        return atraso + random.uniform(0, atraso / 2)
+
+    @staticmethod
+    def _descartar(caminho: str):
+        try:
+            os.unlink(caminho)
+        except OSError:
+            pass
+
+    def baixar_varios(self, itens: Iterable[Tuple[str, str]],
+                      max_paralelo: int = 16) -> List[Union[Dict, Exception]]:
+        """
+        Baixa vários arquivos em paralelo (respeitando o limite por host)
+
+        Args:
+            itens: Pares (url, destino)
+            max_paralelo: Threads de download
+
+        Returns:
+            Lista na ordem dos itens, com o resultado de baixar() ou a exceção
+        """
+        def _um(item):
+            try:
+                return self.baixar(*item)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_paralelo) as executor:
+            return list(executor.map(_um, itens))
+
+    def estatisticas(self) -> Dict:
+        """Contadores acumulados de downloads"""
+        with self._lock:
+            return dict(self._contadores)
+
+    def fechar(self):
+        """Encerra as conexões mantidas pela sessão"""
+        self.sessao.close()
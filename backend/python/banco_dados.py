@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Camada de acesso ao banco SQLite do WhatsApp Manager
+Mantém conexões persistentes reutilizáveis entre requisições
+"""
+
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+# Perfis de armazenamento: PRAGMAs aplicados em cada conexão
+# journal_mode é persistente no arquivo e só é aplicado pelo escritor
+PERFIS_ARMAZENAMENTO: Dict[str, Dict[str, object]] = {
+    # Comportamento original do SQLite (rollback journal)
+    'padrao': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 30000,
+    },
+    # Leitores não bloqueiam o escritor e vice-versa
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negativo = KiB (64 MiB)
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def obter_perfil(nome: str, **ajustes) -> Dict[str, object]:
+    """
+    Retorna os PRAGMAs de um perfil de armazenamento
+
+    Args:
+        nome: Nome do perfil (ver PERFIS_ARMAZENAMENTO)
+        ajustes: PRAGMAs que substituem os valores do perfil (None é ignorado)
+
+    Returns:
+        Dicionário nome_pragma -> valor
+    """
+    if nome not in PERFIS_ARMAZENAMENTO:
+        raise ValueError(f"Perfil de armazenamento desconhecido: {nome}")
+
+    pragmas = dict(PERFIS_ARMAZENAMENTO[nome])
+    pragmas.update({chave: valor for chave, valor in ajustes.items() if valor is not None})
+    return pragmas
+
+
+def separar_pragmas(pragmas: Dict[str, object]) -> tuple:
+    """Separa o journal_mode (do arquivo) dos PRAGMAs de cada conexão"""
+    por_conexao = {nome: valor for nome, valor in pragmas.items() if nome != 'journal_mode'}
+    return pragmas.get('journal_mode'), por_conexao
+
+
+def versao_schema(conn: sqlite3.Connection) -> int:
+    """Versão do schema gravada no cabeçalho do banco (PRAGMA user_version)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def aplicar_migracoes(conn: sqlite3.Connection, migracoes: List[tuple]) -> List[int]:
+    """
+    Aplica, em ordem, as migrações mais novas que a versão atual do banco
+
+    Cada migração é uma tupla (versao, descricao, comandos), onde comandos é
+    uma lista de SQL e/ou funções ``f(conn)``. Deve ser chamada dentro de uma
+    transação (ex.: pelo escritor), para que a migração e o novo
+    user_version sejam gravados juntos.
+
+    Returns:
+        Lista das versões aplicadas
+    """
+    atual = versao_schema(conn)
+    aplicadas = []
+
+    for versao, descricao, comandos in sorted(migracoes, key=lambda m: m[0]):
+        if versao <= atual:
+            continue
+
+        for comando in comandos:
+            if callable(comando):
+                comando(conn)
+            else:
+                conn.execute(comando)
+
+        conn.execute(f'PRAGMA user_version = {int(versao)}')
+        aplicadas.append(versao)
+        print(f"🔧 Migração {versao} aplicada: {descricao}")
+
+    return aplicadas
+
+
+class PoolConexoes:
+    """
+    Pool de conexões SQLite persistentes e seguro entre threads
+
+    O servidor threaded do Flask cria uma thread por requisição, então uma
+    conexão por thread seria recriada a cada webhook. O pool mantém as
+    conexões abertas e as empresta a quem precisar, uma de cada vez.
+    """
+
+    def __init__(self, db_path: str, tamanho: int = 5, timeout: float = 30.0,
+                 pragmas: Optional[Dict[str, object]] = None):
+        """
+        Args:
+            db_path: Caminho do arquivo do banco
+            tamanho: Número máximo de conexões abertas
+            timeout: Segundos de espera por uma conexão livre (e por locks do SQLite)
+            pragmas: PRAGMAs aplicados uma única vez na abertura de cada conexão
+                     (journal_mode é ignorado; quem o aplica é o escritor)
+        """
+        self.db_path = db_path
+        self.tamanho = max(1, tamanho)
+        self.timeout = timeout
+        _, self.pragmas = separar_pragmas(dict(pragmas or {}))
+
+        self._livres: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._todas: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._fechado = False
+
+    def _criar_conexao(self) -> sqlite3.Connection:
+        """Abre uma nova conexão e aplica os PRAGMAs configurados"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        for nome, valor in self.pragmas.items():
+            conn.execute(f'PRAGMA {nome} = {valor}')
+        return conn
+
+    def _obter(self) -> sqlite3.Connection:
+        """Retira uma conexão livre ou abre uma nova se ainda houver espaço"""
+        if self._fechado:
+            raise RuntimeError("Pool de conexões já foi fechado")
+
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._todas) < self.tamanho:
+                conn = self._criar_conexao()
+                self._todas.append(conn)
+                return conn
+
+        try:
+            return self._livres.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Nenhuma conexão livre após {self.timeout}s") from None
+
+    def _devolver(self, conn: sqlite3.Connection):
+        """Devolve a conexão ao pool, descartando transações pendentes"""
+        if conn.in_transaction:
+            conn.rollback()
+
+        if self._fechado:
+            conn.close()
+        else:
+            self._livres.put(conn)
+
+    @contextmanager
+    def conexao(self) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão do pool (uso: ``with pool.conexao() as conn``)"""
+        conn = self._obter()
+        try:
+            yield conn
+        finally:
+            self._devolver(conn)
+
+    @contextmanager
+    def transacao(self) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão e faz commit ao final (ou rollback em caso de erro)"""
+        with self.conexao() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def fechar(self):
+        """Fecha todas as conexões abertas pelo pool"""
+        with self._lock:
+            self._fechado = True
+            self._todas = []
+
+        # Conexões ainda emprestadas são fechadas ao serem devolvidas
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class EscritorSerializado:
+    """
+    Thread única responsável por todas as escritas no banco
+
+    O SQLite aceita apenas um escritor por vez; em vez de deixar as threads
+    do Flask disputarem o lock (``database is locked``), as escritas entram
+    numa fila e são executadas em ordem por esta thread. Tarefas que chegam
+    juntas são agrupadas numa única transação (um único fsync), cada uma
+    isolada por SAVEPOINT para que a falha de uma não desfaça as outras.
+
+    No perfil 'wal' (synchronous=NORMAL) um COMMIT pode se perder numa queda
+    de energia; tarefas enviadas por executar_duravel fazem o lote inteiro
+    ser gravado com synchronous=FULL.
+    """
+
+    def __init__(self, db_path: str, pragmas: Optional[Dict[str, object]] = None,
+                 timeout: float = 30.0, max_lote: int = 64):
+        """
+        Args:
+            db_path: Caminho do arquivo do banco
+            pragmas: PRAGMAs do perfil de armazenamento (incluindo journal_mode)
+            timeout: Segundos de espera por locks do SQLite
+            max_lote: Máximo de tarefas agrupadas numa mesma transação
+        """
+        self.db_path = db_path
+        self.journal_mode, self.pragmas = separar_pragmas(dict(pragmas or {}))
+        self.timeout = timeout
+        self.max_lote = max(1, max_lote)
+        # Lotes duráveis só precisam de ajuste se o perfil não usa FULL/EXTRA
+        self._sincronismo_fraco = str(self.pragmas.get('synchronous', 'FULL')).upper() not in (
+            'FULL', 'EXTRA', '2', '3')
+
+        self._fila: "queue.Queue" = queue.Queue()
+        self._apos_commit_tarefa: List[Callable] = []
+        self._thread = threading.Thread(target=self._executar, name='escritor-sqlite', daemon=True)
+        self._thread.start()
+
+    def _abrir_conexao(self) -> sqlite3.Connection:
+        """Abre a conexão exclusiva do escritor em modo de transação manual"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+        if self.journal_mode:
+            conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        for nome, valor in self.pragmas.items():
+            conn.execute(f'PRAGMA {nome} = {valor}')
+        return conn
+
+    def executar(self, funcao: Callable, *args, **kwargs):
+        """
+        Executa ``funcao(conn, *args, **kwargs)`` na thread do escritor
+
+        Bloqueia até o commit e devolve o retorno da função (ou relança
+        a exceção gerada por ela).
+        """
+        if threading.current_thread() is self._thread:
+            # Chamada reentrante: já estamos dentro de uma transação
+            return funcao(self._conn, *args, **kwargs)
+
+        return self.enviar(funcao, *args, **kwargs).result()
+
+    def executar_duravel(self, funcao: Callable, *args, **kwargs):
+        """
+        Como executar, mas o COMMIT só retorna após o fsync do WAL
+        (synchronous=FULL no lote), sobrevivendo a uma queda de energia
+
+        Para gravações já confirmadas ao cliente (ex.: o 202 da fila de webhooks).
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("executar_duravel não pode ser chamado de dentro do escritor")
+
+        return self._agendar(funcao, args, kwargs, duravel=True).result()
+
+    def apos_commit(self, callback: Callable[[], None]):
+        """
+        Agenda ``callback()`` para depois do COMMIT da tarefa em execução
+
+        Útil para atualizar caches só com dados efetivamente gravados: se a
+        tarefa for desfeita, o callback é descartado. Fora do escritor, o
+        callback é executado na hora.
+        """
+        if threading.current_thread() is self._thread:
+            self._apos_commit_tarefa.append(callback)
+        else:
+            callback()
+
+    def enviar(self, funcao: Callable, *args, **kwargs) -> Future:
+        """Agenda uma escrita sem esperar o resultado"""
+        return self._agendar(funcao, args, kwargs, duravel=False)
+
+    def _agendar(self, funcao: Callable, args: tuple, kwargs: dict, duravel: bool) -> Future:
+        """Coloca a tarefa na fila do escritor"""
+        if not self._thread.is_alive():
+            raise RuntimeError("Escritor do banco não está em execução")
+
+        futuro: Future = Future()
+        self._fila.put((funcao, args, kwargs, futuro, duravel))
+        return futuro
+
+    def _executar(self):
+        """Laço principal da thread do escritor"""
+        self._conn = self._abrir_conexao()
+        parar = False
+
+        while not parar:
+            item = self._fila.get()
+            if item is None:
+                break
+
+            lote = [item]
+            while len(lote) < self.max_lote:
+                try:
+                    proximo = self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if proximo is None:
+                    parar = True
+                    break
+                lote.append(proximo)
+
+            try:
+                self._executar_lote(lote)
+            except Exception as e:
+                # Os futuros já foram resolvidos; a thread continua atendendo a fila
+                print(f"⚠️ Erro inesperado no escritor do banco: {e}")
+
+        self._conn.close()
+
+    def _executar_lote(self, lote: List[tuple]):
+        """
+        Executa um grupo de tarefas numa única transação
+
+        Todo futuro do lote é resolvido, mesmo se a transação inteira falhar
+        (SQLITE_FULL, IOERR, COMMIT recusado...): nesse caso as tarefas que
+        já tinham dado certo recebem o erro do lote, pois foram desfeitas.
+        """
+        conn = self._conn
+        resultados: Dict[int, tuple] = {}  # id(futuro) -> (resultado, erro)
+        callbacks: List[Callable] = []
+        erro_lote: Optional[BaseException] = None
+        # synchronous não pode mudar dentro de uma transação: ajusta antes do BEGIN
+        reforcar = self._sincronismo_fraco and any(item[4] for item in lote)
+
+        try:
+            if reforcar:
+                conn.execute('PRAGMA synchronous = FULL')
+            conn.execute('BEGIN IMMEDIATE')
+            for funcao, args, kwargs, futuro, _ in lote:
+                conn.execute('SAVEPOINT tarefa')
+                self._apos_commit_tarefa = []
+                try:
+                    resultado = funcao(conn, *args, **kwargs)
+                    conn.execute('RELEASE tarefa')
+                    resultados[id(futuro)] = (resultado, None)
+                    callbacks.extend(self._apos_commit_tarefa)
+                except BaseException as e:
+                    resultados[id(futuro)] = (None, e)
+                    if not self._desfazer_tarefa(conn):
+                        # O SQLite já desfez a transação inteira
+                        erro_lote = e
+                        break
+            if erro_lote is None:
+                conn.execute('COMMIT')
+        except BaseException as e:
+            # BEGIN, SAVEPOINT, RELEASE ou COMMIT falhou
+            erro_lote = e
+        finally:
+            if erro_lote is not None:
+                self._desfazer_transacao(conn)
+                callbacks = []
+            if reforcar:
+                self._restaurar_sincronismo(conn)
+
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"⚠️ Erro em callback pós-commit: {e}")
+
+            # Só libera quem espera depois que os dados estão gravados (ou desfeitos)
+            for _, _, _, futuro, _ in lote:
+                resultado, erro = resultados.get(id(futuro), (None, None))
+                if erro is None and erro_lote is not None:
+                    erro = erro_lote
+                if erro is not None:
+                    futuro.set_exception(erro)
+                else:
+                    futuro.set_result(resultado)
+
+    def _restaurar_sincronismo(self, conn: sqlite3.Connection):
+        """Volta o synchronous do perfil após um lote durável"""
+        try:
+            conn.execute(f"PRAGMA synchronous = {self.pragmas['synchronous']}")
+        except sqlite3.Error as e:
+            print(f"⚠️ Erro ao restaurar o synchronous do escritor: {e}")
+
+    @staticmethod
+    def _desfazer_tarefa(conn: sqlite3.Connection) -> bool:
+        """Desfaz o SAVEPOINT da tarefa que falhou; False se a transação não existe mais"""
+        if not conn.in_transaction:
+            return False
+        try:
+            conn.execute('ROLLBACK TO tarefa')
+            conn.execute('RELEASE tarefa')
+            return True
+        except sqlite3.Error:
+            return False
+
+    @staticmethod
+    def _desfazer_transacao(conn: sqlite3.Connection):
+        """ROLLBACK do lote, se ainda houver transação aberta"""
+        if not conn.in_transaction:
+            return
+        try:
+            conn.execute('ROLLBACK')
+        except sqlite3.Error as e:
+            print(f"⚠️ Erro ao desfazer o lote de escritas: {e}")
+
+    def fechar(self, timeout: Optional[float] = None):
+        """Processa as escritas pendentes e encerra a thread"""
+        if self._thread.is_alive():
+            self._fila.put(None)
+            self._thread.join(timeout)
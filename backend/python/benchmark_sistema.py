@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do WhatsApp Manager
+Mede o desempenho dos caminhos críticos usando bancos e pastas temporárias
+
+Uso:
+    python benchmark_sistema.py leitura-escrita [--segundos 10]
+    python benchmark_sistema.py indices [--mensagens 1000000]
+    python benchmark_sistema.py midia [--imagens 100]
+    python benchmark_sistema.py hash [--tamanho-mb 50]
+    python benchmark_sistema.py despesas [--mensagens 1000000]
+    python benchmark_sistema.py backup [--arquivos 10000]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from config import Config
+
+
+def _percentis(amostras: List[float]) -> Dict[str, float]:
+    """Resume latências (em segundos) como p50/p95/p99/máximo em milissegundos"""
+    if not amostras:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+
+    ordenadas = sorted(amostras)
+
+    def _p(fracao: float) -> float:
+        return ordenadas[min(len(ordenadas) - 1, int(fracao * len(ordenadas)))] * 1000
+
+    return {'p50': _p(0.50), 'p95': _p(0.95), 'p99': _p(0.99), 'max': ordenadas[-1] * 1000}
+
+
+def _silencioso():
+    """Descarta os prints por mensagem do sistema durante a medição"""
+    return contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+
+def _criar_manager(pasta: Path, perfil: str = 'wal'):
+    """Cria um WhatsAppManager isolado numa pasta temporária"""
+    from whatsapp_manager import WhatsAppManager
+
+    Config.DATABASE_PATH = str(pasta / 'benchmark.db')
+    with _silencioso():
+        return WhatsAppManager(pasta_raiz=str(pasta / 'arquivos'), perfil_banco=perfil)
+
+
+def benchmark_leitura_escrita(segundos: float = 10.0, leitores: int = 4, escritores: int = 4):
+    """
+    Latência de leitura do dashboard enquanto webhooks escrevem no banco
+
+    Compara o perfil 'padrao' (rollback journal) com o perfil 'wal'.
+    """
+    print(f"📊 Leituras com escritas em andamento ({segundos:.0f}s, "
+          f"{leitores} leitores, {escritores} escritores)")
+    print("-" * 60)
+
+    for perfil in ('padrao', 'wal'):
+        with tempfile.TemporaryDirectory() as tmp:
+            wpp = _criar_manager(Path(tmp), perfil)
+            parar = threading.Event()
+            latencias: List[float] = []
+            escritas = [0]
+            erros = [0]
+            lock = threading.Lock()
+
+            def escrever(indice: int):
+                n = 0
+                while not parar.is_set():
+                    try:
+                        wpp.processar_mensagem_texto(f"55119{indice:04d}{n % 50:04d}",
+                                                     f"Almoço R$ {n % 90 + 10},00", "Bench")
+                        with lock:
+                            escritas[0] += 1
+                    except Exception:
+                        with lock:
+                            erros[0] += 1
+                    n += 1
+
+            def ler(indice: int):
+                n = 0
+                while not parar.is_set():
+                    inicio = time.perf_counter()
+                    try:
+                        if n % 2:
+                            wpp.obter_estatisticas()
+                        else:
+                            wpp.listar_mensagens_contato(f"55119{indice:04d}{n % 50:04d}")
+                        with lock:
+                            latencias.append(time.perf_counter() - inicio)
+                    except Exception:
+                        with lock:
+                            erros[0] += 1
+                    n += 1
+
+            threads = [threading.Thread(target=escrever, args=(i,)) for i in range(escritores)]
+            threads += [threading.Thread(target=ler, args=(i,)) for i in range(leitores)]
+
+            with _silencioso():
+                for t in threads:
+                    t.start()
+                time.sleep(segundos)
+                parar.set()
+                for t in threads:
+                    t.join()
+
+            wpp.fechar()
+
+            p = _percentis(latencias)
+            print(f"🗄️ Perfil '{perfil}':")
+            print(f"   Escritas: {escritas[0] / segundos:.0f}/s | Leituras: {len(latencias) / segundos:.0f}/s "
+                  f"| Erros: {erros[0]}")
+            print(f"   Latência de leitura: p50={p['p50']:.2f}ms p95={p['p95']:.2f}ms "
+                  f"p99={p['p99']:.2f}ms max={p['max']:.2f}ms")
+            if latencias:
+                print(f"   Média: {statistics.mean(latencias) * 1000:.2f}ms")
+            print()
+
+
+def _medir(funcao, repeticoes: int) -> Dict[str, float]:
+    """Executa a função várias vezes e devolve os percentis de latência"""
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append(time.perf_counter() - inicio)
+    return _percentis(amostras)
+
+
+def _popular_banco(wpp, total_mensagens: int, total_contatos: int):
+    """Insere contatos, mensagens e despesas sintéticos direto pelo escritor"""
+    aleatorio = random.Random(42)
+
+    def _inserir(conn):
+        conn.executemany(
+            'INSERT INTO contatos (telefone, nome, pasta_contato, ultimo_contato) '
+            'VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
+            ((f"11{i:09d}", f"Contato {i}", '') for i in range(total_contatos))
+        )
+
+        def _mensagens():
+            for i in range(total_mensagens):
+                contato = aleatorio.randrange(total_contatos)
+                yield (contato + 1, f"11{contato:09d}", 'texto', f"Mensagem {i}", i)
+
+        conn.executemany(
+            "INSERT INTO mensagens (contato_id, telefone, tipo_mensagem, conteudo_texto, "
+            "data_recebimento) VALUES (?, ?, ?, ?, datetime('2024-01-01', '+' || ? || ' seconds'))",
+            _mensagens()
+        )
+
+        # Uma despesa a cada 5 mensagens; só uma pequena parte continua pendente
+        conn.execute('''
+            INSERT INTO despesas (mensagem_id, contato_id, tipo_despesa, valor, categoria,
+                                  data_despesa, data_registro, status)
+            SELECT id, contato_id, 'texto_com_valor', (id % 500) + 0.5, 'outros',
+                   date(data_recebimento), data_recebimento,
+                   CASE WHEN id % 500 = 0 THEN 'pendente' ELSE 'aprovado' END
+            FROM mensagens WHERE id % 5 = 0
+        ''')
+
+    wpp.escritor.executar(_inserir)
+
+
+def benchmark_indices(total_mensagens: int = 1_000_000, total_contatos: int = 10_000,
+                      repeticoes: int = 20):
+    """
+    Latência das consultas do dashboard sem e com os índices das migrações
+    """
+    print(f"📊 Índices: {total_mensagens:,} mensagens, {total_contatos:,} contatos")
+    print("-" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wpp = _criar_manager(Path(tmp))
+
+        inicio = time.perf_counter()
+        _popular_banco(wpp, total_mensagens, total_contatos)
+        print(f"📥 Banco populado em {time.perf_counter() - inicio:.1f}s")
+
+        aleatorio = random.Random(7)
+        consultas = {
+            'listar_mensagens_contato': lambda: wpp.listar_mensagens_contato(
+                f"11{aleatorio.randrange(total_contatos):09d}"),
+            'listar_despesas_pendentes': wpp.listar_despesas_pendentes,
+            'despesas_pendentes (página)': lambda: wpp.listar_despesas_pendentes(limite=100),
+            'obter_estatisticas': wpp.obter_estatisticas,
+        }
+
+        def _rodar(rotulo: str) -> Dict[str, Dict[str, float]]:
+            resultados = {nome: _medir(funcao, repeticoes) for nome, funcao in consultas.items()}
+            print(f"\n🔎 {rotulo}:")
+            for nome, p in resultados.items():
+                print(f"   {nome:28s} p50={p['p50']:9.2f}ms p95={p['p95']:9.2f}ms")
+            return resultados
+
+        # Remove os índices das migrações para medir o cenário antigo (as
+        # migrações não são reaplicadas: algumas alteram colunas)
+        def _remover_indices(conn) -> List[str]:
+            indices = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall()
+            for nome, _ in indices:
+                conn.execute(f'DROP INDEX {nome}')
+            return [sql for _, sql in indices]
+
+        def _recriar_indices(conn, comandos: List[str]):
+            for comando in comandos:
+                conn.execute(comando)
+
+        comandos_indices = wpp.escritor.executar(_remover_indices)
+        sem_indices = _rodar("Sem índices")
+
+        inicio = time.perf_counter()
+        wpp.escritor.executar(_recriar_indices, comandos_indices)
+        print(f"\n🔧 {len(comandos_indices)} índices recriados em {time.perf_counter() - inicio:.1f}s")
+        com_indices = _rodar("Com índices")
+
+        print("\n🚀 Ganho (p50):")
+        for nome in consultas:
+            antes, depois = sem_indices[nome]['p50'], com_indices[nome]['p50']
+            print(f"   {nome:28s} {antes / depois if depois else float('inf'):8.1f}x")
+
+        wpp.fechar()
+
+
+class _ServidorMidia(BaseHTTPRequestHandler):
+    """
+    Servidor HTTP local que imita o CDN de mídias
+    GET /imagem/<n> devolve `tamanho` bytes após `latencia` segundos;
+    GET /video/<n> interrompe a 1ª resposta na metade para testar a retomada
+    """
+    protocol_version = 'HTTP/1.1'
+    conteudo = b''
+    latencia = 0.0
+    interrompidos: set = set()
+    conexoes: set = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            self.conexoes.add(self.client_address)
+
+        time.sleep(self.latencia)
+        inicio = 0
+        intervalo = self.headers.get('Range')
+        if intervalo and self.headers.get('If-Range') == '"bench"':
+            inicio = int(intervalo.split('=')[1].split('-')[0])
+
+        corpo = self.conteudo[inicio:]
+        self.send_response(206 if inicio else 200)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.send_header('ETag', '"bench"')
+        if inicio:
+            self.send_header('Content-Range', f'bytes {inicio}-{len(self.conteudo) - 1}/{len(self.conteudo)}')
+        self.end_headers()
+
+        with self.lock:
+            interromper = self.path.startswith('/video/') and self.path not in self.interrompidos
+            if interromper:
+                self.interrompidos.add(self.path)
+
+        if interromper:
+            self.wfile.write(corpo[:len(corpo) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(corpo)
+
+
+class _ServidorHTTP(ThreadingHTTPServer):
+    """ThreadingHTTPServer com fila de conexões maior e sem log de desconexões"""
+    request_queue_size = 256
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def benchmark_midia(total_imagens: int = 100, tamanho_kb: int = 200, latencia_ms: float = 20.0,
+                    paralelo: int = 100, conexoes_por_host: Tuple[int, ...] = (8, 32)):
+    """
+    Vazão de download de mídias contra um servidor HTTP local
+
+    Compara requests.get avulso (sem sessão, uma conexão nova por arquivo)
+    com o BaixadorMidia (sessão compartilhada e limite por host) para cada
+    limite informado, e confere a retomada de um download interrompido.
+    """
+    import requests
+    from baixador_midia import BaixadorMidia
+
+    _ServidorMidia.conteudo = os.urandom(tamanho_kb * 1024)
+    _ServidorMidia.latencia = latencia_ms / 1000
+    servidor = _ServidorHTTP(('127.0.0.1', 0), _ServidorMidia)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+    print(f"📊 Download de {total_imagens} imagens de {tamanho_kb} KB "
+          f"({paralelo} mensagens simultâneas, latência {latencia_ms:.0f}ms)")
+    print("-" * 60)
+
+    def _rodar(rotulo: str, prefixo: str, baixar_um, threads: int = paralelo) -> float:
+        _ServidorMidia.conexoes = set()
+        latencias: List[float] = []
+
+        def _medido(indice: int):
+            inicio = time.perf_counter()
+            baixar_um(f"{base}/imagem/{indice}", str(Path(tmp) / f"{prefixo}_{indice}.jpg"))
+            latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(_medido, range(total_imagens)))
+        duracao = time.perf_counter() - inicio
+
+        p = _percentis(latencias)
+        megabytes = total_imagens * tamanho_kb / 1024
+        print(f"📥 {rotulo}:")
+        print(f"   {total_imagens / duracao:.0f} imagens/s | {megabytes / duracao:.1f} MB/s "
+              f"| conexões TCP: {len(_ServidorMidia.conexoes)}")
+        print(f"   Latência por imagem: p50={p['p50']:.1f}ms p95={p['p95']:.1f}ms max={p['max']:.1f}ms")
+        return duracao
+
+    def _requests_avulso(url: str, destino: str):
+        resposta = requests.get(url, stream=True)
+        resposta.raise_for_status()
+        with open(destino, 'wb') as f:
+            for chunk in resposta.iter_content(chunk_size=8192):
+                f.write(chunk)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cenário antigo: um download por vez, cada um com conexão nova
+        sequencial = _rodar("requests.get avulso, um por vez", 'sequencial', _requests_avulso, 1)
+        _rodar("requests.get avulso, sem limite", 'avulso', _requests_avulso)
+
+        for limite in conexoes_por_host:
+            baixador = BaixadorMidia(conexoes_por_host=limite)
+            duracao = _rodar(f"BaixadorMidia, {limite} conexões/host", f'baixador{limite}', baixador.baixar)
+            print(f"   Ganho sobre o cenário antigo: {sequencial / duracao:.1f}x")
+            baixador.fechar()
+
+        baixador = BaixadorMidia()
+        destino = str(Path(tmp) / 'video.mp4')
+        resultado = baixador.baixar(f"{base}/video/1", destino)
+        integro = Path(destino).read_bytes() == _ServidorMidia.conteudo
+        print(f"\n🎬 Download interrompido na metade: {resultado['tentativas']} tentativas, "
+              f"retomado={resultado['retomado']}, arquivo íntegro={integro}")
+        print(f"   Estatísticas: {baixador.estatisticas()}")
+
+        baixador.fechar()
+
+    servidor.shutdown()
+
+
+def benchmark_hash(tamanho_mb: int = 50, arquivos: int = 8):
+    """
+    Vazão do cálculo de hash: implementação antiga (MD5 em blocos de 4 KB)
+    contra readinto de 1 MiB, mmap e o pool de threads, por algoritmo
+    """
+    import hashlib
+    import calculo_hash
+
+    print(f"📊 Hash de arquivos de {tamanho_mb} MB "
+          f"(algoritmos: {', '.join(calculo_hash.algoritmos_disponiveis())})")
+    print("-" * 60)
+
+    def _antigo(caminho: str) -> str:
+        hash_md5 = hashlib.md5()
+        with open(caminho, "rb") as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_md5.update(chunk)
+        return hash_md5.hexdigest()
+
+    def _medir_uma(funcao) -> float:
+        inicio = time.perf_counter()
+        funcao()
+        return time.perf_counter() - inicio
+
+    def _vazao(funcao, total_mb: float, repeticoes: int = 3) -> float:
+        """MB/s da melhor de algumas execuções"""
+        return total_mb / min(_medir_uma(funcao) for _ in range(repeticoes))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminhos = []
+        for indice in range(arquivos):
+            caminho = str(Path(tmp) / f"video_{indice}.mp4")
+            with open(caminho, 'wb') as f:
+                for _ in range(tamanho_mb):
+                    f.write(os.urandom(1024 * 1024))
+            caminhos.append(caminho)
+        video = caminhos[0]
+
+        print(f"🐢 Antigo (md5, read de 4 KB): {_vazao(lambda: _antigo(video), tamanho_mb):8.0f} MB/s")
+
+        for algoritmo in calculo_hash.algoritmos_disponiveis():
+            leitura = _vazao(lambda: calculo_hash.hash_arquivo(video, algoritmo, limite_mmap=0), tamanho_mb)
+            mapeado = _vazao(lambda: calculo_hash.hash_arquivo(video, algoritmo), tamanho_mb)
+            rotulo = f"{algoritmo}{'*' if algoritmo in calculo_hash.NAO_CRIPTOGRAFICOS else ''}"
+            print(f"⚡ {rotulo:10s} readinto 1 MiB: {leitura:8.0f} MB/s | mmap: {mapeado:8.0f} MB/s")
+
+        if calculo_hash.NAO_CRIPTOGRAFICOS & set(calculo_hash.algoritmos_disponiveis()):
+            print("   * não criptográfico: só para deduplicação")
+
+        # O ganho do pool depende do número de núcleos (os.cpu_count())
+        total_mb = tamanho_mb * arquivos
+        for algoritmo in ('md5', 'sha256'):
+            sequencial = _vazao(lambda: [calculo_hash.hash_arquivo(c, algoritmo) for c in caminhos],
+                                total_mb, 1)
+            paralelo = _vazao(lambda: calculo_hash.hash_varios(caminhos, algoritmo), total_mb, 1)
+            print(f"🧵 {algoritmo:10s} {arquivos} arquivos: sequencial {sequencial:8.0f} MB/s | "
+                  f"pool de threads {paralelo:8.0f} MB/s ({paralelo / sequencial:.1f}x)")
+
+
+def _mensagens_exemplo(total: int) -> List[str]:
+    """Textos e legendas típicos (com e sem acentos, valores e categorias)"""
+    trechos = [
+        'Almoço no restaurante R$ 45,90', 'Gasolina no posto 200', 'Uber até o aeroporto 32,50',
+        'Reunião amanhã às 10h', 'Compra de material R$1.234,56 e frete 30', 'Hotel diária 350,00',
+        'Serviço de manutenção do ar', 'Bom dia! Tudo bem?', 'Passagem de ÔNIBUS 12,00',
+        'segue o comprovante', 'ok', 'ALMOCO com cliente', 'pedagio 8,40 e estacionamento 15',
+    ]
+    palavras = ['pagamento', 'nota', 'fiscal', 'reembolso', 'cliente', 'amanhã',
+                'valor', 'total', 'café', 'obrigado', 'pix', 'projeto']
+    aleatorio = random.Random(42)
+    return [' '.join(aleatorio.sample(trechos, aleatorio.randint(0, 2))
+                     + aleatorio.sample(palavras, aleatorio.randint(1, 6)))
+            for _ in range(total)]
+
+
+def benchmark_despesas(total_mensagens: int = 1_000_000):
+    """
+    Vazão da extração de despesas: implementação antiga (upper/lower e um
+    `in` por palavra-chave) contra o extrator pré-compilado, com conferência
+    de que ambos chegam ao mesmo valor e categoria
+    """
+    import re
+    import extrator_despesas
+
+    def _antigo(texto: str):
+        valores = re.findall(r'R?\$?\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)', texto.upper())
+        categoria_detectada = 'outros'
+        for categoria, palavras_chave in extrator_despesas.CATEGORIAS_PADRAO.items():
+            if any(palavra in texto.lower() for palavra in palavras_chave):
+                categoria_detectada = categoria
+                break
+        valor = float(valores[0].replace('.', '').replace(',', '.')) if valores else None
+        return valor, categoria_detectada
+
+    print(f"📊 Extração de despesas em {total_mensagens} mensagens")
+    print("-" * 60)
+    mensagens = _mensagens_exemplo(total_mensagens)
+    extrator = extrator_despesas.ExtratorDespesas()
+
+    inicio = time.perf_counter()
+    antigos = [_antigo(texto) for texto in mensagens]
+    tempo_antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    novos = extrator.extrair_varios(mensagens)
+    tempo_novo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for texto in mensagens:
+        extrator.categoria(texto)
+    tempo_categoria = time.perf_counter() - inicio
+
+    divergentes = sum(1 for antigo, novo in zip(antigos, novos)
+                      if antigo != (novo['valor'], novo['categoria']))
+
+    print(f"🐢 Antigo:       {tempo_antigo:6.2f}s ({total_mensagens / tempo_antigo:8.0f} msg/s)")
+    print(f"⚡ Extrator:     {tempo_novo:6.2f}s ({total_mensagens / tempo_novo:8.0f} msg/s, "
+          f"{tempo_antigo / tempo_novo:.1f}x; todos os valores com posição)")
+    print(f"⚡ Só categoria: {tempo_categoria:6.2f}s ({total_mensagens / tempo_categoria:8.0f} msg/s)")
+    print(f"{'✅' if not divergentes else '❌'} Resultados divergentes: {divergentes}")
+
+
+def benchmark_backup(total_arquivos: int = 10_000, tamanho_kb: int = 64, trabalhadores: List[int] = None):
+    """
+    Backup de uma árvore sintética de contatos: implementação antiga (os.walk
+    e zipf.write com deflate em tudo, numa thread) contra o pipeline atual
+    (os.scandir, pool que lê e resume, gravação sequencial no zip)
+    """
+    import zipfile
+    import backup_sistema
+
+    trabalhadores = trabalhadores or sorted({1, os.cpu_count() or 1})
+    aleatorio = random.Random(42)
+    texto = ' '.join(_mensagens_exemplo(2000)).encode()
+
+    def _antigo(pasta_raiz: Path, destino: Path):
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for root, dirs, files in os.walk(pasta_raiz):
+                for file in files:
+                    file_path = Path(root) / file
+                    zipf.write(file_path, file_path.relative_to(pasta_raiz.parent))
+            len(zipf.namelist())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta_raiz = Path(tmp) / 'arquivos_clientes'
+        total_bytes = 0
+        # ~40% mídias (incompressíveis), o resto documentos e textos
+        for indice in range(total_arquivos):
+            pasta = pasta_raiz / f"1199{indice % 500:07d}" / ('imagens' if indice % 5 < 2 else 'documentos')
+            pasta.mkdir(parents=True, exist_ok=True)
+            tamanho = aleatorio.randint(1, tamanho_kb * 2) * 1024 // 2
+            if indice % 5 < 2:
+                conteudo, nome = os.urandom(tamanho), f"foto_{indice}.jpg"
+            else:
+                inicio = aleatorio.randrange(len(texto))
+                conteudo = (texto[inicio:] + texto)[:tamanho]
+                nome = f"doc_{indice}.txt"
+            (pasta / nome).write_bytes(conteudo)
+            total_bytes += len(conteudo)
+        total_mb = total_bytes / 1024 / 1024
+
+        print(f"📊 Backup de {total_arquivos} arquivos ({total_mb:.0f} MB, {os.cpu_count()} núcleo(s))")
+        print("-" * 60)
+
+        destino = Path(tmp) / 'antigo.zip'
+        inicio = time.perf_counter()
+        _antigo(pasta_raiz, destino)
+        tempo_antigo = time.perf_counter() - inicio
+        print(f"🐢 Antigo (os.walk + zipf.write): {tempo_antigo:6.2f}s ({total_mb / tempo_antigo:6.1f} MB/s, "
+              f"zip {destino.stat().st_size / 1024 / 1024:.0f} MB)")
+
+        Config.PASTA_RAIZ = str(pasta_raiz)
+        Config.DATABASE_PATH = str(Path(tmp) / 'inexistente.db')
+        for quantidade in trabalhadores:
+            Config.BACKUP_PATH = str(Path(tmp) / f"backups_{quantidade}")
+            Config.BACKUP_WORKERS = quantidade
+            with _silencioso():
+                inicio = time.perf_counter()
+                zip_novo = backup_sistema.BackupManager().criar_backup_completo()
+                tempo = time.perf_counter() - inicio
+            print(f"⚡ Pipeline, {quantidade:2d} thread(s):       {tempo:6.2f}s ({total_mb / tempo:6.1f} MB/s, "
+                  f"{tempo_antigo / tempo:.1f}x, zip {zip_novo.stat().st_size / 1024 / 1024:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do WhatsApp Manager")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('leitura-escrita', help="Latência de leitura com escritas concorrentes")
+    p.add_argument('--segundos', type=float, default=10.0)
+    p.add_argument('--leitores', type=int, default=4)
+    p.add_argument('--escritores', type=int, default=4)
+
+    p = sub.add_parser('indices', help="Consultas do dashboard sem e com índices")
+    p.add_argument('--mensagens', type=int, default=1_000_000)
+    p.add_argument('--contatos', type=int, default=10_000)
+    p.add_argument('--repeticoes', type=int, default=20)
+
+    p = sub.add_parser('midia', help="Vazão de download de mídias (servidor HTTP local)")
+    p.add_argument('--imagens', type=int, default=100)
+    p.add_argument('--tamanho-kb', type=int, default=200)
+    p.add_argument('--latencia-ms', type=float, default=20.0)
+    p.add_argument('--paralelo', type=int, default=100)
+    p.add_argument('--conexoes-por-host', type=int, nargs='+', default=[8, 32])
+
+    p = sub.add_parser('hash', help="Vazão do cálculo de hash por algoritmo e modo de leitura")
+    p.add_argument('--tamanho-mb', type=int, default=50)
+    p.add_argument('--arquivos', type=int, default=8)
+
+    p = sub.add_parser('despesas', help="Vazão da extração de valores e categorias de despesa")
+    p.add_argument('--mensagens', type=int, default=1_000_000)
+
+    p = sub.add_parser('backup', help="Backup dos arquivos: antigo contra o pipeline paralelo")
+    p.add_argument('--arquivos', type=int, default=10_000)
+    p.add_argument('--tamanho-kb', type=int, default=64, help="Tamanho médio dos arquivos")
+    p.add_argument('--threads', type=int, nargs='+', help="Quantidades de threads (padrão: 1 e núcleos)")
+
+    args = parser.parse_args()
+
+    if args.comando == 'leitura-escrita':
+        benchmark_leitura_escrita(args.segundos, args.leitores, args.escritores)
+    elif args.comando == 'indices':
+        benchmark_indices(args.mensagens, args.contatos, args.repeticoes)
+    elif args.comando == 'midia':
+        benchmark_midia(args.imagens, args.tamanho_kb, args.latencia_ms, args.paralelo,
+                        tuple(args.conexoes_por_host))
+    elif args.comando == 'hash':
+        benchmark_hash(args.tamanho_mb, args.arquivos)
+    elif args.comando == 'despesas':
+        benchmark_despesas(args.mensagens)
+    elif args.comando == 'backup':
+        benchmark_backup(args.arquivos, args.tamanho_kb, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Cache em memória dos contatos do WhatsApp Manager
+Evita consultar o banco a cada mensagem de um contato já conhecido
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class CacheContatos:
+    """
+    Cache LRU com expiração (TTL) de telefone -> (contato_id, pasta_contato, nome)
+
+    Seguro entre threads. A expiração garante que alterações feitas fora do
+    processo (ex.: migração de pastas) sejam vistas depois de no máximo TTL
+    segundos.
+    """
+
+    def __init__(self, tamanho_maximo: int = 10000, ttl: float = 300.0):
+        """
+        Args:
+            tamanho_maximo: Número máximo de contatos mantidos em memória
+            ttl: Segundos até uma entrada expirar (0 = nunca expira)
+        """
+        self.tamanho_maximo = max(1, tamanho_maximo)
+        self.ttl = ttl
+
+        self._entradas: "OrderedDict[str, Tuple[float, Tuple[int, str, Optional[str]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, telefone: str) -> Optional[Tuple[int, str, Optional[str]]]:
+        """Retorna (contato_id, pasta_contato, nome) ou None se ausente/expirado"""
+        with self._lock:
+            entrada = self._entradas.get(telefone)
+
+            if entrada is not None and self.ttl and time.monotonic() - entrada[0] > self.ttl:
+                del self._entradas[telefone]
+                entrada = None
+
+            if entrada is None:
+                self.falhas += 1
+                return None
+
+            self._entradas.move_to_end(telefone)
+            self.acertos += 1
+            return entrada[1]
+
+    def guardar(self, telefone: str, contato_id: int, pasta_contato: str, nome: Optional[str]):
+        """Insere ou atualiza um contato, descartando o menos usado se necessário"""
+        with self._lock:
+            self._entradas[telefone] = (time.monotonic(), (contato_id, pasta_contato, nome))
+            self._entradas.move_to_end(telefone)
+
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+    def remover(self, telefone: Optional[str] = None):
+        """Remove um contato do cache (ou todos, se telefone for None)"""
+        with self._lock:
+            if telefone is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(telefone, None)
+
+    def estatisticas(self) -> Dict:
+        """Contadores de uso do cache"""
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'tamanho': len(self._entradas),
+                'tamanho_maximo': self.tamanho_maximo,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else 0.0
+            }
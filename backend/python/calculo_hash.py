@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Cálculo de hash de arquivos do WhatsApp Manager
+Leitura em blocos grandes num buffer reaproveitado (readinto), mmap para
+arquivos grandes e pool de threads: o hashlib libera o GIL durante o
+cálculo, então vários arquivos são processados em paralelo
+"""
+
+import hashlib
+import mmap
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Bytes lidos por chamada de readinto
+TAMANHO_BLOCO = 1024 * 1024
+
+# A partir deste tamanho o arquivo é mapeado em memória em vez de lido
+LIMITE_MMAP = 8 * 1024 * 1024
+
+# Algoritmos criptográficos (integridade e deduplicação segura) e
+# não criptográficos (só deduplicação, muito mais rápidos)
+_CONSTRUTORES = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+}
+if blake3 is not None:
+    _CONSTRUTORES['blake3'] = blake3.blake3
+if xxhash is not None:
+    _CONSTRUTORES['xxh3_128'] = xxhash.xxh3_128
+    _CONSTRUTORES['xxh64'] = xxhash.xxh64
+
+NAO_CRIPTOGRAFICOS = {'xxh3_128', 'xxh64'}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock_executor = threading.Lock()
+
+
+def algoritmos_disponiveis() -> List[str]:
+    """Algoritmos suportados nesta instalação (blake3/xxhash são opcionais)"""
+    return sorted(_CONSTRUTORES)
+
+
+def novo_hash(algoritmo: str = 'sha256'):
+    """
+    Cria o objeto de hash (interface update/hexdigest do hashlib)
+
+    Raises:
+        ValueError: algoritmo desconhecido ou pacote opcional não instalado
+    """
+    construtor = _CONSTRUTORES.get(algoritmo)
+    if construtor is None:
+        raise ValueError(f"Algoritmo de hash indisponível: {algoritmo} "
+                         f"(disponíveis: {', '.join(algoritmos_disponiveis())})")
+    return construtor()
+
+
+def hash_arquivo(caminho: str, algoritmo: str = 'sha256',
+                 tamanho_bloco: int = TAMANHO_BLOCO, limite_mmap: int = LIMITE_MMAP) -> Dict:
+    """
+    Calcula o hash de um arquivo
+
+    Args:
+        caminho: Arquivo a ser lido
+        algoritmo: Nome do algoritmo (ver algoritmos_disponiveis)
+        tamanho_bloco: Bytes por leitura (arquivos abaixo de limite_mmap)
+        limite_mmap: Tamanho a partir do qual o arquivo é mapeado em memória
+
+    Returns:
+        Dict com hash (hexadecimal) e bytes lidos
+    """
+    resumo = novo_hash(algoritmo)
+
+    with open(caminho, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+
+        if limite_mmap and tamanho >= limite_mmap:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                # Uma única chamada: o hashlib solta o GIL durante todo o cálculo
+                resumo.update(mapa)
+            return {'hash': resumo.hexdigest(), 'bytes': tamanho}
+
+        buffer = bytearray(tamanho_bloco)
+        visao = memoryview(buffer)
+        total = 0
+        while True:
+            lidos = f.readinto(buffer)
+            if not lidos:
+                break
+            resumo.update(visao[:lidos])
+            total += lidos
+
+    return {'hash': resumo.hexdigest(), 'bytes': total}
+
+
+def copiar_com_hash(origem: str, destino: str, algoritmo: str = 'sha256',
+                    tamanho_bloco: int = TAMANHO_BLOCO) -> Dict:
+    """
+    Copia um arquivo calculando o hash na mesma leitura
+
+    Returns:
+        Dict com hash (hexadecimal) e bytes copiados
+    """
+    resumo = novo_hash(algoritmo)
+    buffer = bytearray(tamanho_bloco)
+    visao = memoryview(buffer)
+    total = 0
+
+    with open(origem, 'rb') as entrada, open(destino, 'wb') as saida:
+        while True:
+            lidos = entrada.readinto(buffer)
+            if not lidos:
+                break
+            bloco = visao[:lidos]
+            resumo.update(bloco)
+            saida.write(bloco)
+            total += lidos
+
+    return {'hash': resumo.hexdigest(), 'bytes': total}
+
+
+def _pool() -> ThreadPoolExecutor:
+    """Pool de threads compartilhado (criado no primeiro uso)"""
+    global _executor
+    if _executor is None:
+        with _lock_executor:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 2),
+                                               thread_name_prefix='hash')
+    return _executor
+
+
+def hash_arquivo_async(caminho: str, algoritmo: str = 'sha256') -> Future:
+    """Agenda o cálculo no pool de threads; o resultado é o dict de hash_arquivo"""
+    return _pool().submit(hash_arquivo, caminho, algoritmo)
+
+
+def hash_varios(caminhos: Iterable[str], algoritmo: str = 'sha256') -> Dict[str, Dict]:
+    """
+    Calcula o hash de vários arquivos em paralelo
+
+    Returns:
+        Dict caminho -> resultado de hash_arquivo (ou {'erro': ...} se falhar)
+    """
+    futuros = {caminho: hash_arquivo_async(caminho, algoritmo) for caminho in caminhos}
+    resultados = {}
+    for caminho, futuro in futuros.items():
+        try:
+            resultados[caminho] = futuro.result()
+        except OSError as e:
+            resultados[caminho] = {'erro': str(e)}
+    return resultados
@@ -38,6 +38,19 @@ class Config:
         else:
             BACKUP_PATH = custom_backup
     
+    # Repositório de blobs (None = pasta 'blobs' ao lado da PASTA_RAIZ, no mesmo disco)
+    PASTA_BLOBS = None
+    if os.getenv('PASTA_BLOBS'):
+        custom_blobs = os.getenv('PASTA_BLOBS')
+        if not os.path.isabs(custom_blobs):
+            PASTA_BLOBS = str(BASE_DIR / custom_blobs)
+        else:
+            PASTA_BLOBS = custom_blobs
+    
+    # Pastas de contatos: 'plano' (PASTA_RAIZ/<telefone>_<nome>) ou 'fragmentado'
+    # (PASTA_RAIZ/ab/cd/<telefone>_<nome>); para mudar use layout_pastas.py
+    LAYOUT_PASTAS = os.getenv('LAYOUT_PASTAS', 'plano')
+    
     # API
     WEBHOOK_TOKEN = os.getenv('WEBHOOK_TOKEN', 'desenvolvimento')
     SECRET_KEY = os.getenv('SECRET_KEY', 'chave-desenvolvimento-nao-usar-em-producao')
@@ -45,6 +58,41 @@ class Config:
     API_PORT = int(os.getenv('API_PORT', 5000))
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
     
+    # Banco de dados
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+    DB_TIMEOUT = float(os.getenv('DB_TIMEOUT', 30))
+    DB_PERFIL = os.getenv('DB_PERFIL', 'wal')  # 'wal' ou 'padrao'
+    # Ajustes opcionais sobre o perfil (vazio = valor do perfil)
+    DB_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT')) if os.getenv('DB_BUSY_TIMEOUT') else None
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE')) if os.getenv('DB_MMAP_SIZE') else None
+    DB_CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE')) if os.getenv('DB_CACHE_SIZE') else None
+    
+    # Cache de contatos em memória
+    CACHE_CONTATOS_TAMANHO = int(os.getenv('CACHE_CONTATOS_TAMANHO', 10000))
+    CACHE_CONTATOS_TTL = float(os.getenv('CACHE_CONTATOS_TTL', 300))  # segundos
+    ULTIMO_CONTATO_INTERVALO = float(os.getenv('ULTIMO_CONTATO_INTERVALO', 5))  # segundos
+    
+    # Fila de webhooks (processamento em segundo plano)
+    WEBHOOK_ASSINCRONO = os.getenv('WEBHOOK_ASSINCRONO', 'True').lower() == 'true'
+    FILA_WORKERS = int(os.getenv('FILA_WORKERS', 4))
+    FILA_MAX_TENTATIVAS = int(os.getenv('FILA_MAX_TENTATIVAS', 5))
+    FILA_ATRASO_BASE = float(os.getenv('FILA_ATRASO_BASE', 2))  # segundos, dobra a cada falha
+    FILA_RETENCAO_HORAS = float(os.getenv('FILA_RETENCAO_HORAS', 24))
+    
+    # Hash dos arquivos: sha256 (padrão), blake2b, blake3 ou xxh3_128 (estes dois
+    # exigem os pacotes opcionais); defina antes de armazenar os primeiros arquivos
+    HASH_ALGORITMO = os.getenv('HASH_ALGORITMO', 'sha256')
+    
+    # Download de mídias
+    MIDIA_CONEXOES_POR_HOST = int(os.getenv('MIDIA_CONEXOES_POR_HOST', 8))
+    MIDIA_TIMEOUT_CONEXAO = float(os.getenv('MIDIA_TIMEOUT_CONEXAO', 5))  # segundos
+    MIDIA_TIMEOUT_LEITURA = float(os.getenv('MIDIA_TIMEOUT_LEITURA', 30))  # segundos sem dados
+    MIDIA_TENTATIVAS = int(os.getenv('MIDIA_TENTATIVAS', 3))
+    
+    # Intervalo entre verificações da versão das categorias de despesa no banco
+    # (alterações feitas por outro processo valem em até este tempo)
+    CATEGORIAS_VERIFICAR_SEGUNDOS = float(os.getenv('CATEGORIAS_VERIFICAR_SEGUNDOS', 5))
+
     # Limites de arquivo
     MAX_FILE_SIZE = os.getenv('MAX_FILE_SIZE', '50MB')
     ALLOWED_EXTENSIONS = set(os.getenv('ALLOWED_EXTENSIONS', 'jpg,jpeg,png,pdf,doc,docx,mp3,mp4,wav').split(','))
@@ -52,7 +100,21 @@ class Config:
     # Backup
     BACKUP_INTERVAL = os.getenv('BACKUP_INTERVAL', '24h')
     AUTO_BACKUP = os.getenv('AUTO_BACKUP', 'True').lower() == 'true'
-    
+    # Incrementais seguidos antes de um novo backup completo (cadeias curtas
+    # restauram mais rápido e perdem menos se um backup da cadeia se corromper)
+    BACKUP_INCREMENTAIS_MAX = int(os.getenv('BACKUP_INCREMENTAIS_MAX', 6))
+    # Cópia do banco em uso: páginas por passo e pausa (s) entre passos
+    BACKUP_PAGINAS_POR_PASSO = int(os.getenv('BACKUP_PAGINAS_POR_PASSO', 1024))
+    BACKUP_PAUSA_PASSO = float(os.getenv('BACKUP_PAUSA_PASSO', 0.05))
+    # Threads que leem e calculam o hash dos arquivos e limite de MB que essa
+    # leitura pode ficar à frente da gravação no zip
+    BACKUP_WORKERS = int(os.getenv('BACKUP_WORKERS', os.cpu_count() or 2))
+    BACKUP_MB_EM_MEMORIA = int(os.getenv('BACKUP_MB_EM_MEMORIA', 256))
+    # Retenção GFS (python backup_sistema.py reter): períodos mantidos de cada tipo
+    BACKUP_RETER_DIARIOS = int(os.getenv('BACKUP_RETER_DIARIOS', 7))
+    BACKUP_RETER_SEMANAIS = int(os.getenv('BACKUP_RETER_SEMANAIS', 4))
+    BACKUP_RETER_MENSAIS = int(os.getenv('BACKUP_RETER_MENSAIS', 12))
+
     @staticmethod
     def init_app(app):
         """Inicializa configurações no Flask"""
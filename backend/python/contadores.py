@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Contadores das estatísticas do WhatsApp Manager
+A tabela `estatisticas` guarda totais mantidos por triggers (contatos,
+mensagens por tipo, despesas por status e o repositório de blobs), então o
+/health e o /estatisticas leem poucas linhas em vez de varrer as tabelas.
+A tabela `contato_resumo` faz o mesmo por contato para o /contatos.
+
+As referências de cada blob (vínculos distintos nas pastas dos contatos)
+também são mantidas por triggers.
+
+Reconciliação (recalcula tudo do zero e mostra as diferenças) e coleta dos
+blobs que ninguém mais referencia:
+    python contadores.py [--coletar-blobs]
+"""
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import calculo_hash
+from config import Config
+
+# Chaves: 'contatos', 'mensagens', 'mensagens:<tipo>', 'despesas',
+# 'despesas:<status>', 'blobs', 'blobs:bytes' e 'blobs:economizados'
+TABELA = '''
+CREATE TABLE IF NOT EXISTS estatisticas (
+    chave TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID
+'''
+
+
+def _somar(*pares: str) -> str:
+    """UPSERT que soma cada par (chave, incremento), ambos expressões SQL"""
+    valores = ', '.join(f'({chave}, {incremento})' for chave, incremento in zip(pares[::2], pares[1::2]))
+    return (f"INSERT INTO estatisticas (chave, valor) VALUES {valores} "
+            f"ON CONFLICT(chave) DO UPDATE SET valor = valor + excluded.valor;")
+
+
+TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_contatos_inserir AFTER INSERT ON contatos BEGIN
+        {_somar("'contatos'", '1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_contatos_remover AFTER DELETE ON contatos BEGIN
+        {_somar("'contatos'", '-1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_mensagens_inserir AFTER INSERT ON mensagens BEGIN
+        {_somar("'mensagens'", '1', "'mensagens:' || NEW.tipo_mensagem", '1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_mensagens_remover AFTER DELETE ON mensagens BEGIN
+        {_somar("'mensagens'", '-1', "'mensagens:' || OLD.tipo_mensagem", '-1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_mensagens_tipo AFTER UPDATE OF tipo_mensagem ON mensagens
+    WHEN OLD.tipo_mensagem IS NOT NEW.tipo_mensagem BEGIN
+        {_somar("'mensagens:' || OLD.tipo_mensagem", '-1', "'mensagens:' || NEW.tipo_mensagem", '1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_despesas_inserir AFTER INSERT ON despesas BEGIN
+        {_somar("'despesas'", '1', "'despesas:' || IFNULL(NEW.status, '')", '1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_despesas_remover AFTER DELETE ON despesas BEGIN
+        {_somar("'despesas'", '-1', "'despesas:' || IFNULL(OLD.status, '')", '-1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_despesas_status AFTER UPDATE OF status ON despesas
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        {_somar("'despesas:' || IFNULL(OLD.status, '')", '-1', "'despesas:' || IFNULL(NEW.status, '')", '1')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_blobs_inserir AFTER INSERT ON blobs BEGIN
+        {_somar("'blobs'", '1', "'blobs:bytes'", 'IFNULL(NEW.tamanho, 0)',
+                "'blobs:economizados'", '(NEW.referencias - 1) * IFNULL(NEW.tamanho, 0)')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_blobs_remover AFTER DELETE ON blobs BEGIN
+        {_somar("'blobs'", '-1', "'blobs:bytes'", '-IFNULL(OLD.tamanho, 0)',
+                "'blobs:economizados'", '-(OLD.referencias - 1) * IFNULL(OLD.tamanho, 0)')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_blobs_atualizar AFTER UPDATE OF referencias, tamanho ON blobs BEGIN
+        {_somar("'blobs:bytes'", 'IFNULL(NEW.tamanho, 0) - IFNULL(OLD.tamanho, 0)',
+                "'blobs:economizados'", '(NEW.referencias - 1) * IFNULL(NEW.tamanho, 0)'
+                                        ' - (OLD.referencias - 1) * IFNULL(OLD.tamanho, 0)')}
+    END
+    ''',
+]
+
+# Referências de cada blob: uma por vínculo distinto (caminho na pasta de um
+# contato). Mensagens que reaproveitam o mesmo arquivo não somam de novo.
+_OUTRO_VINCULO = '''
+    EXISTS (SELECT 1 FROM mensagens WHERE hash_arquivo = {linha}.hash_arquivo
+            AND caminho_arquivo IS {linha}.caminho_arquivo{exceto})
+'''
+_VINCULAR = f'''
+        INSERT INTO blobs (hash, tamanho, referencias)
+        SELECT NEW.hash_arquivo, NEW.tamanho_arquivo, 1
+        WHERE NEW.hash_arquivo IS NOT NULL
+          AND NOT {_OUTRO_VINCULO.format(linha='NEW', exceto=' AND id <> NEW.id')}
+        ON CONFLICT(hash) DO UPDATE SET referencias = referencias + 1;
+'''
+_DESVINCULAR = f'''
+        UPDATE blobs SET referencias = referencias - 1
+        WHERE hash = OLD.hash_arquivo
+          AND NOT {_OUTRO_VINCULO.format(linha='OLD', exceto='')};
+'''
+
+TRIGGERS_BLOBS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_blobs_vincular AFTER INSERT ON mensagens
+    WHEN NEW.hash_arquivo IS NOT NULL BEGIN
+        {_VINCULAR}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_blobs_desvincular AFTER DELETE ON mensagens
+    WHEN OLD.hash_arquivo IS NOT NULL BEGIN
+        {_DESVINCULAR}
+    END
+    ''',
+    # Ex.: layout_pastas.py move as pastas e reescreve caminho_arquivo
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_blobs_revincular AFTER UPDATE OF hash_arquivo, caminho_arquivo ON mensagens
+    WHEN OLD.hash_arquivo IS NOT NEW.hash_arquivo OR OLD.caminho_arquivo IS NOT NEW.caminho_arquivo BEGIN
+        {_DESVINCULAR}
+        {_VINCULAR}
+    END
+    ''',
+]
+
+# Resumo por contato: uma linha por contato que já teve mensagem ou despesa
+TABELA_RESUMO = '''
+CREATE TABLE IF NOT EXISTS contato_resumo (
+    contato_id INTEGER PRIMARY KEY,
+    total_mensagens INTEGER NOT NULL DEFAULT 0,
+    total_despesas INTEGER NOT NULL DEFAULT 0,
+    ultima_mensagem TIMESTAMP,
+    valor_pendente REAL NOT NULL DEFAULT 0
+)
+'''
+
+# Valor da despesa que conta como pendente (0 nos outros status)
+_PENDENTE = "CASE WHEN {linha}.status = 'pendente' THEN IFNULL({linha}.valor, 0) ELSE 0 END"
+
+TRIGGERS_RESUMO = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_mensagens_inserir AFTER INSERT ON mensagens
+    WHEN NEW.contato_id IS NOT NULL BEGIN
+        INSERT INTO contato_resumo (contato_id, total_mensagens, ultima_mensagem)
+        VALUES (NEW.contato_id, 1, NEW.data_recebimento)
+        ON CONFLICT(contato_id) DO UPDATE SET
+            total_mensagens = total_mensagens + 1,
+            ultima_mensagem = MAX(IFNULL(ultima_mensagem, excluded.ultima_mensagem),
+                                  IFNULL(excluded.ultima_mensagem, ultima_mensagem));
+    END
+    ''',
+    # Remoções são raras: a última mensagem é buscada de novo (índice de contato_id)
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_mensagens_remover AFTER DELETE ON mensagens
+    WHEN OLD.contato_id IS NOT NULL BEGIN
+        UPDATE contato_resumo SET
+            total_mensagens = total_mensagens - 1,
+            ultima_mensagem = (SELECT MAX(data_recebimento) FROM mensagens
+                               WHERE contato_id = OLD.contato_id)
+        WHERE contato_id = OLD.contato_id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_despesas_inserir AFTER INSERT ON despesas
+    WHEN NEW.contato_id IS NOT NULL BEGIN
+        INSERT INTO contato_resumo (contato_id, total_despesas, valor_pendente)
+        VALUES (NEW.contato_id, 1, {_PENDENTE.format(linha='NEW')})
+        ON CONFLICT(contato_id) DO UPDATE SET
+            total_despesas = total_despesas + 1,
+            valor_pendente = valor_pendente + excluded.valor_pendente;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_despesas_remover AFTER DELETE ON despesas
+    WHEN OLD.contato_id IS NOT NULL BEGIN
+        UPDATE contato_resumo SET
+            total_despesas = total_despesas - 1,
+            valor_pendente = valor_pendente - {_PENDENTE.format(linha='OLD')}
+        WHERE contato_id = OLD.contato_id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_despesas_atualizar AFTER UPDATE OF status, valor ON despesas
+    WHEN NEW.contato_id IS NOT NULL BEGIN
+        UPDATE contato_resumo SET
+            valor_pendente = valor_pendente - {_PENDENTE.format(linha='OLD')} + {_PENDENTE.format(linha='NEW')}
+        WHERE contato_id = NEW.contato_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_contatos_remover AFTER DELETE ON contatos BEGIN
+        DELETE FROM contato_resumo WHERE contato_id = OLD.id;
+    END
+    ''',
+]
+
+# Resumo correto de cada contato, calculado a partir das tabelas
+_RESUMOS = f'''
+    WITH m AS (
+        SELECT contato_id, COUNT(*) AS total, MAX(data_recebimento) AS ultima
+        FROM mensagens WHERE contato_id IS NOT NULL GROUP BY contato_id
+    ), d AS (
+        SELECT contato_id, COUNT(*) AS total, SUM({_PENDENTE.format(linha='despesas')}) AS pendente
+        FROM despesas WHERE contato_id IS NOT NULL GROUP BY contato_id
+    )
+    SELECT ids.contato_id, IFNULL(m.total, 0), IFNULL(d.total, 0), m.ultima, IFNULL(d.pendente, 0)
+    FROM (SELECT contato_id FROM m UNION SELECT contato_id FROM d) ids
+    LEFT JOIN m USING (contato_id)
+    LEFT JOIN d USING (contato_id)
+'''
+
+# Valores corretos, calculados a partir das tabelas (varredura completa)
+_CONTAGENS = '''
+    SELECT 'contatos', COUNT(*) FROM contatos
+    UNION ALL SELECT 'mensagens', COUNT(*) FROM mensagens
+    UNION ALL SELECT 'mensagens:' || tipo_mensagem, COUNT(*) FROM mensagens GROUP BY tipo_mensagem
+    UNION ALL SELECT 'despesas', COUNT(*) FROM despesas
+    UNION ALL SELECT 'despesas:' || IFNULL(status, ''), COUNT(*) FROM despesas GROUP BY status
+    UNION ALL SELECT 'blobs', COUNT(*) FROM blobs
+    UNION ALL SELECT 'blobs:bytes', IFNULL(SUM(tamanho), 0) FROM blobs
+    UNION ALL SELECT 'blobs:economizados', IFNULL(SUM((referencias - 1) * tamanho), 0) FROM blobs
+'''
+
+
+def ler(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Todos os contadores (chave -> valor)"""
+    return dict(conn.execute('SELECT chave, valor FROM estatisticas').fetchall())
+
+
+def recalcular(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    """
+    Recalcula os contadores a partir das tabelas e corrige os divergentes
+
+    Deve rodar no escritor: a contagem e a correção ficam na mesma transação,
+    sem escritas concorrentes entre elas.
+
+    Returns:
+        Dict chave -> {'antes', 'depois'} só das chaves corrigidas
+    """
+    atuais = ler(conn)
+    corretos = dict(conn.execute(_CONTAGENS).fetchall())
+
+    diferencas = {}
+    for chave in set(atuais) | set(corretos):
+        antes, depois = atuais.get(chave, 0), corretos.get(chave, 0)
+        if antes != depois:
+            diferencas[chave] = {'antes': antes, 'depois': depois}
+
+    conn.execute('DELETE FROM estatisticas')
+    conn.executemany('INSERT INTO estatisticas (chave, valor) VALUES (?, ?)',
+                     [(chave, valor) for chave, valor in corretos.items() if valor])
+    return diferencas
+
+
+def _comparavel(resumo: Tuple) -> Tuple:
+    """Resumo sem os centavos finais (a soma incremental do valor pendente arredonda diferente)"""
+    return resumo[:3] + (round(resumo[3] or 0, 2),)
+
+
+def recalcular_resumo(conn: sqlite3.Connection) -> int:
+    """
+    Recalcula o contato_resumo a partir das tabelas (no escritor, como recalcular)
+
+    Returns:
+        Quantidade de contatos cujo resumo estava divergente
+    """
+    atuais = {row[0]: _comparavel(row[1:]) for row in conn.execute('''
+        SELECT contato_id, total_mensagens, total_despesas, ultima_mensagem, valor_pendente
+        FROM contato_resumo
+    ''')}
+    corretos = conn.execute(_RESUMOS).fetchall()
+
+    vazio = (0, 0, None, 0)
+    divergentes = sum(1 for row in corretos if atuais.pop(row[0], vazio) != _comparavel(row[1:]))
+    divergentes += sum(1 for resumo in atuais.values() if resumo != vazio)
+
+    conn.execute('DELETE FROM contato_resumo')
+    conn.executemany('''
+        INSERT INTO contato_resumo (contato_id, total_mensagens, total_despesas, ultima_mensagem, valor_pendente)
+        VALUES (?, ?, ?, ?, ?)
+    ''', corretos)
+    return divergentes
+
+
+# Referências corretas: vínculos distintos de cada hash em mensagens
+_REFERENCIAS = '''
+    (SELECT COUNT(DISTINCT IFNULL(caminho_arquivo, '')) FROM mensagens
+     WHERE hash_arquivo = blobs.hash)
+'''
+
+
+def _tamanho_hash() -> int:
+    """Dígitos hexadecimais do hash do repositório de blobs (Config.HASH_ALGORITMO)"""
+    return len(calculo_hash.novo_hash(Config.HASH_ALGORITMO).hexdigest())
+
+
+def recalcular_referencias(conn: sqlite3.Connection, pasta_blobs: Optional[Path] = None) -> int:
+    """
+    Recalcula blobs.referencias a partir das mensagens (no escritor, como recalcular)
+
+    Hashes das mensagens sem linha em blobs só ganham uma se têm o formato do
+    Config.HASH_ALGORITMO: os MD5 das mensagens antigas não têm arquivo no
+    repositório. Com pasta_blobs, também é preciso que o arquivo do blob
+    exista, e linhas cujo arquivo sumiu são removidas.
+
+    Returns:
+        Quantidade de blobs criados, removidos ou com contagem divergente
+    """
+    candidatos = conn.execute('''
+        SELECT hash_arquivo, MAX(tamanho_arquivo) FROM mensagens
+        WHERE length(hash_arquivo) = ? AND hash_arquivo NOT GLOB '*[^0-9a-f]*'
+          AND hash_arquivo NOT IN (SELECT hash FROM blobs)
+        GROUP BY hash_arquivo
+    ''', (_tamanho_hash(),)).fetchall()
+    sem_arquivo = []
+    if pasta_blobs is not None:
+        candidatos = [(h, t) for h, t in candidatos if (pasta_blobs / h[:2] / h).is_file()]
+        sem_arquivo = [(row[0],) for row in conn.execute('SELECT hash FROM blobs')
+                       if not (pasta_blobs / row[0][:2] / row[0]).is_file()]
+        conn.executemany('DELETE FROM blobs WHERE hash = ?', sem_arquivo)
+
+    conn.executemany('INSERT INTO blobs (hash, tamanho, referencias) VALUES (?, ?, 0)', candidatos)
+    return len(candidatos) + len(sem_arquivo) + conn.execute(
+        f'UPDATE blobs SET referencias = {_REFERENCIAS} WHERE referencias <> {_REFERENCIAS}'
+    ).rowcount
+
+
+def coletar_blobs(wpp, idade_minima: float = 3600) -> Dict[str, int]:
+    """
+    Apaga os blobs sem nenhum vínculo (linha e arquivo) e, no repositório,
+    arquivos sem linha na tabela e temporários abandonados
+
+    Arquivos mais novos que idade_minima segundos são mantidos: podem ser
+    de uma gravação em andamento, ainda sem a mensagem registrada.
+
+    Returns:
+        Dict com blobs removidos, órfãos removidos e bytes liberados
+    """
+    def _remover_sem_vinculo(conn):
+        recalcular_referencias(conn, wpp.pasta_blobs)
+        return [row[0] for row in conn.execute('DELETE FROM blobs WHERE referencias <= 0 RETURNING hash')]
+
+    removidos = {'blobs': 0, 'orfaos': 0, 'bytes': 0}
+
+    def _apagar(caminho: Path, chave: str):
+        try:
+            tamanho = caminho.stat().st_size
+            caminho.unlink()
+        except FileNotFoundError:
+            return
+        removidos[chave] += 1
+        removidos['bytes'] += tamanho
+
+    for hash_arquivo in wpp.escritor.executar(_remover_sem_vinculo):
+        _apagar(wpp._caminho_blob(hash_arquivo), 'blobs')
+
+    if not wpp.pasta_blobs.is_dir():
+        return removidos
+
+    limite = time.time() - idade_minima
+    for pasta in wpp.pasta_blobs.iterdir():
+        if not pasta.is_dir():
+            continue
+        antigos = [arquivo for arquivo in pasta.iterdir() if arquivo.stat().st_mtime < limite]
+        if pasta.name == 'tmp':
+            for arquivo in antigos:
+                _apagar(arquivo, 'orfaos')
+            continue
+        with wpp.pool.conexao() as conn:
+            conhecidos = {row[0] for row in conn.execute(
+                f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' * len(antigos))})",
+                [arquivo.name for arquivo in antigos]
+            )} if antigos else set()
+        for arquivo in antigos:
+            if arquivo.name not in conhecidos:
+                _apagar(arquivo, 'orfaos')
+
+    return removidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconciliação dos contadores do WhatsApp Manager')
+    parser.add_argument('--coletar-blobs', action='store_true',
+                        help='Apaga blobs sem vínculo e arquivos órfãos do repositório de blobs')
+    args = parser.parse_args()
+
+    from whatsapp_manager import WhatsAppManager
+
+    wpp = WhatsAppManager()
+    print("🧮 Recalculando os contadores das estatísticas...")
+    referencias = wpp.escritor.executar(recalcular_referencias, wpp.pasta_blobs)
+    if args.coletar_blobs:
+        coletados = coletar_blobs(wpp)
+        print(f"🗑️ Blobs: {coletados['blobs']} sem vínculo e {coletados['orfaos']} órfão(s) removido(s), "
+              f"{coletados['bytes'] / 1024 / 1024:.1f} MB liberados")
+    diferencas = wpp.escritor.executar(recalcular)
+    resumos = wpp.escritor.executar(recalcular_resumo)
+    wpp.fechar()
+
+    if referencias:
+        print(f"🔧 blobs.referencias: {referencias} blob(s) divergente(s)")
+    if not diferencas and not resumos:
+        print("✅ Contadores conferem com as tabelas")
+        return
+    for chave, valores in sorted(diferencas.items()):
+        print(f"🔧 {chave}: {valores['antes']} -> {valores['depois']}")
+    if resumos:
+        print(f"🔧 contato_resumo: {resumos} contato(s) divergente(s)")
+    print(f"✅ {len(diferencas)} contador(es) e {resumos} resumo(s) de contato corrigido(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -41,28 +41,27 @@ try:
     contato_id = wpp.registrar_contato(telefone, nome)
     print(f"  ✅ Contato ID: {contato_id}")
     
-    # Verificar se pasta foi criada
-    telefone_limpo = ''.join(filter(str.isdigit, telefone))
-    nome_limpo = ''.join(c for c in nome if c.isalnum() or c in (' ', '-', '_')).strip()
-    nome_pasta = f"{telefone_limpo}_{nome_limpo}"
-    
-    pasta_esperada = wpp.pasta_raiz / nome_pasta
+    # Verificar pasta do contato (criada só quando chega o primeiro arquivo)
+    pasta_esperada = wpp.caminho_pasta_contato(telefone, nome)
     print(f"  📁 Pasta esperada: {pasta_esperada}")
-    print(f"  ✅ Pasta existe: {pasta_esperada.exists()}")
     
     if pasta_esperada.exists():
-        print(f"  📂 Conteúdo:")
-        for item in pasta_esperada.iterdir():
-            tipo = "📁" if item.is_dir() else "📄"
-            print(f"    {tipo} {item.name}")
+        print(f"  ✅ Pasta existe")
     else:
-        print(f"  ❌ Pasta não foi criada!")
+        print(f"  ⏳ Pasta ainda não criada (criada no primeiro arquivo recebido)")
         
-        # Tentar criar manualmente
-        print(f"\n🔧 Tentando criar manualmente...")
-        pasta_criada = wpp.criar_pasta_contato(telefone, nome)
-        print(f"  📁 Pasta criada: {pasta_criada}")
-        print(f"  ✅ Existe agora: {pasta_criada.exists()}")
+        # Criar agora para conferir o caminho
+        print(f"\n🔧 Criando pasta do contato...")
+        pasta_esperada = wpp.criar_pasta_contato(telefone, nome)
+        print(f"  📁 Pasta criada: {pasta_esperada}")
+        print(f"  ✅ Existe agora: {pasta_esperada.exists()}")
+    
+    # Verificar subpastas
+    subpastas = ["imagens", "documentos", "audios", "videos", "outros"]
+    print(f"\n📂 Subpastas (criadas no primeiro arquivo de cada tipo):")
+    for subpasta in subpastas:
+        status = "✅" if (pasta_esperada / subpasta).exists() else "⏳"
+        print(f"  {status} {subpasta}/")
     
     # Listar todas as pastas na pasta raiz
     print(f"\n📋 Todas as pastas em {wpp.pasta_raiz}:")
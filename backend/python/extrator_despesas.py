@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Extração de despesas do texto das mensagens
+Padrões compilados uma única vez; as palavras-chave de todas as categorias
+viram uma só expressão regular em forma de árvore de prefixos, com as letras
+acentuadas como alternativas da letra base, então o texto é percorrido uma
+vez (em vez de um `in` por palavra-chave) sem diferenciar maiúsculas nem acentos
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Mapping, Optional
+
+# Valores monetários: "R$ 1.234,56", "$50", "45,90", "120". O prefixo "R$"
+# é opcional e não muda os dígitos capturados, então o padrão começa direto
+# no número (sem tentar o prefixo em cada posição do texto)
+PADRAO_VALOR = re.compile(r'\d{1,3}(?:\.\d{3})*(?:,\d{2})?')
+
+# Categorias comuns de despesa, em ordem de prioridade (a primeira encontrada vence)
+CATEGORIAS_PADRAO = {
+    'combustivel': ['combustivel', 'combustível', 'gasolina', 'alcool', 'álcool', 'diesel', 'posto'],
+    'alimentacao': ['almoço', 'almoco', 'jantar', 'lanche', 'restaurante', 'comida', 'alimentação'],
+    'transporte': ['uber', 'taxi', 'onibus', 'ônibus', 'metro', 'metrô', 'transporte', 'passagem'],
+    'hospedagem': ['hotel', 'pousada', 'hospedagem', 'diaria', 'diária'],
+    'material': ['material', 'compra', 'produto', 'equipamento', 'ferramenta'],
+    'servico': ['serviço', 'servico', 'consultoria', 'manutencao', 'manutenção', 'reparo']
+}
+
+CATEGORIA_PADRAO = 'outros'
+
+
+def _tabela_sem_acentos() -> Dict[int, str]:
+    """Letras acentuadas do Latin-1 -> letra base ("Ç" -> "C", "ã" -> "a")"""
+    tabela = {}
+    for codigo in range(0xC0, 0x100):
+        decomposto = unicodedata.normalize('NFKD', chr(codigo))
+        base = ''.join(c for c in decomposto if not unicodedata.combining(c))
+        if len(base) == 1 and base.isascii() and base != chr(codigo):
+            tabela[codigo] = base
+    return tabela
+
+
+def _tabela_variantes() -> Dict[str, str]:
+    """Letra base -> classe com as variantes minúsculas acentuadas ("c" -> "[cç]")"""
+    variantes: Dict[str, str] = {}
+    for codigo, base in _SEM_ACENTOS.items():
+        if chr(codigo).islower():
+            variantes[base] = variantes.get(base, base) + chr(codigo)
+    return {base: f'[{letras}]' for base, letras in variantes.items()}
+
+
+_SEM_ACENTOS = _tabela_sem_acentos()
+_VARIANTES = _tabela_variantes()
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos ("Almoço" -> "almoco")"""
+    texto = texto.lower()
+    if texto.isascii():
+        return texto
+    return texto.translate(_SEM_ACENTOS)
+
+
+def validar_categorias(categorias) -> Dict[str, List[str]]:
+    """
+    Confere e limpa um dicionário de categorias (ex.: recebido pela API)
+
+    Returns:
+        Categoria -> palavras-chave sem espaços nas pontas nem repetidas
+
+    Raises:
+        ValueError: formato inválido
+    """
+    if not isinstance(categorias, dict):
+        raise ValueError("Categorias devem ser um objeto {categoria: [palavras-chave]}")
+
+    limpas = {}
+    for categoria, palavras in categorias.items():
+        if not isinstance(categoria, str) or not categoria.strip():
+            raise ValueError("Nome de categoria vazio")
+        if not isinstance(palavras, list) or not all(isinstance(p, str) for p in palavras):
+            raise ValueError(f"Palavras-chave de '{categoria}' devem ser uma lista de textos")
+        limpas[categoria.strip()] = list(dict.fromkeys(p.strip() for p in palavras if p.strip()))
+    return limpas
+
+
+def _regex_arvore(palavras: Iterable[str], acentos: bool = True) -> str:
+    """
+    Expressão regular em árvore de prefixos para um conjunto de palavras
+
+    As palavras devem estar normalizadas; o texto pesquisado só precisa estar
+    em minúsculas. Na mesma posição o casamento é sempre a palavra mais longa;
+    as mais curtas que também casariam ali são prefixos dela.
+
+    Args:
+        palavras: Palavras normalizadas
+        acentos: Aceita as variantes acentuadas de cada letra (sem isso a
+            expressão é mais rápida, mas só serve para textos ASCII)
+    """
+    variantes = _VARIANTES if acentos else {}
+    arvore: Dict = {}
+    for palavra in palavras:
+        no = arvore
+        for caractere in palavra:
+            no = no.setdefault(caractere, {})
+        no[''] = {}
+
+    def _emitir(no: Dict) -> str:
+        ramos = [(variantes.get(c) or re.escape(c)) + _emitir(filho)
+                 for c, filho in sorted(no.items()) if c]
+        if not ramos:
+            return ''
+        if len(ramos) == 1 and '' not in no:
+            return ramos[0]
+        grupo = f"(?:{'|'.join(ramos)})"
+        return grupo + '?' if '' in no else grupo
+
+    return _emitir(arvore)
+
+
+class ExtratorDespesas:
+    """
+    Detecta valores e categoria de despesa em textos
+
+    Imutável depois de criado: para trocar as categorias, crie outro extrator
+    e substitua a referência (as threads em uso terminam com o antigo).
+    """
+
+    def __init__(self, categorias: Optional[Mapping[str, Iterable[str]]] = None,
+                 categoria_padrao: str = CATEGORIA_PADRAO):
+        """
+        Args:
+            categorias: Categoria -> palavras-chave, em ordem de prioridade
+            categoria_padrao: Categoria quando nenhuma palavra-chave aparece
+        """
+        categorias = CATEGORIAS_PADRAO if categorias is None else categorias
+        self.categorias = {c: list(p) for c, p in categorias.items()}
+        self.categoria_padrao = categoria_padrao
+
+        nomes = list(self.categorias)
+        prioridades: Dict[str, int] = {}
+        for prioridade, palavras in enumerate(self.categorias.values()):
+            for palavra in palavras:
+                palavra = normalizar(palavra.strip())
+                if palavra and palavra not in prioridades:
+                    prioridades[palavra] = prioridade
+
+        # O casamento traz a palavra mais longa na posição; as que são prefixo
+        # dela também estão no texto, então vale a melhor prioridade entre elas
+        self._categoria_da_palavra = {
+            palavra: nomes[min(p for outra, p in prioridades.items() if palavra.startswith(outra))]
+            for palavra in prioridades
+        }
+        self._prioridade = {nome: indice for indice, nome in enumerate(nomes)}
+        # Textos só com ASCII (a maioria) usam a expressão sem as classes de acentos
+        self._padrao = re.compile(_regex_arvore(prioridades)) if prioridades else None
+        self._padrao_ascii = re.compile(_regex_arvore(prioridades, False)) if prioridades else None
+        self._melhor = nomes[0] if nomes else None
+
+    def categoria(self, texto: str) -> str:
+        """Categoria de maior prioridade cujas palavras-chave aparecem no texto"""
+        if self._padrao is None or not texto:
+            return self.categoria_padrao
+
+        minusculo = texto.lower()
+        buscar = (self._padrao_ascii if minusculo.isascii() else self._padrao).search
+        categoria_da_palavra = self._categoria_da_palavra
+        prioridade = self._prioridade
+
+        melhor = None
+        posicao = 0
+        while True:
+            casamento = buscar(minusculo, posicao)
+            if casamento is None:
+                break
+            palavra = casamento.group()
+            categoria = categoria_da_palavra.get(palavra) or categoria_da_palavra[normalizar(palavra)]
+            if melhor is None or prioridade[categoria] < prioridade[melhor]:
+                melhor = categoria
+                if melhor == self._melhor:
+                    break
+            # Próxima posição logo após o início: palavras sobrepostas também contam
+            posicao = casamento.start() + 1
+
+        return melhor or self.categoria_padrao
+
+    @staticmethod
+    def valores(texto: str) -> List[Dict]:
+        """
+        Todos os valores monetários do texto
+
+        Returns:
+            Lista de dicts com valor (float), texto, inicio e fim (posições no texto)
+        """
+        encontrados = []
+        for casamento in PADRAO_VALOR.finditer(texto):
+            bruto = casamento.group()
+            encontrados.append({
+                'valor': float(bruto.replace('.', '').replace(',', '.')),
+                'texto': bruto,
+                'inicio': casamento.start(),
+                'fim': casamento.end()
+            })
+        return encontrados
+
+    def extrair(self, texto: str) -> Dict:
+        """
+        Extrai as informações de despesa de um texto
+
+        Returns:
+            Dict com valor (o primeiro encontrado), categoria, tem_valor e valores
+        """
+        texto = texto or ''
+        valores = self.valores(texto)
+        valor = valores[0]['valor'] if valores else None
+        return {
+            'valor': valor,
+            'categoria': self.categoria(texto),
+            'tem_valor': valor is not None,
+            'valores': valores
+        }
+
+    def extrair_varios(self, textos: Iterable[str]) -> List[Dict]:
+        """Extrai vários textos de uma vez (mesma ordem da entrada)"""
+        extrair = self.extrair
+        return [extrair(texto) for texto in textos]
+
+
+_padrao: Optional[ExtratorDespesas] = None
+
+
+def extrator_padrao() -> ExtratorDespesas:
+    """Extrator com as categorias padrão (criado no primeiro uso)"""
+    global _padrao
+    if _padrao is None:
+        _padrao = ExtratorDespesas()
+    return _padrao
+
+
+def extrair(texto: str) -> Dict:
+    """Atalho para extrator_padrao().extrair(texto)"""
+    return extrator_padrao().extrair(texto)
+
+
+def extrair_varios(textos: Iterable[str]) -> List[Dict]:
+    """Atalho para extrator_padrao().extrair_varios(textos)"""
+    return extrator_padrao().extrair_varios(textos)
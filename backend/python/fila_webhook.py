@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Fila durável de webhooks do WhatsApp Manager
+Os payloads são gravados numa tabela outbox do SQLite e processados em
+segundo plano, para que o /webhook responda imediatamente
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+# Número fixo de partições gravado em cada item; cada worker atende
+# as partições congruentes ao seu índice, então um telefone é sempre
+# processado pelo mesmo worker (e na ordem de chegada)
+PARTICOES = 1024
+
+
+class FilaWebhook:
+    """
+    Outbox de webhooks com workers em segundo plano
+
+    - Ordem garantida por telefone (partição fixa por worker e nenhum item
+      é iniciado enquanto houver um anterior do mesmo telefone em aberto)
+    - Novas tentativas com atraso exponencial e fila de mortas (dead-letter)
+      após o número máximo de tentativas; um item morto não bloqueia os
+      seguintes do mesmo telefone, por isso reprocessar_mortas recusa (salvo
+      com forcar=True) itens que já têm posteriores concluídos ou em processamento
+    - Entrega "pelo menos uma vez": itens em processamento durante uma queda
+      voltam para a fila na próxima inicialização
+    """
+
+    def __init__(self, wpp_manager, processador: Callable[[Dict], Dict],
+                 workers: int = 4, max_tentativas: int = 5,
+                 atraso_base: float = 2.0, retencao_horas: float = 24.0):
+        """
+        Args:
+            wpp_manager: WhatsAppManager cujo banco guarda a fila
+            processador: Função que processa um payload e devolve o resultado
+            workers: Número de threads de processamento
+            max_tentativas: Tentativas antes de mover o item para as mortas
+            atraso_base: Segundos de espera antes da 1ª nova tentativa (dobra a cada falha)
+            retencao_horas: Tempo que itens concluídos ficam disponíveis para consulta
+        """
+        self.wpp = wpp_manager
+        self.processador = processador
+        self.workers = max(1, workers)
+        self.max_tentativas = max(1, max_tentativas)
+        self.atraso_base = atraso_base
+        self.retencao_horas = retencao_horas
+
+        self._novo_item = threading.Condition()
+        self._parar = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def iniciar(self):
+        """Devolve à fila itens interrompidos e inicia os workers"""
+        recuperados = self.wpp.escritor.executar(lambda conn: conn.execute(
+            "UPDATE fila_webhook SET status = 'pendente' WHERE status = 'processando'"
+        ).rowcount)
+        if recuperados:
+            print(f"♻️ {recuperados} item(ns) da fila retomado(s) após interrupção")
+
+        self._parar.clear()
+        for indice in range(self.workers):
+            thread = threading.Thread(target=self._executar_worker, args=(indice,),
+                                      name=f'fila-webhook-{indice}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        print(f"📬 Fila de webhooks iniciada com {self.workers} worker(s)")
+
+    def parar(self, timeout: Optional[float] = None):
+        """Sinaliza os workers para terminar após o item atual"""
+        self._parar.set()
+        with self._novo_item:
+            self._novo_item.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enfileirar(self, telefone: str, payload: Dict) -> int:
+        """
+        Grava o payload na fila (commit durável antes de retornar, pois o
+        chamador já responde 202: o lote usa synchronous=FULL mesmo no perfil 'wal')
+
+        Returns:
+            ID do item na fila
+        """
+        agora = time.time()
+        item_id = self.wpp.escritor.executar_duravel(lambda conn: conn.execute('''
+            INSERT INTO fila_webhook (telefone, particao, payload, proxima_tentativa, criado_em)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (telefone, zlib.crc32(telefone.encode()) % PARTICOES,
+              json.dumps(payload), agora, agora)).lastrowid)
+
+        with self._novo_item:
+            self._novo_item.notify_all()
+
+        return item_id
+
+    def _candidato(self, conn: sqlite3.Connection, worker: int) -> Optional[tuple]:
+        """Próximo item pendente liberado para o worker (sem reservá-lo)"""
+        return conn.execute('''
+            SELECT f.id, f.payload, f.tentativas FROM fila_webhook f
+            WHERE f.status = 'pendente'
+              AND f.particao % ? = ?
+              AND f.proxima_tentativa <= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM fila_webhook g
+                  WHERE g.telefone = f.telefone AND g.id < f.id
+                    AND g.status IN ('pendente', 'processando')
+              )
+            ORDER BY f.id
+            LIMIT 1
+        ''', (self.workers, worker, time.time())).fetchone()
+
+    def _reservar(self, conn: sqlite3.Connection, worker: int) -> Optional[tuple]:
+        """Marca como 'processando' o próximo item liberado para o worker"""
+        item = self._candidato(conn, worker)
+        if item:
+            conn.execute("UPDATE fila_webhook SET status = 'processando' WHERE id = ?", (item[0],))
+        return item
+
+    def _executar_worker(self, worker: int):
+        """Laço de um worker: reserva, processa e registra o resultado"""
+        ultima_limpeza = 0.0
+
+        while not self._parar.is_set():
+            try:
+                # Leitura numa conexão do pool primeiro: worker ocioso não
+                # ocupa o escritor (BEGIN IMMEDIATE...COMMIT) a cada segundo
+                with self.wpp.pool.conexao() as conn:
+                    tem_candidato = self._candidato(conn, worker) is not None
+                item = self.wpp.escritor.executar(self._reservar, worker) if tem_candidato else None
+            except Exception as e:
+                print(f"❌ Fila: erro ao reservar item: {e}")
+                item = None
+
+            if item is None:
+                if worker == 0 and time.time() - ultima_limpeza > 3600:
+                    ultima_limpeza = time.time()
+                    self._limpar_concluidos()
+                # Acorda em novo item ou a cada segundo (novas tentativas agendadas)
+                with self._novo_item:
+                    self._novo_item.wait(1.0)
+                continue
+
+            item_id, payload, tentativas = item
+            try:
+                resultado = self.processador(json.loads(payload))
+                self.wpp.escritor.executar(lambda conn: conn.execute('''
+                    UPDATE fila_webhook
+                    SET status = 'concluido', processado_em = ?, resultado = ?, tentativas = ?
+                    WHERE id = ?
+                ''', (time.time(), json.dumps(resultado, default=str), tentativas + 1, item_id)))
+            except Exception as e:
+                self._registrar_falha(item_id, tentativas + 1, e)
+
+    def _registrar_falha(self, item_id: int, tentativas: int, erro: Exception):
+        """Agenda nova tentativa com atraso exponencial ou move para as mortas"""
+        morta = tentativas >= self.max_tentativas
+        atraso = self.atraso_base * (2 ** (tentativas - 1))
+
+        self.wpp.escritor.executar(lambda conn: conn.execute('''
+            UPDATE fila_webhook
+            SET status = ?, tentativas = ?, proxima_tentativa = ?, ultimo_erro = ?
+            WHERE id = ?
+        ''', ('morta' if morta else 'pendente', tentativas, time.time() + atraso,
+              str(erro)[:1000], item_id)))
+
+        if morta:
+            print(f"💀 Fila: item {item_id} movido para as mortas após {tentativas} tentativas: {erro}")
+        else:
+            print(f"🔁 Fila: item {item_id} falhou ({erro}); nova tentativa em {atraso:.0f}s")
+
+    def _limpar_concluidos(self):
+        """Remove itens concluídos mais antigos que o período de retenção"""
+        limite = time.time() - self.retencao_horas * 3600
+        try:
+            self.wpp.escritor.executar(lambda conn: conn.execute(
+                "DELETE FROM fila_webhook WHERE status = 'concluido' AND processado_em < ?", (limite,)
+            ))
+        except Exception as e:
+            print(f"⚠️ Fila: erro na limpeza: {e}")
+
+    def reprocessar_mortas(self, item_id: Optional[int] = None, forcar: bool = False) -> Dict:
+        """
+        Devolve itens mortos para a fila
+
+        Itens posteriores do mesmo telefone continuam sendo processados
+        enquanto um item está morto; reprocessá-lo depois deles aplicaria o
+        webhook fora de ordem. Esses itens são recusados, a menos que forcar=True.
+
+        Args:
+            item_id: Item específico ou None para todos
+            forcar: Devolve também os itens que seriam aplicados fora de ordem
+
+        Returns:
+            Dict com o número de itens devolvidos e os IDs recusados
+        """
+        filtro, parametros = ("AND id = ?", (item_id,)) if item_id else ("", ())
+        fora_de_ordem = '''
+            EXISTS (
+                SELECT 1 FROM fila_webhook g
+                WHERE g.telefone = fila_webhook.telefone AND g.id > fila_webhook.id
+                  AND g.status IN ('concluido', 'processando')
+            )
+        '''
+
+        def _devolver(conn):
+            recusados = [] if forcar else [row[0] for row in conn.execute(f'''
+                SELECT id FROM fila_webhook
+                WHERE status = 'morta' {filtro} AND {fora_de_ordem}
+            ''', parametros)]
+            devolvidos = conn.execute(f'''
+                UPDATE fila_webhook
+                SET status = 'pendente', tentativas = 0, proxima_tentativa = ?
+                WHERE status = 'morta' {filtro} {'' if forcar else 'AND NOT ' + fora_de_ordem}
+            ''', (time.time(), *parametros)).rowcount
+            return devolvidos, recusados
+
+        devolvidos, recusados = self.wpp.escritor.executar(_devolver)
+        if recusados:
+            print(f"⚠️ Fila: {len(recusados)} item(ns) morto(s) não devolvido(s), pois já há "
+                  f"webhooks posteriores do mesmo telefone processados: {recusados}")
+
+        with self._novo_item:
+            self._novo_item.notify_all()
+        return {'reprocessados': devolvidos, 'recusados': recusados}
+
+    def obter_item(self, item_id: int) -> Optional[Dict]:
+        """Situação de um item da fila"""
+        with self.wpp.pool.conexao() as conn:
+            row = conn.execute('''
+                SELECT id, telefone, status, tentativas, criado_em, processado_em, ultimo_erro, resultado
+                FROM fila_webhook WHERE id = ?
+            ''', (item_id,)).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'id': row[0],
+            'telefone': row[1],
+            'status': row[2],
+            'tentativas': row[3],
+            'criado_em': row[4],
+            'processado_em': row[5],
+            'ultimo_erro': row[6],
+            'resultado': json.loads(row[7]) if row[7] else None
+        }
+
+    def metricas(self, completo: bool = True) -> Dict:
+        """
+        Profundidade da fila, atraso de processamento e mortas
+
+        Cada status é contado pelo índice (status, id), então o custo é o
+        número de itens daquele status. Os concluídos acumulam durante todo o
+        período de retenção; com completo=False (usado pelo /health) eles não
+        são contados.
+        """
+        status = ['pendente', 'processando', 'morta'] + (['concluido'] if completo else [])
+        with self.wpp.pool.conexao() as conn:
+            contagens = {
+                nome: conn.execute(
+                    'SELECT COUNT(*) FROM fila_webhook WHERE status = ?', (nome,)
+                ).fetchone()[0]
+                for nome in status
+            }
+            mais_antigo = conn.execute(
+                "SELECT MIN(criado_em) FROM fila_webhook WHERE status IN ('pendente', 'processando')"
+            ).fetchone()[0]
+
+        metricas = {
+            'pendentes': contagens['pendente'],
+            'processando': contagens['processando'],
+            'mortas': contagens['morta'],
+            'atraso_segundos': round(time.time() - mais_antigo, 3) if mais_antigo else 0.0,
+            'workers': len(self._threads)
+        }
+        if completo:
+            metricas['concluidos'] = contagens['concluido']
+        return metricas
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Organização das pastas de contatos dentro da PASTA_RAIZ
+
+Layouts:
+    plano        PASTA_RAIZ/<telefone>_<nome>
+    fragmentado  PASTA_RAIZ/ab/cd/<telefone>_<nome>  (ab/cd = início do MD5 do telefone)
+
+O layout fragmentado mantém poucas centenas de entradas por diretório mesmo
+com dezenas de milhares de contatos.
+
+Migração (com a API parada):
+    python layout_pastas.py fragmentado [--lote 500] [--simular]
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LAYOUTS = ('plano', 'fragmentado')
+
+
+def nome_pasta_contato(telefone: str, nome: Optional[str] = None) -> str:
+    """Nome da pasta do contato: <telefone>_<nome> (apenas dígitos e caracteres seguros)"""
+    telefone_limpo = ''.join(filter(str.isdigit, telefone))
+
+    if nome:
+        # Remove caracteres especiais do nome
+        nome_limpo = ''.join(c for c in nome if c.isalnum() or c in (' ', '-', '_')).strip()
+        return f"{telefone_limpo}_{nome_limpo}"
+
+    return telefone_limpo
+
+
+def fragmentos(telefone: str) -> Path:
+    """Subpastas ab/cd do telefone no layout fragmentado"""
+    resumo = hashlib.md5(''.join(filter(str.isdigit, telefone)).encode()).hexdigest()
+    return Path(resumo[:2]) / resumo[2:4]
+
+
+def caminho_relativo(telefone: str, nome_pasta: str, layout: str) -> Path:
+    """
+    Caminho da pasta do contato relativo à PASTA_RAIZ
+
+    Args:
+        telefone: Número do contato
+        nome_pasta: Nome da pasta (ver nome_pasta_contato)
+        layout: 'plano' ou 'fragmentado'
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Layout de pastas inválido: {layout} (use {' ou '.join(LAYOUTS)})")
+
+    if layout == 'fragmentado':
+        return fragmentos(telefone) / nome_pasta
+    return Path(nome_pasta)
+
+
+def _atualizar_caminhos(conn: sqlite3.Connection, movidos: List[Tuple[int, str, str]]):
+    """Grava as novas pastas dos contatos e reescreve o prefixo dos caminhos das mensagens"""
+    for contato_id, antiga, nova in movidos:
+        conn.execute('UPDATE contatos SET pasta_contato = ? WHERE id = ?', (nova, contato_id))
+        conn.execute('''
+            UPDATE mensagens
+            SET caminho_arquivo = ? || substr(caminho_arquivo, length(?) + 1)
+            WHERE contato_id = ? AND substr(caminho_arquivo, 1, length(?)) = ?
+        ''', (nova, antiga, contato_id, antiga, antiga))
+
+
+def _remover_fragmentos_vazios(pasta: Path, pasta_raiz: Path):
+    """Remove as subpastas ab/cd que ficaram vazias após mover um contato"""
+    while pasta != pasta_raiz and pasta_raiz in pasta.parents:
+        try:
+            pasta.rmdir()
+        except OSError:
+            return  # ainda tem outros contatos
+        pasta = pasta.parent
+
+
+def migrar_layout(wpp, layout: str, tamanho_lote: int = 500, simular: bool = False) -> Dict:
+    """
+    Move as pastas existentes para o layout informado
+
+    Cada lote renomeia as pastas e depois atualiza contatos.pasta_contato e
+    mensagens.caminho_arquivo numa única transação. Pode ser executada de novo
+    após uma interrupção: pastas já movidas só têm o banco atualizado.
+
+    Args:
+        wpp: WhatsAppManager (pasta_raiz e banco de destino)
+        layout: Layout de destino
+        tamanho_lote: Contatos por transação
+        simular: Apenas conta o que seria movido
+
+    Returns:
+        Dict com movidas, ja_no_layout, ausentes
+    """
+    totais = {'movidas': 0, 'ja_no_layout': 0, 'ausentes': 0}
+    ultimo_id = 0
+
+    while True:
+        with wpp.pool.conexao() as conn:
+            contatos = conn.execute('''
+                SELECT id, telefone, pasta_contato FROM contatos
+                WHERE id > ? AND pasta_contato IS NOT NULL AND pasta_contato != ''
+                ORDER BY id LIMIT ?
+            ''', (ultimo_id, tamanho_lote)).fetchall()
+
+        if not contatos:
+            break
+        ultimo_id = contatos[-1][0]
+
+        movidos = []
+        for contato_id, telefone, pasta_atual in contatos:
+            antiga = Path(pasta_atual)
+            nova = wpp.pasta_raiz / caminho_relativo(telefone, antiga.name, layout)
+
+            if antiga == nova:
+                totais['ja_no_layout'] += 1
+                continue
+
+            if antiga.exists():
+                if not simular:
+                    nova.parent.mkdir(parents=True, exist_ok=True)
+                    os.rename(antiga, nova)
+                    _remover_fragmentos_vazios(antiga.parent, wpp.pasta_raiz)
+            elif not nova.exists():
+                # Contato sem arquivos: a pasta ainda não foi criada, só o banco muda
+                totais['ausentes'] += 1
+
+            movidos.append((contato_id, str(antiga), str(nova)))
+
+        if movidos and not simular:
+            wpp.escritor.executar(_atualizar_caminhos, movidos)
+        totais['movidas'] += len(movidos)
+        print(f"📦 Até o contato {ultimo_id}: {totais['movidas']} pasta(s) movida(s)")
+
+    # Caminhos antigos em memória não valem mais
+    wpp.cache_contatos.remover()
+    return totais
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra as pastas de contatos para outro layout")
+    parser.add_argument('layout', choices=LAYOUTS)
+    parser.add_argument('--lote', type=int, default=500, help="Contatos por transação")
+    parser.add_argument('--simular', action='store_true', help="Não move nada, só conta")
+    args = parser.parse_args()
+
+    from whatsapp_manager import WhatsAppManager
+
+    wpp = WhatsAppManager()
+    print(f"🚚 Migrando {wpp.pasta_raiz} para o layout '{args.layout}'"
+          f"{' (simulação)' if args.simular else ''}")
+
+    totais = migrar_layout(wpp, args.layout, args.lote, args.simular)
+    wpp.fechar()
+
+    print(f"✅ Movidas: {totais['movidas']} | Já no layout: {totais['ja_no_layout']} "
+          f"| Pastas ausentes: {totais['ausentes']}")
+    if not args.simular:
+        print(f"⚙️ Defina LAYOUT_PASTAS={args.layout} antes de iniciar a API")
+
+
+if __name__ == "__main__":
+    main()
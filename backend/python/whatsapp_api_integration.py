@@ -4,13 +4,18 @@ API Flask para integração com WhatsApp Web
 Recebe webhooks e processa mensagens automaticamente
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import os
+import io
+import csv
 import json
-import tempfile
-import requests
+import base64
 from datetime import datetime
-from whatsapp_manager import WhatsAppManager  # Importar o sistema principal
+from whatsapp_manager import (WhatsAppManager, ErroLote, ALGORITMO_HASH,  # Importar o sistema principal
+                              COLUNAS_DESPESAS, COLUNAS_MENSAGENS)
+from fila_webhook import FilaWebhook
+from baixador_midia import BaixadorMidia
+from config import Config
 import re
 
 app = Flask(__name__)
@@ -20,7 +25,23 @@ wpp_manager = WhatsAppManager()
 
 # Configurações
 WEBHOOK_TOKEN = os.getenv('WEBHOOK_TOKEN', 'seu_token_webhook_aqui')
-PASTA_TEMP = tempfile.mkdtemp()
+# Sessão HTTP compartilhada para baixar as mídias
+baixador_midia = BaixadorMidia(
+    conexoes_por_host=Config.MIDIA_CONEXOES_POR_HOST,
+    timeout_conexao=Config.MIDIA_TIMEOUT_CONEXAO,
+    timeout_leitura=Config.MIDIA_TIMEOUT_LEITURA,
+    tentativas=Config.MIDIA_TENTATIVAS
+)
+
+# Maior página aceita em ?limit= nas listagens
+LIMITE_PAGINA_MAXIMO = 500
+
+# Formatos das exportações em streaming
+FORMATOS_EXPORTACAO = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+    'csv': 'text/csv',
+}
 
 def validar_webhook(token):
     """Valida token do webhook"""
@@ -37,74 +58,180 @@ def extrair_numero_telefone(numero_completo):
     
     return numero
 
-def baixar_arquivo_temporario(url, nome_arquivo):
-    """Baixa arquivo de URL para pasta temporária"""
+def hash_do_payload(arquivo_info):
+    """
+    SHA-256 informado pelo WhatsApp (filehash, base64) em hexadecimal
+
+    Vem do cliente e não é conferido: só serve para achar um arquivo que o
+    mesmo contato já enviou (ver armazenar_blob_conhecido)
+    """
+    filehash = arquivo_info.get('filehash')
+    if not filehash or ALGORITMO_HASH != 'sha256':
+        return None
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        caminho_temp = os.path.join(PASTA_TEMP, nome_arquivo)
-        
-        with open(caminho_temp, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        return caminho_temp
-    except Exception as e:
-        print(f"❌ Erro ao baixar arquivo: {e}")
+        return base64.b64decode(filehash, validate=True).hex()
+    except ValueError:
         return None
 
 def processar_texto_despesa(texto):
     """
     Tenta extrair informações de despesa do texto
     Procura por padrões como valores monetários e categorias
+    (ver extrator_despesas; 'valores' traz todos os valores com a posição).
+    As categorias vêm do banco e são recompiladas só quando mudam de versão
     """
-    # Padrões para detectar valores monetários
-    padrao_valor = r'R?\$?\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)'
-    valores = re.findall(padrao_valor, texto.upper())
-    
-    # Categorias comuns de despesa
-    categorias = {
-        'combustivel': ['combustivel', 'combustível', 'gasolina', 'alcool', 'álcool', 'diesel', 'posto'],
-        'alimentacao': ['almoço', 'almoco', 'jantar', 'lanche', 'restaurante', 'comida', 'alimentação'],
-        'transporte': ['uber', 'taxi', 'onibus', 'ônibus', 'metro', 'metrô', 'transporte', 'passagem'],
-        'hospedagem': ['hotel', 'pousada', 'hospedagem', 'diaria', 'diária'],
-        'material': ['material', 'compra', 'produto', 'equipamento', 'ferramenta'],
-        'servico': ['serviço', 'servico', 'consultoria', 'manutencao', 'manutenção', 'reparo']
-    }
-    
-    categoria_detectada = 'outros'
-    for categoria, palavras_chave in categorias.items():
-        if any(palavra in texto.lower() for palavra in palavras_chave):
-            categoria_detectada = categoria
-            break
+    return wpp_manager.extrator_despesas().extrair(texto)
+
+def processar_payload_webhook(dados):
+    """
+    Processa um payload do webhook (texto ou arquivo) e registra no banco
+    Usado pelos workers da fila e pelo /webhook no modo síncrono
     
-    # Converter valor para float se encontrado
-    valor_detectado = None
-    if valores:
-        try:
-            # Pega o primeiro valor encontrado e converte
-            valor_str = valores[0].replace('.', '').replace(',', '.')
-            valor_detectado = float(valor_str)
-        except ValueError:
-            pass
+    Returns:
+        Dict com o resultado do processamento
+        
+    Raises:
+        Exception: em falhas transitórias (ex.: download), para nova tentativa
+    """
+    telefone = extrair_numero_telefone(dados.get('from', ''))
+    nome_contato = dados.get('sender', {}).get('name', dados.get('notifyName', ''))
+    tipo_mensagem = dados.get('type', 'text')
+    timestamp = dados.get('timestamp', datetime.now().isoformat())
     
-    return {
-        'valor': valor_detectado,
-        'categoria': categoria_detectada,
-        'tem_valor': valor_detectado is not None
+    mensagem_id = None
+    despesa_id = None
+
+    # Processar baseado no tipo de mensagem
+    if tipo_mensagem == 'text':
+        # Mensagem de texto
+        texto = dados.get('body', dados.get('content', ''))
+        if texto:
+            # Verificar se é possível extrair dados de despesa do texto
+            info_despesa = processar_texto_despesa(texto)
+            despesa = None
+            if info_despesa['tem_valor']:
+                despesa = {
+                    'tipo_despesa': 'texto_com_valor',
+                    'valor': info_despesa['valor'],
+                    'categoria': info_despesa['categoria'],
+                    'descricao': texto[:200],  # Limite de 200 caracteres
+                    'data_despesa': datetime.now().strftime('%Y-%m-%d')
+                }
+
+            # Contato, mensagem e despesa gravados numa única transação
+            resultado = wpp_manager.ingerir_mensagem(
+                telefone=telefone,
+                texto=texto,
+                nome_contato=nome_contato,
+                metadados={
+                    'timestamp': timestamp,
+                    'webhook_data': dados
+                },
+                despesa=despesa
+            )
+            mensagem_id = resultado['mensagem_id']
+            despesa_id = resultado['despesa_id']
+
+    elif tipo_mensagem in ['image', 'document', 'audio', 'video', 'ptt']:
+        # Mensagens com arquivos
+        legenda = dados.get('caption', dados.get('body', ''))
+
+        # Informações do arquivo
+        arquivo_info = dados.get('mediaData', dados.get('media', {}))
+        nome_arquivo = arquivo_info.get('filename', f'arquivo_{timestamp}.bin')
+        url_arquivo = arquivo_info.get('url', '')
+
+        if url_arquivo:
+            # A pasta do contato precisa existir antes de salvar o arquivo
+            wpp_manager.registrar_contato(telefone, nome_contato)
+
+            # Conteúdo que o contato já enviou (mesmo hash): não precisa baixar
+            arquivo = None
+            hash_informado = hash_do_payload(arquivo_info)
+            if hash_informado:
+                arquivo = wpp_manager.armazenar_blob_conhecido(telefone, nome_arquivo, hash_informado)
+
+            if arquivo is None:
+                # Download gravado direto no repositório de blobs, com hash e tamanho
+                # calculados durante a escrita; falhas propagam para a fila tentar de novo
+                arquivo = wpp_manager.armazenar_stream(
+                    telefone, nome_arquivo,
+                    lambda destino: baixador_midia.baixar(url_arquivo, destino, ALGORITMO_HASH)
+                )
+
+            # Para imagens e documentos, assumir que pode ser comprovante de despesa
+            despesa = None
+            if tipo_mensagem in ['image', 'document']:
+                # Tentar extrair valor da legenda se houver
+                info_despesa = processar_texto_despesa(legenda) if legenda else {'valor': None, 'categoria': 'documento'}
+                despesa = {
+                    'tipo_despesa': 'comprovante',
+                    'valor': info_despesa.get('valor'),
+                    'categoria': info_despesa.get('categoria', 'documento'),
+                    'descricao': legenda[:200] if legenda else 'Arquivo enviado sem descrição',
+                    'data_despesa': datetime.now().strftime('%Y-%m-%d')
+                }
+
+            resultado = wpp_manager.ingerir_mensagem(
+                telefone=telefone,
+                texto=legenda,
+                nome_contato=nome_contato,
+                metadados={
+                    'timestamp': timestamp,
+                    'tipo_original': tipo_mensagem,
+                    'webhook_data': dados
+                },
+                arquivo=arquivo,
+                despesa=despesa
+            )
+            mensagem_id = resultado['mensagem_id']
+            despesa_id = resultado['despesa_id']
+        else:
+            print(f"⚠️ URL do arquivo não fornecida para mensagem de: {telefone}")
+
+    # Resposta de sucesso
+    resposta = {
+        'success': True,
+        'telefone': telefone,
+        'tipo_mensagem': tipo_mensagem,
+        'mensagem_id': mensagem_id,
+        'timestamp': datetime.now().isoformat()
     }
 
+    if despesa_id:
+        resposta['despesa_id'] = despesa_id
+        resposta['despesa_registrada'] = True
+    
+    return resposta
+
+# Fila durável: /webhook responde 202 e os workers processam em segundo plano
+fila_webhook = None
+if Config.WEBHOOK_ASSINCRONO:
+    fila_webhook = FilaWebhook(
+        wpp_manager,
+        processar_payload_webhook,
+        workers=Config.FILA_WORKERS,
+        max_tentativas=Config.FILA_MAX_TENTATIVAS,
+        atraso_base=Config.FILA_ATRASO_BASE,
+        retencao_horas=Config.FILA_RETENCAO_HORAS
+    )
+    fila_webhook.iniciar()
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     stats = wpp_manager.obter_estatisticas()
-    return jsonify({
+    resposta = {
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
         'sistema': 'WhatsApp Manager Python',
         'estatisticas': stats
-    })
+    }
+    if fila_webhook:
+        # Só os contadores baratos; o total de concluídos fica no /fila
+        resposta['fila'] = fila_webhook.metricas(completo=False)
+    resposta['midia'] = baixador_midia.estatisticas()
+    return jsonify(resposta)
 
 @app.route('/webhook', methods=['POST'])
 def receber_webhook():
@@ -127,147 +254,350 @@ def receber_webhook():
         
         # Extrair informações da mensagem
         telefone = extrair_numero_telefone(dados.get('from', ''))
-        nome_contato = dados.get('sender', {}).get('name', dados.get('notifyName', ''))
         tipo_mensagem = dados.get('type', 'text')
-        timestamp = dados.get('timestamp', datetime.now().isoformat())
         
         if not telefone:
             print("⚠️ Telefone não identificado na mensagem")
             return jsonify({'warning': 'Telefone não identificado'}), 200
         
-        mensagem_id = None
-        despesa_id = None
-        
-        # Processar baseado no tipo de mensagem
-        if tipo_mensagem == 'text':
-            # Mensagem de texto
-            texto = dados.get('body', dados.get('content', ''))
-            if texto:
-                mensagem_id = wpp_manager.processar_mensagem_texto(
-                    telefone=telefone,
-                    texto=texto,
-                    nome_contato=nome_contato,
-                    metadados={
-                        'timestamp': timestamp,
-                        'webhook_data': dados
-                    }
-                )
-                
-                # Verificar se é possível extrair dados de despesa do texto
-                info_despesa = processar_texto_despesa(texto)
-                if info_despesa['tem_valor']:
-                    despesa_id = wpp_manager.registrar_despesa(
-                        mensagem_id=mensagem_id,
-                        tipo_despesa='texto_com_valor',
-                        valor=info_despesa['valor'],
-                        categoria=info_despesa['categoria'],
-                        descricao=texto[:200],  # Limite de 200 caracteres
-                        data_despesa=datetime.now().strftime('%Y-%m-%d')
-                    )
-        
-        elif tipo_mensagem in ['image', 'document', 'audio', 'video', 'ptt']:
-            # Mensagens com arquivos
-            legenda = dados.get('caption', dados.get('body', ''))
-            
-            # Informações do arquivo
-            arquivo_info = dados.get('mediaData', dados.get('media', {}))
-            nome_arquivo = arquivo_info.get('filename', f'arquivo_{timestamp}.bin')
-            url_arquivo = arquivo_info.get('url', '')
-            
-            if url_arquivo:
-                # Baixar arquivo
-                caminho_temp = baixar_arquivo_temporario(url_arquivo, nome_arquivo)
-                
-                if caminho_temp:
-                    mensagem_id = wpp_manager.processar_mensagem_arquivo(
-                        telefone=telefone,
-                        caminho_arquivo=caminho_temp,
-                        nome_contato=nome_contato,
-                        legenda=legenda,
-                        metadados={
-                            'timestamp': timestamp,
-                            'tipo_original': tipo_mensagem,
-                            'webhook_data': dados
-                        }
-                    )
-                    
-                    # Para imagens e documentos, assumir que pode ser comprovante de despesa
-                    if tipo_mensagem in ['image', 'document'] and mensagem_id:
-                        # Tentar extrair valor da legenda se houver
-                        info_despesa = processar_texto_despesa(legenda) if legenda else {'valor': None, 'categoria': 'documento'}
-                        
-                        despesa_id = wpp_manager.registrar_despesa(
-                            mensagem_id=mensagem_id,
-                            tipo_despesa='comprovante',
-                            valor=info_despesa.get('valor'),
-                            categoria=info_despesa.get('categoria', 'documento'),
-                            descricao=legenda[:200] if legenda else 'Arquivo enviado sem descrição',
-                            data_despesa=datetime.now().strftime('%Y-%m-%d')
-                        )
-                    
-                    # Limpar arquivo temporário
-                    try:
-                        os.unlink(caminho_temp)
-                    except:
-                        pass
-                else:
-                    print(f"❌ Falha ao baixar arquivo de: {telefone}")
-            else:
-                print(f"⚠️ URL do arquivo não fornecida para mensagem de: {telefone}")
-        
-        # Resposta de sucesso
-        resposta = {
-            'success': True,
-            'telefone': telefone,
-            'tipo_mensagem': tipo_mensagem,
-            'mensagem_id': mensagem_id,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        if despesa_id:
-            resposta['despesa_id'] = despesa_id
-            resposta['despesa_registrada'] = True
-        
-        return jsonify(resposta)
+        if fila_webhook:
+            # Gravar na fila durável e responder já; os workers processam em segundo plano
+            item_id = fila_webhook.enfileirar(telefone, dados)
+            return jsonify({
+                'success': True,
+                'enfileirado': True,
+                'fila_id': item_id,
+                'telefone': telefone,
+                'tipo_mensagem': tipo_mensagem,
+                'timestamp': datetime.now().isoformat()
+            }), 202
+        
+        return jsonify(processar_payload_webhook(dados))
     
     except Exception as e:
         print(f"❌ Erro no webhook: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def normalizar_timestamp(timestamp):
+    """Converte timestamp do webhook (epoch ou ISO) para o formato do SQLite"""
+    try:
+        if isinstance(timestamp, (int, float)):
+            data = datetime.fromtimestamp(timestamp)
+        else:
+            data = datetime.fromisoformat(str(timestamp))
+        return data.strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError, OSError):
+        return None
+
+def payload_para_mensagem_lote(dados):
+    """
+    Converte um payload de webhook de texto no formato de WhatsAppManager.processar_lote
+    Retorna None para payloads que não são texto (mídias exigem download)
+    """
+    if not isinstance(dados, dict) or dados.get('type', 'text') != 'text':
+        return None
+
+    telefone = extrair_numero_telefone(dados.get('from', ''))
+    texto = dados.get('body', dados.get('content', ''))
+    if not telefone or not texto:
+        return None
+
+    timestamp = dados.get('timestamp')
+    mensagem = {
+        'telefone': telefone,
+        'texto': texto,
+        'nome_contato': dados.get('sender', {}).get('name', dados.get('notifyName', '')),
+        'metadados': {'timestamp': timestamp, 'origem': 'lote', 'webhook_data': dados},
+        'data_recebimento': normalizar_timestamp(timestamp) if timestamp else None
+    }
+
+    info_despesa = processar_texto_despesa(texto)
+    if info_despesa['tem_valor']:
+        mensagem['despesa'] = {
+            'tipo_despesa': 'texto_com_valor',
+            'valor': info_despesa['valor'],
+            'categoria': info_despesa['categoria'],
+            'descricao': texto[:200],
+            'data_despesa': (mensagem['data_recebimento'] or datetime.now().strftime('%Y-%m-%d'))[:10]
+        }
+
+    return mensagem
+
+@app.route('/webhook/lote', methods=['POST'])
+def receber_webhook_lote():
+    """
+    Importa históricos exportados em massa
+    Aceita um array JSON de payloads do webhook ou NDJSON (um payload por linha,
+    lido em streaming, com memória constante para qualquer tamanho de arquivo)
+    """
+    try:
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        if WEBHOOK_TOKEN != 'seu_token_webhook_aqui' and not validar_webhook(token):
+            return jsonify({'error': 'Token inválido'}), 401
+
+        ignoradas = [0]
+        # Linha do NDJSON (ou posição no array, a partir de 1) sendo processada
+        linha = [0]
+
+        if request.mimetype == 'application/x-ndjson':
+            def _payloads():
+                for linha[0], conteudo in enumerate(iter(request.stream.readline, b''), 1):
+                    if conteudo.strip():
+                        yield json.loads(conteudo)
+            payloads = _payloads()
+        else:
+            payloads = request.get_json()
+            if not isinstance(payloads, list):
+                return jsonify({'error': 'Esperado um array de mensagens'}), 400
+            payloads = (dados for linha[0], dados in enumerate(payloads, 1))
+
+        def _mensagens():
+            for dados in payloads:
+                mensagem = payload_para_mensagem_lote(dados)
+                if mensagem is None:
+                    ignoradas[0] += 1
+                else:
+                    yield mensagem
+
+        tamanho_lote = request.args.get('tamanho_lote', 1000, type=int)
+        try:
+            totais = wpp_manager.processar_lote(_mensagens(), tamanho_lote=tamanho_lote,
+                                                posicao=lambda: linha[0])
+        except ErroLote as e:
+            # Blocos anteriores ao erro já foram gravados: informar o que entrou,
+            # a última linha gravada (o cliente retoma a partir da seguinte) e
+            # a linha lida quando o erro ocorreu
+            entrada_invalida = isinstance(e.causa, ValueError)  # inclui JSONDecodeError
+            print(f"❌ Erro no lote (linha {linha[0]}, gravado até a linha {e.posicao_gravada or 0}): {e}")
+            return jsonify({
+                'success': False,
+                'error': f'NDJSON inválido: {e}' if isinstance(e.causa, json.JSONDecodeError) else str(e),
+                'ultima_linha_gravada': e.posicao_gravada or 0,
+                'linha_erro': linha[0],
+                'ignoradas': ignoradas[0],
+                **e.totais
+            }), 400 if entrada_invalida else 500
+
+        return jsonify({
+            'success': True,
+            'ignoradas': ignoradas[0],
+            **totais
+        })
+
+    except Exception as e:
+        print(f"❌ Erro no lote: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/fila', methods=['GET'])
+def obter_metricas_fila():
+    """Profundidade da fila de webhooks, atraso e mortas"""
+    if not fila_webhook:
+        return jsonify({'error': 'Fila desativada (WEBHOOK_ASSINCRONO=False)'}), 404
+    try:
+        return jsonify(fila_webhook.metricas())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/fila/<int:item_id>', methods=['GET'])
+def obter_item_fila(item_id):
+    """Situação e resultado de um webhook enfileirado"""
+    if not fila_webhook:
+        return jsonify({'error': 'Fila desativada (WEBHOOK_ASSINCRONO=False)'}), 404
+    try:
+        item = fila_webhook.obter_item(item_id)
+        if not item:
+            return jsonify({'error': 'Item não encontrado'}), 404
+        return jsonify(item)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/fila/mortas/reprocessar', methods=['POST'])
+def reprocessar_fila_mortas():
+    """
+    Devolve para a fila os itens mortos (todos ou o 'id' informado)
+
+    Itens com webhooks posteriores do mesmo telefone já processados são
+    recusados (campo 'recusados'), a menos que o corpo traga "forcar": true
+    """
+    if not fila_webhook:
+        return jsonify({'error': 'Fila desativada (WEBHOOK_ASSINCRONO=False)'}), 404
+    try:
+        dados = request.get_json(silent=True) or {}
+        resultado = fila_webhook.reprocessar_mortas(dados.get('id'), bool(dados.get('forcar')))
+        return jsonify({'success': True, **resultado})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parametros_pagina(limite_padrao):
+    """Cursor (after_id) e tamanho da página (limit, ou limite) da query string"""
+    limite = request.args.get('limit', request.args.get('limite', limite_padrao, type=int), type=int)
+    apos_id = request.args.get('after_id', type=int)
+    return apos_id, max(1, min(limite, LIMITE_PAGINA_MAXIMO))
+
+def paginar(itens, limite):
+    """
+    Separa a página e o cursor da próxima
+    Os itens devem ter sido consultados com limite + 1: o excedente só indica
+    que há mais páginas (next_cursor é None na última)
+    """
+    if len(itens) > limite:
+        itens = itens[:limite]
+        return itens, itens[-1]['id']
+    return itens, None
+
 @app.route('/mensagens/<telefone>', methods=['GET'])
 def listar_mensagens(telefone):
-    """Lista mensagens de um contato"""
+    """Lista mensagens de um contato (mais recentes primeiro, ?after_id=&limit=)"""
     try:
-        limite = request.args.get('limite', 50, type=int)
-        mensagens = wpp_manager.listar_mensagens_contato(telefone, limite)
+        apos_id, limite = parametros_pagina(50)
+        mensagens, proximo = paginar(
+            wpp_manager.listar_mensagens_contato(telefone, limite + 1, apos_id), limite)
         
         return jsonify({
             'telefone': telefone,
             'total': len(mensagens),
-            'mensagens': mensagens
+            'mensagens': mensagens,
+            'next_cursor': proximo
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/mensagens/<telefone>/exportar', methods=['GET'])
+def exportar_mensagens(telefone):
+    """Exporta todas as mensagens de um contato em streaming (?formato=ndjson|json|csv)"""
+    try:
+        formato = formato_exportacao()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    colunas = [nome for nome, _ in COLUNAS_MENSAGENS]
+    return resposta_streaming(wpp_manager.exportar_mensagens_contato(telefone), formato,
+                              colunas, f'mensagens_{telefone}')
+
+def filtros_despesas_da_query(status_padrao):
+    """
+    Filtros de despesas da query string (ver WhatsAppManager.buscar_despesas)
+    status e categoria aceitam vários valores separados por vírgula; status=todos não filtra
+    """
+    def _lista(nome, padrao=None):
+        valor = request.args.get(nome, padrao)
+        return [item.strip() for item in valor.split(',') if item.strip()] if valor else None
+    
+    status = _lista('status', status_padrao)
+    return {
+        'status': None if status == ['todos'] else status,
+        'categoria': _lista('categoria'),
+        'telefone': request.args.get('telefone') or None,
+        'contato_id': request.args.get('contato_id', type=int),
+        'data_inicio': data_parametro('data_inicio'),
+        'data_fim': data_parametro('data_fim'),
+        'valor_min': request.args.get('valor_min', type=float),
+        'valor_max': request.args.get('valor_max', type=float),
+    }
+
 @app.route('/despesas', methods=['GET'])
 def listar_despesas():
-    """Lista despesas pendentes ou todas"""
+    """
+    Lista despesas com filtros, ordenação e paginação por cursor
+    ?status=pendente (padrão; 'todos' ou lista com vírgulas) &categoria= &telefone= &contato_id=
+    &data_inicio= &data_fim= &valor_min= &valor_max= &ordenar=id|data_despesa|data_registro|valor
+    &direcao=desc|asc &limit= &after_id=<next_cursor>
+    """
     try:
-        status = request.args.get('status', 'pendente')
-        
-        if status == 'pendente':
-            despesas = wpp_manager.listar_despesas_pendentes()
-        else:
-            # Implementar listagem com filtros se necessário
-            despesas = wpp_manager.listar_despesas_pendentes()
+        _, limite = parametros_pagina(100)
+        resultado = wpp_manager.buscar_despesas(
+            filtros_despesas_da_query('pendente'),
+            ordenar=request.args.get('ordenar', 'id'),
+            decrescente=request.args.get('direcao', 'desc').lower() != 'asc',
+            limite=limite,
+            apos=request.args.get('after_id') or None
+        )
         
         return jsonify({
-            'total': len(despesas),
-            'despesas': despesas
+            'total': len(resultado['despesas']),
+            'despesas': resultado['despesas'],
+            'next_cursor': resultado['next_cursor']
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def resposta_streaming(lotes, formato, colunas, nome_arquivo):
+    """
+    Resposta enviada enquanto as páginas são lidas (memória constante)
+    Cada página da consulta vira um único pedaço da resposta; o cabeçalho
+    (ou o '[' do JSON) sai antes da primeira leitura do banco
+    """
+    def _linha_json(item):
+        return json.dumps(item, ensure_ascii=False, default=str)
+    
+    def _ndjson():
+        for lote in lotes:
+            yield ''.join(_linha_json(item) + '\n' for item in lote)
+    
+    def _json():
+        yield '['
+        separador = '\n'
+        for lote in lotes:
+            yield separador + ',\n'.join(_linha_json(item) for item in lote)
+            separador = ',\n'
+        yield '\n]\n'
+    
+    def _csv():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(colunas)
+        yield buffer.getvalue()
+        for lote in lotes:
+            buffer.seek(0)
+            buffer.truncate()
+            escritor.writerows([item[coluna] for coluna in colunas] for item in lote)
+            yield buffer.getvalue()
+    
+    def _gerar():
+        try:
+            yield from {'ndjson': _ndjson, 'json': _json, 'csv': _csv}[formato]()
+        except Exception as e:
+            # O status 200 já foi enviado; o corte no meio do arquivo indica a falha
+            print(f"❌ Exportação {nome_arquivo} interrompida: {e}")
+            raise
+        finally:
+            lotes.close()  # devolve a conexão ao pool se o cliente desistir
+    
+    return Response(_gerar(), mimetype=FORMATOS_EXPORTACAO[formato], headers={
+        'Content-Disposition': f'attachment; filename="{nome_arquivo}.{formato}"'
+    })
+
+def formato_exportacao():
+    """Formato pedido em ?formato= (ndjson por padrão)"""
+    formato = request.args.get('formato', 'ndjson').lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS_EXPORTACAO)})")
+    return formato
+
+def data_parametro(nome):
+    """Data YYYY-MM-DD da query string (ou None)"""
+    valor = request.args.get(nome)
+    if valor:
+        datetime.strptime(valor, '%Y-%m-%d')  # ValueError se inválida
+    return valor or None
+
+@app.route('/despesas/exportar', methods=['GET'])
+def exportar_despesas():
+    """
+    Exporta despesas em streaming (?formato=ndjson|json|csv)
+    Aceita os mesmos filtros de /despesas (sem filtro de status por padrão)
+    """
+    try:
+        formato = formato_exportacao()
+        lotes = wpp_manager.exportar_despesas(filtros_despesas_da_query('todos'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    colunas = [nome for nome, _ in COLUNAS_DESPESAS]
+    return resposta_streaming(lotes, formato, colunas, 'despesas')
+
 @app.route('/despesas/<int:despesa_id>', methods=['PUT'])
 def atualizar_despesa(despesa_id):
     """Atualiza status de uma despesa"""
@@ -300,70 +630,76 @@ def criar_despesa_manual():
         if not telefone or valor is None:
             return jsonify({'error': 'Telefone e valor são obrigatórios'}), 400
         
-        # Criar mensagem de texto primeiro (para ter referência)
-        mensagem_id = wpp_manager.processar_mensagem_texto(
+        # Mensagem de texto (para ter referência) e despesa na mesma transação
+        resultado = wpp_manager.ingerir_mensagem(
             telefone=telefone,
             texto=f"Despesa manual: {descricao}",
-            nome_contato=dados.get('nome_contato')
-        )
-        
-        # Criar despesa
-        despesa_id = wpp_manager.registrar_despesa(
-            mensagem_id=mensagem_id,
-            tipo_despesa=dados.get('tipo_despesa', 'manual'),
-            valor=valor,
-            descricao=descricao,
-            categoria=dados.get('categoria', 'outros'),
-            data_despesa=dados.get('data_despesa', datetime.now().strftime('%Y-%m-%d'))
+            nome_contato=dados.get('nome_contato'),
+            despesa={
+                'tipo_despesa': dados.get('tipo_despesa', 'manual'),
+                'valor': valor,
+                'descricao': descricao,
+                'categoria': dados.get('categoria', 'outros'),
+                'data_despesa': dados.get('data_despesa', datetime.now().strftime('%Y-%m-%d'))
+            }
         )
         
         return jsonify({
             'success': True,
-            'despesa_id': despesa_id,
-            'mensagem_id': mensagem_id
+            'despesa_id': resultado['despesa_id'],
+            'mensagem_id': resultado['mensagem_id']
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def resposta_categorias(dados):
+    """JSON das categorias; 'prioridade' guarda a ordem (o jsonify ordena as chaves)"""
+    return jsonify({**dados, 'prioridade': list(dados['categorias'])})
+
+@app.route('/categorias', methods=['GET'])
+def listar_categorias():
+    """Categorias de despesa e palavras-chave em uso (com a versão)"""
+    try:
+        return resposta_categorias(wpp_manager.obter_categorias_despesa())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/categorias', methods=['PUT'])
+def substituir_categorias():
+    """Substitui as categorias de despesa: {"categorias": {"combustivel": ["gasolina", ...], ...}}"""
+    try:
+        dados = request.get_json(silent=True) or {}
+        return resposta_categorias(wpp_manager.salvar_categorias_despesa(dados.get('categorias')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/categorias/<categoria>/palavras', methods=['POST'])
+def adicionar_palavras_categoria(categoria):
+    """Acrescenta palavras-chave a uma categoria: {"palavras": ["pedágio"]}"""
+    try:
+        dados = request.get_json(silent=True) or {}
+        return resposta_categorias(wpp_manager.adicionar_palavras_categoria(categoria, dados.get('palavras')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/contatos', methods=['GET'])
 def listar_contatos():
-    """Lista todos os contatos"""
+    """Lista os contatos (mais recentes primeiro, ?after_id=&limit=)"""
     try:
-        import sqlite3
-        
-        conn = sqlite3.connect(wpp_manager.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT c.id, c.telefone, c.nome, c.pasta_contato, c.data_criacao, c.ultimo_contato,
-                   COUNT(m.id) as total_mensagens,
-                   COUNT(d.id) as total_despesas
-            FROM contatos c
-            LEFT JOIN mensagens m ON c.id = m.contato_id
-            LEFT JOIN despesas d ON c.id = d.contato_id
-            GROUP BY c.id
-            ORDER BY c.ultimo_contato DESC
-        ''')
+        apos_id, limite = parametros_pagina(100)
         
-        contatos = []
-        for row in cursor.fetchall():
-            contatos.append({
-                'id': row[0],
-                'telefone': row[1],
-                'nome': row[2],
-                'pasta_contato': row[3],
-                'data_criacao': row[4],
-                'ultimo_contato': row[5],
-                'total_mensagens': row[6],
-                'total_despesas': row[7]
-            })
-        
-        conn.close()
+        contatos = wpp_manager.listar_contatos(limite + 1, apos_id)
+        contatos, proximo = paginar(contatos, limite)
         
         return jsonify({
             'total': len(contatos),
-            'contatos': contatos
+            'contatos': contatos,
+            'next_cursor': proximo
         })
     
     except Exception as e:
@@ -446,8 +782,5 @@ if __name__ == '__main__':
     print(f"👥 Contatos: http://localhost:5000/contatos")
     print(f"📊 Estatísticas: http://localhost:5000/estatisticas")
     
-    # Criar pasta temporária se não existir
-    os.makedirs(PASTA_TEMP, exist_ok=True)
-    
     # Rodar servidor
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -8,41 +8,276 @@ import os
 import sqlite3
 import json
 import shutil
-from datetime import datetime
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Dict, List
-import hashlib
+from typing import Optional, Dict, List, Iterable, Iterator, Callable, Any
 import mimetypes
+import uuid
+import base64
 
 # Importar configurações
 from config import Config
+from banco_dados import PoolConexoes, EscritorSerializado, obter_perfil, aplicar_migracoes
+from cache_contatos import CacheContatos
+import calculo_hash
+import layout_pastas
+import contadores
+from extrator_despesas import ExtratorDespesas, CATEGORIAS_PADRAO, validar_categorias
+
+
+# Migrações do schema, controladas por PRAGMA user_version
+# (versao, descricao, comandos); nunca altere uma migração já publicada
+MIGRACOES = [
+    (1, "índices dos caminhos de consulta principais", [
+        'CREATE INDEX IF NOT EXISTS idx_mensagens_telefone_data ON mensagens (telefone, data_recebimento)',
+        'CREATE INDEX IF NOT EXISTS idx_mensagens_contato ON mensagens (contato_id)',
+        'CREATE INDEX IF NOT EXISTS idx_despesas_status_data ON despesas (status, data_registro)',
+        'CREATE INDEX IF NOT EXISTS idx_despesas_contato ON despesas (contato_id)',
+    ]),
+    (2, "fila durável de webhooks (outbox)", [
+        '''
+        CREATE TABLE IF NOT EXISTS fila_webhook (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telefone TEXT NOT NULL,
+            particao INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pendente',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            proxima_tentativa REAL NOT NULL,
+            criado_em REAL NOT NULL,
+            processado_em REAL,
+            ultimo_erro TEXT,
+            resultado TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_fila_status_id ON fila_webhook (status, id)',
+        'CREATE INDEX IF NOT EXISTS idx_fila_telefone_id ON fila_webhook (telefone, id)',
+    ]),
+    (3, "repositório de blobs com contagem de referências", [
+        '''
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            tamanho INTEGER,
+            referencias INTEGER NOT NULL DEFAULT 0,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_mensagens_hash ON mensagens (hash_arquivo)',
+    ]),
+    (4, "contador de arquivos por contato e nome original do arquivo", [
+        'ALTER TABLE contatos ADD COLUMN contador_arquivos INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE mensagens ADD COLUMN nome_original TEXT',
+    ]),
+    (5, "versão das configurações (recarga das categorias de despesa)", [
+        'ALTER TABLE configuracoes ADD COLUMN versao INTEGER NOT NULL DEFAULT 1',
+    ]),
+    (6, "índices da paginação por cursor (id decrescente)", [
+        'CREATE INDEX IF NOT EXISTS idx_mensagens_telefone_id ON mensagens (telefone, id)',
+        'CREATE INDEX IF NOT EXISTS idx_despesas_status_id ON despesas (status, id)',
+    ]),
+    (7, "índice da data da despesa (exportações por período)", [
+        'CREATE INDEX IF NOT EXISTS idx_despesas_data ON despesas (data_despesa)',
+    ]),
+    (8, "índices dos filtros de despesas por categoria e valor", [
+        'CREATE INDEX IF NOT EXISTS idx_despesas_categoria_id ON despesas (categoria, id)',
+        'CREATE INDEX IF NOT EXISTS idx_despesas_valor ON despesas (valor)',
+    ]),
+    (9, "contadores das estatísticas mantidos por triggers", [
+        contadores.TABELA,
+        *contadores.TRIGGERS,
+        contadores.recalcular,
+    ]),
+    (10, "resumo por contato (totais, última mensagem e valor pendente)", [
+        contadores.TABELA_RESUMO,
+        *contadores.TRIGGERS_RESUMO,
+        contadores.recalcular_resumo,
+    ]),
+    (11, "referências de blobs por vínculo distinto, mantidas por triggers", [
+        *contadores.TRIGGERS_BLOBS,
+        contadores.recalcular_referencias,
+    ]),
+    (12, "índices de expressão das ordenações de despesas por valor e data", [
+        'CREATE INDEX IF NOT EXISTS idx_despesas_ord_valor ON despesas (IFNULL(valor, 0), id)',
+        'CREATE INDEX IF NOT EXISTS idx_despesas_status_ord_valor ON despesas (status, IFNULL(valor, 0), id)',
+        "CREATE INDEX IF NOT EXISTS idx_despesas_ord_data ON despesas (IFNULL(data_despesa, ''), id)",
+        "CREATE INDEX IF NOT EXISTS idx_despesas_status_ord_data ON despesas (status, IFNULL(data_despesa, ''), id)",
+    ]),
+]
+
+# Subpasta da pasta do contato para cada tipo de arquivo
+PASTAS_TIPO = {
+    'imagem': 'imagens',
+    'documento': 'documentos',
+    'audio': 'audios',
+    'video': 'videos',
+    'outros': 'outros',
+}
+
+# Máximo de pastas lembradas como já criadas (o conjunto é zerado ao atingir)
+LIMITE_CACHE_PASTAS = 100_000
+
+# Hash que identifica o conteúdo no repositório de blobs
+ALGORITMO_HASH = Config.HASH_ALGORITMO
+
+# Cursor inicial das listagens paginadas (maior que qualquer id)
+SEM_CURSOR = 2 ** 63 - 1
+
+# Colunas das buscas e exportações de despesas (nome no resultado, expressão SQL)
+COLUNAS_DESPESAS = [
+    ('id', 'd.id'),
+    ('tipo', 'd.tipo_despesa'),
+    ('valor', 'd.valor'),
+    ('descricao', 'd.descricao'),
+    ('categoria', 'd.categoria'),
+    ('status', 'd.status'),
+    ('data_despesa', 'd.data_despesa'),
+    ('data_registro', 'd.data_registro'),
+    ('nome_contato', 'c.nome'),
+    ('telefone', 'c.telefone'),
+    ('arquivo', 'm.nome_arquivo'),
+    ('caminho_arquivo', 'm.caminho_arquivo'),
+]
+
+# Filtros aceitos por buscar_despesas e exportar_despesas
+FILTROS_DESPESAS = ('status', 'categoria', 'telefone', 'contato_id',
+                    'data_inicio', 'data_fim', 'valor_min', 'valor_max')
+
+# Ordenações de buscar_despesas (sem data ou valor contam como vazio/0, para o cursor);
+# as expressões são exatamente as dos índices da migração 12
+ORDENACOES_DESPESAS = {
+    'id': 'd.id',
+    'data_despesa': "IFNULL(d.data_despesa, '')",
+    'data_registro': 'd.data_registro',
+    'valor': 'IFNULL(d.valor, 0)',
+}
+
+# Colunas das exportações de mensagens de um contato
+COLUNAS_MENSAGENS = [
+    ('id', 'm.id'),
+    ('tipo', 'm.tipo_mensagem'),
+    ('texto', 'm.conteudo_texto'),
+    ('arquivo', 'm.nome_arquivo'),
+    ('nome_original', 'm.nome_original'),
+    ('caminho', 'm.caminho_arquivo'),
+    ('hash_arquivo', 'm.hash_arquivo'),
+    ('data', 'm.data_recebimento'),
+]
+
+# Chave da tabela configuracoes com as categorias de despesa (JSON)
+CHAVE_CATEGORIAS_DESPESA = 'categorias_despesa'
+
+
+class ErroLote(Exception):
+    """
+    Falha no meio de processar_lote; totais traz o que já foi gravado e
+    posicao_gravada a posição da entrada (ver processar_lote) ao fim do
+    último bloco gravado
+    """
+
+    def __init__(self, causa: Exception, totais: Dict, posicao_gravada=None):
+        super().__init__(str(causa))
+        self.causa = causa
+        self.totais = totais
+        self.posicao_gravada = posicao_gravada
+
 
 class WhatsAppManager:
-    def __init__(self, pasta_raiz: Optional[str] = None):
+    def __init__(self, pasta_raiz: Optional[str] = None, perfil_banco: Optional[str] = None):
         """
         Inicializa o gerenciador do WhatsApp
         
         Args:
             pasta_raiz: Pasta principal onde serão salvos os arquivos dos clientes
                        Se None, usa Config.PASTA_RAIZ
+            perfil_banco: Perfil de armazenamento do SQLite ('wal' ou 'padrao')
+                          Se None, usa Config.DB_PERFIL
         """
         # CORREÇÃO: Usar Config.PASTA_RAIZ em vez de parâmetro padrão
         if pasta_raiz is None:
             self.pasta_raiz = Path(Config.PASTA_RAIZ)
         else:
             self.pasta_raiz = Path(pasta_raiz)
+        
+        # Organização das pastas de contatos ('plano' ou 'fragmentado')
+        self.layout_pastas = Config.LAYOUT_PASTAS
+        
+        # Conteúdo dos arquivos, uma cópia por hash; as pastas dos contatos têm hardlinks
+        self.pasta_blobs = Path(Config.PASTA_BLOBS) if Config.PASTA_BLOBS else self.pasta_raiz.parent / 'blobs'
             
         # CORREÇÃO: Usar Config.DATABASE_PATH 
         self.db_path = Config.DATABASE_PATH
         
+        self.pool = None
+        self.escritor = None
+        
+        # Pastas já criadas neste processo (evita mkdir/stat repetidos)
+        self._pastas_existentes: set = set()
+        self._lock_pastas = threading.Lock()
+        
+        # Contatos conhecidos e "último contato" acumulado para gravação periódica
+        self.cache_contatos = CacheContatos(Config.CACHE_CONTATOS_TAMANHO, Config.CACHE_CONTATOS_TTL)
+        self._ultimo_contato_pendente: Dict[int, str] = {}
+        self._lock_ultimo_contato = threading.Lock()
+        self._parar_gravacao = threading.Event()
+        self._thread_gravacao = None
+        
+        # Extrator de despesas compilado e a versão das categorias que o gerou
+        self._extrator_despesas = (0, ExtratorDespesas())
+        self._proxima_verificacao_categorias = 0.0
+        self._lock_categorias = threading.Lock()
+        
         # Criar pasta raiz se não existir
         self.pasta_raiz.mkdir(parents=True, exist_ok=True)
         
-        self.init_database()
+        self.init_database(perfil_banco)
     
-    def init_database(self):
-        """Inicializa o banco de dados SQLite"""
-        conn = sqlite3.connect(self.db_path)
+    def init_database(self, perfil: Optional[str] = None):
+        """
+        Inicializa o banco de dados SQLite
+        
+        Args:
+            perfil: Perfil de armazenamento (PRAGMAs) a aplicar
+                    Se None, usa Config.DB_PERFIL
+        """
+        self._configurar_armazenamento(perfil or Config.DB_PERFIL)
+        self.escritor.executar(self._criar_tabelas)
+        self.escritor.executar(aplicar_migracoes, MIGRACOES)
+        print(f"✅ Banco de dados inicializado com sucesso! (perfil: {self.perfil_banco})")
+    
+    def _configurar_armazenamento(self, perfil: str):
+        """Cria o escritor dedicado e o pool de leitura para o perfil escolhido"""
+        pragmas = obter_perfil(
+            perfil,
+            busy_timeout=Config.DB_BUSY_TIMEOUT,
+            mmap_size=Config.DB_MMAP_SIZE,
+            cache_size=Config.DB_CACHE_SIZE
+        )
+        
+        # Trocar de perfil: escritas pendentes terminam antes da troca
+        if self.escritor or self.pool:
+            self.fechar()
+        
+        self.perfil_banco = perfil
+        
+        # Todas as escritas passam por uma única thread (sem disputa de lock)
+        self.escritor = EscritorSerializado(self.db_path, pragmas, timeout=Config.DB_TIMEOUT)
+        
+        # Conexões persistentes de leitura compartilhadas entre as threads do Flask
+        self.pool = PoolConexoes(self.db_path, tamanho=Config.DB_POOL_SIZE,
+                                 timeout=Config.DB_TIMEOUT, pragmas=pragmas)
+        
+        # Gravação periódica do último contato acumulado
+        self._parar_gravacao.clear()
+        self._thread_gravacao = threading.Thread(
+            target=self._laco_gravacao_ultimo_contato, name='ultimo-contato', daemon=True
+        )
+        self._thread_gravacao.start()
+    
+    def _criar_tabelas(self, conn: sqlite3.Connection):
+        """Cria as tabelas do sistema caso ainda não existam"""
         cursor = conn.cursor()
         
         # Tabela de contatos
@@ -103,15 +338,19 @@ class WhatsAppManager:
             data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         ''')
-        
-        conn.commit()
-        conn.close()
-        print("✅ Banco de dados inicializado com sucesso!")
+    
+    def caminho_pasta_contato(self, telefone: str, nome: Optional[str] = None) -> Path:
+        """Caminho da pasta do contato no layout atual (sem criar nada no disco)"""
+        nome_pasta = layout_pastas.nome_pasta_contato(telefone, nome)
+        return self.pasta_raiz / layout_pastas.caminho_relativo(telefone, nome_pasta, self.layout_pastas)
     
     def criar_pasta_contato(self, telefone: str, nome: Optional[str] = None) -> Path:
         """
         Cria pasta para o contato se não existir
         
+        As subpastas de tipo (imagens, documentos...) só são criadas quando
+        chega o primeiro arquivo daquele tipo.
+        
         Args:
             telefone: Número do telefone
             nome: Nome do contato (opcional)
@@ -119,27 +358,61 @@ class WhatsAppManager:
         Returns:
             Path da pasta criada
         """
-        # Limpar telefone para nome de pasta
-        telefone_limpo = ''.join(filter(str.isdigit, telefone))
-        
-        if nome:
-            # Remove caracteres especiais do nome
-            nome_limpo = ''.join(c for c in nome if c.isalnum() or c in (' ', '-', '_')).strip()
-            nome_pasta = f"{telefone_limpo}_{nome_limpo}"
-        else:
-            nome_pasta = telefone_limpo
+        pasta_contato = self.caminho_pasta_contato(telefone, nome)
+        self._garantir_pasta(pasta_contato)
+        return pasta_contato
+    
+    def _garantir_pasta(self, pasta: Path):
+        """mkdir apenas na primeira vez que a pasta é usada neste processo"""
+        chave = str(pasta)
+        if chave in self._pastas_existentes:
+            return
         
-        pasta_contato = self.pasta_raiz / nome_pasta
-        pasta_contato.mkdir(exist_ok=True)
+        pasta.mkdir(parents=True, exist_ok=True)
+        with self._lock_pastas:
+            if len(self._pastas_existentes) >= LIMITE_CACHE_PASTAS:
+                self._pastas_existentes.clear()
+            self._pastas_existentes.add(chave)
+    
+    def _pasta_tipo(self, telefone: str, contato: Dict, tipo_arquivo: str) -> Path:
+        """Subpasta do tipo de arquivo na pasta do contato, criada se preciso"""
+        pasta_tipo = self.resolver_pasta_contato(telefone, contato) / PASTAS_TIPO[tipo_arquivo]
+        self._garantir_pasta(pasta_tipo)
+        return pasta_tipo
+    
+    def _criar_na_pasta_tipo(self, telefone: str, contato: Dict, tipo_arquivo: str,
+                             nome_arquivo: str, criar: Callable[[Path], None],
+                             temporario: bool = False) -> Path:
+        """
+        Aloca um nome na subpasta do tipo e cria o arquivo com `criar(caminho)`
         
-        # Criar subpastas organizacionais
-        (pasta_contato / "imagens").mkdir(exist_ok=True)
-        (pasta_contato / "documentos").mkdir(exist_ok=True)
-        (pasta_contato / "audios").mkdir(exist_ok=True)
-        (pasta_contato / "videos").mkdir(exist_ok=True)
-        (pasta_contato / "outros").mkdir(exist_ok=True)
+        Com temporario=True o arquivo recebe um nome oculto provisório, sem ir
+        ao escritor; o nome definitivo é dado por _nomear_arquivo_pendente
+        quando a mensagem é gravada.
         
-        return pasta_contato
+        Se a pasta conhecida sumiu do disco (removida ou movida por uma
+        migração de layout), esquece os caminhos em memória e tenta de novo.
+        """
+        for tentativa in range(2):
+            pasta_tipo = self._pasta_tipo(telefone, contato, tipo_arquivo)
+            try:
+                while True:
+                    if temporario:
+                        caminho_destino = pasta_tipo / f".{uuid.uuid4().hex}.tmp"
+                    else:
+                        caminho_destino = pasta_tipo / self._alocar_nome_arquivo(contato['id'], nome_arquivo)
+                    try:
+                        criar(caminho_destino)
+                    except FileExistsError:
+                        continue  # arquivo colocado na pasta por fora do sistema
+                    return caminho_destino
+            except FileNotFoundError:
+                if tentativa:
+                    raise
+                with self._lock_pastas:
+                    self._pastas_existentes.clear()
+                self.cache_contatos.remover(telefone)
+                contato = self.obter_contato(telefone) or contato
     
     def registrar_contato(self, telefone: str, nome: Optional[str] = None) -> int:
         """
@@ -152,46 +425,140 @@ class WhatsAppManager:
         Returns:
             ID do contato
         """
-        conn = sqlite3.connect(self.db_path)
+        # Contato conhecido: nada a gravar agora, só o último contato acumulado
+        contato_id = self._contato_em_cache(telefone, nome)
+        if contato_id is not None:
+            return contato_id
+        
+        return self.escritor.executar(self._registrar_contato, telefone, nome, False)
+    
+    def _contato_em_cache(self, telefone: str, nome: Optional[str]) -> Optional[int]:
+        """Retorna o ID do contato em cache (e acumula o último contato) ou None"""
+        contato = self.cache_contatos.obter(telefone)
+        
+        # Nome diferente do conhecido precisa ser gravado no banco
+        if contato is None or (nome is not None and nome != contato[2]):
+            return None
+        
+        self._marcar_ultimo_contato(contato[0])
+        return contato[0]
+    
+    def _registrar_contato(self, conn: sqlite3.Connection, telefone: str,
+                           nome: Optional[str] = None, consultar_cache: bool = True) -> int:
+        """Registra ou atualiza o contato dentro da transação do escritor"""
+        if consultar_cache:
+            contato_id = self._contato_em_cache(telefone, nome)
+            if contato_id is not None:
+                return contato_id
+        
         cursor = conn.cursor()
         
         # Verificar se contato já existe
-        cursor.execute('SELECT id, pasta_contato FROM contatos WHERE telefone = ?', (telefone,))
+        cursor.execute('SELECT id, pasta_contato, nome FROM contatos WHERE telefone = ?', (telefone,))
         resultado = cursor.fetchone()
         
         if resultado:
-            contato_id, pasta_existente = resultado
+            contato_id, pasta_contato, nome_existente = resultado
             # Atualizar último contato
             cursor.execute('''
                 UPDATE contatos 
                 SET ultimo_contato = CURRENT_TIMESTAMP, nome = COALESCE(?, nome)
                 WHERE id = ?
             ''', (nome, contato_id))
+            if nome is None:
+                nome = nome_existente
         else:
-            # Criar pasta do contato
-            pasta_contato = self.criar_pasta_contato(telefone, nome)
+            # A pasta só é criada no disco quando chegar o primeiro arquivo
+            pasta_contato = str(self.caminho_pasta_contato(telefone, nome))
             
             # Inserir novo contato
             cursor.execute('''
                 INSERT INTO contatos (telefone, nome, pasta_contato)
                 VALUES (?, ?, ?)
-            ''', (telefone, nome, str(pasta_contato)))
+            ''', (telefone, nome, pasta_contato))
             contato_id = cursor.lastrowid
         
-        conn.commit()
-        conn.close()
+        # O cache só recebe o contato depois que ele estiver gravado
+        self.escritor.apos_commit(
+            lambda: self.cache_contatos.guardar(telefone, contato_id, pasta_contato, nome)
+        )
         return contato_id
     
+    def obter_contato(self, telefone: str) -> Optional[Dict]:
+        """
+        Busca um contato pelo telefone, consultando o cache antes do banco
+        
+        Returns:
+            Dict com id, pasta_contato e nome, ou None se não existir
+        """
+        contato = self.cache_contatos.obter(telefone)
+        
+        if contato is None:
+            with self.pool.conexao() as conn:
+                resultado = conn.execute(
+                    'SELECT id, pasta_contato, nome FROM contatos WHERE telefone = ?', (telefone,)
+                ).fetchone()
+            if not resultado:
+                return None
+            self.cache_contatos.guardar(telefone, *resultado)
+            contato = resultado
+        
+        return {'id': contato[0], 'pasta_contato': contato[1], 'nome': contato[2]}
+    
+    def resolver_pasta_contato(self, telefone: str, contato: Dict) -> Path:
+        """
+        Pasta do contato para gravar arquivos (pode ainda não existir no disco)
+        
+        Contatos sem pasta registrada recebem uma no layout atual.
+        """
+        if contato['pasta_contato']:
+            return Path(contato['pasta_contato'])
+        
+        pasta_contato = self.caminho_pasta_contato(telefone, contato['nome'])
+        self.escritor.executar(lambda conn: conn.execute(
+            'UPDATE contatos SET pasta_contato = ? WHERE id = ?', (str(pasta_contato), contato['id'])
+        ))
+        self.cache_contatos.remover(telefone)
+        return pasta_contato
+    
+    def _marcar_ultimo_contato(self, contato_id: int):
+        """Acumula o horário do último contato para a próxima gravação periódica"""
+        agora = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')  # mesmo formato do CURRENT_TIMESTAMP
+        with self._lock_ultimo_contato:
+            self._ultimo_contato_pendente[contato_id] = agora
+    
+    def gravar_ultimo_contato(self) -> int:
+        """
+        Grava de uma vez os horários de último contato acumulados
+        
+        Returns:
+            Número de contatos atualizados
+        """
+        with self._lock_ultimo_contato:
+            pendentes, self._ultimo_contato_pendente = self._ultimo_contato_pendente, {}
+        
+        if pendentes:
+            self.escritor.executar(lambda conn: conn.executemany(
+                'UPDATE contatos SET ultimo_contato = MAX(COALESCE(ultimo_contato, ?), ?) WHERE id = ?',
+                [(horario, horario, contato_id) for contato_id, horario in pendentes.items()]
+            ))
+        
+        return len(pendentes)
+    
+    def _laco_gravacao_ultimo_contato(self):
+        """Thread que grava o último contato a cada Config.ULTIMO_CONTATO_INTERVALO segundos"""
+        while not self._parar_gravacao.wait(Config.ULTIMO_CONTATO_INTERVALO):
+            try:
+                self.gravar_ultimo_contato()
+            except Exception as e:
+                print(f"⚠️ Erro ao gravar último contato: {e}")
+    
     def calcular_hash_arquivo(self, caminho_arquivo: str) -> str:
-        """Calcula hash MD5 do arquivo para evitar duplicatas"""
-        hash_md5 = hashlib.md5()
+        """Calcula o hash do arquivo (ALGORITMO_HASH) para evitar duplicatas"""
         try:
-            with open(caminho_arquivo, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
+            return calculo_hash.hash_arquivo(caminho_arquivo, ALGORITMO_HASH)['hash']
         except FileNotFoundError:
             return ""
-        return hash_md5.hexdigest()
     
     def determinar_tipo_arquivo(self, caminho_arquivo: str) -> str:
         """Determina o tipo do arquivo baseado na extensão"""
@@ -230,16 +597,11 @@ class WhatsAppManager:
             raise FileNotFoundError(f"Arquivo não encontrado: {caminho_origem}")
         
         # Obter pasta do contato
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT pasta_contato FROM contatos WHERE telefone = ?', (telefone,))
-        resultado = cursor.fetchone()
-        conn.close()
+        contato = self.obter_contato(telefone)
         
-        if not resultado:
+        if not contato:
             raise ValueError(f"Contato não encontrado: {telefone}")
         
-        pasta_contato = Path(resultado[0])
         tipo_arquivo = self.determinar_tipo_arquivo(caminho_origem)
         
         # Determinar nome do arquivo
@@ -248,19 +610,13 @@ class WhatsAppManager:
         else:
             nome_arquivo = Path(caminho_origem).name
         
-        # Adicionar timestamp se arquivo já existir
-        contador = 1
-        nome_base, extensao = os.path.splitext(nome_arquivo)
-        pasta_tipo = pasta_contato / f"{tipo_arquivo}s"  # imagens, documentos, etc.
-        
-        caminho_destino = pasta_tipo / nome_arquivo
-        while caminho_destino.exists():
-            nome_arquivo = f"{nome_base}_{contador}{extensao}"
-            caminho_destino = pasta_tipo / nome_arquivo
-            contador += 1
+        def _copiar(caminho_destino: Path):
+            with open(caminho_origem, 'rb') as origem, open(caminho_destino, 'xb') as destino:
+                shutil.copyfileobj(origem, destino, 1024 * 1024)
         
-        # Copiar arquivo
-        shutil.copy2(caminho_origem, caminho_destino)
+        # Copiar arquivo com um nome numerado exclusivo do contato
+        caminho_destino = self._criar_na_pasta_tipo(telefone, contato, tipo_arquivo, nome_arquivo, _copiar)
+        shutil.copystat(caminho_origem, caminho_destino)
         print(f"📁 Arquivo salvo: {caminho_destino}")
         
         return str(caminho_destino), tipo_arquivo
@@ -284,17 +640,9 @@ class WhatsAppManager:
         contato_id = self.registrar_contato(telefone, nome_contato)
         
         # Registrar mensagem
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO mensagens (contato_id, telefone, tipo_mensagem, conteudo_texto, metadados)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (contato_id, telefone, 'texto', texto, json.dumps(metadados or {})))
-        
-        mensagem_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        mensagem_id = self.escritor.executar(
+            self._inserir_mensagem, contato_id, telefone, 'texto', texto, metadados=metadados
+        )
         
         print(f"💬 Mensagem texto registrada - ID: {mensagem_id}")
         return mensagem_id
@@ -321,35 +669,274 @@ class WhatsAppManager:
         
         # Salvar arquivo
         try:
-            caminho_destino, tipo_arquivo = self.salvar_arquivo(telefone, caminho_arquivo)
-            hash_arquivo = self.calcular_hash_arquivo(caminho_destino)
-            tamanho_arquivo = os.path.getsize(caminho_destino)
-            nome_arquivo = Path(caminho_destino).name
+            arquivo = self.armazenar_arquivo(telefone, caminho_arquivo)
         except Exception as e:
             print(f"❌ Erro ao salvar arquivo: {e}")
             return 0
         
         # Registrar mensagem
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        mensagem_id = self.escritor.executar(
+            self._inserir_mensagem, contato_id, telefone, arquivo['tipo_mensagem'], legenda or '',
+            nome_arquivo=arquivo['nome_arquivo'], caminho_arquivo=arquivo['caminho_arquivo'],
+            tamanho_arquivo=arquivo['tamanho_arquivo'], hash_arquivo=arquivo['hash_arquivo'],
+            nome_original=arquivo['nome_original'], metadados=metadados,
+            nome_pendente=arquivo.get('nome_pendente', False)
+        )
         
-        cursor.execute('''
+        print(f"📎 Arquivo registrado - ID: {mensagem_id}, Tipo: {arquivo['tipo_mensagem']}")
+        return mensagem_id
+    
+    @staticmethod
+    def _proximo_nome_arquivo(conn: sqlite3.Connection, contato_id: int, nome_arquivo: str) -> str:
+        """
+        Nome exclusivo para um arquivo do contato, sem consultar a pasta
+        
+        O número vem de um contador por contato no banco (incrementado pelo
+        escritor), então workers simultâneos nunca recebem o mesmo nome.
+        """
+        numero = conn.execute(
+            'UPDATE contatos SET contador_arquivos = contador_arquivos + 1 '
+            'WHERE id = ? RETURNING contador_arquivos', (contato_id,)
+        ).fetchone()[0]
+        return f"{numero:05d}_{nome_arquivo}"
+    
+    def _alocar_nome_arquivo(self, contato_id: int, nome_arquivo: str) -> str:
+        """_proximo_nome_arquivo numa tarefa própria do escritor"""
+        return self.escritor.executar(self._proximo_nome_arquivo, contato_id, nome_arquivo)
+    
+    def _nomear_arquivo_pendente(self, conn: sqlite3.Connection, contato_id: int,
+                                 temporario: str, nome_arquivo: str) -> Path:
+        """
+        Dá o nome definitivo a um arquivo criado com nome temporário, dentro
+        da tarefa do escritor que grava a mensagem (sem outra ida ao escritor)
+        
+        O número é alocado na mesma transação e o arquivo é vinculado ao novo
+        nome (link + unlink, sem sobrescrever um arquivo colocado por fora).
+        """
+        temporario = Path(temporario)
+        while True:
+            caminho_destino = temporario.with_name(self._proximo_nome_arquivo(conn, contato_id, nome_arquivo))
+            try:
+                os.link(temporario, caminho_destino)
+            except FileExistsError:
+                continue
+            except OSError:
+                # Sistema de arquivos sem hardlink
+                if caminho_destino.exists():
+                    continue
+                os.rename(temporario, caminho_destino)
+            else:
+                os.unlink(temporario)
+            print(f"📁 Arquivo salvo: {caminho_destino}")
+            return caminho_destino
+    
+    @staticmethod
+    def _criar_vinculo(blob: Path, caminho_destino: Path):
+        """Hardlink do blob no destino; falha com FileExistsError se o nome existir"""
+        try:
+            os.link(blob, caminho_destino)
+        except FileExistsError:
+            raise
+        except OSError:
+            # Sistema de arquivos sem hardlink ou blobs em outro disco
+            with open(blob, 'rb') as origem, open(caminho_destino, 'xb') as destino:
+                shutil.copyfileobj(origem, destino, 1024 * 1024)
+    
+    def _caminho_blob(self, hash_arquivo: str) -> Path:
+        """Caminho do conteúdo no repositório de blobs (endereçado pelo hash)"""
+        return self.pasta_blobs / hash_arquivo[:2] / hash_arquivo
+    
+    def _vincular_blob(self, telefone: str, contato: Dict, tipo_arquivo: str,
+                       nome_arquivo: str, hash_arquivo: str) -> tuple:
+        """
+        Coloca o blob na pasta do contato como hardlink (sem copiar o conteúdo)
+        
+        Se o contato já recebeu o mesmo conteúdo, reaproveita o arquivo existente.
+        Senão o vínculo é criado com nome temporário, renomeado ao gravar a mensagem.
+        
+        Returns:
+            Tuple (caminho, nome_pendente)
+        """
+        with self.pool.conexao() as conn:
+            anterior = conn.execute(
+                'SELECT caminho_arquivo FROM mensagens WHERE hash_arquivo = ? AND contato_id = ? LIMIT 1',
+                (hash_arquivo, contato['id'])
+            ).fetchone()
+        if anterior and anterior[0] and os.path.exists(anterior[0]):
+            return Path(anterior[0]), False
+        
+        blob = self._caminho_blob(hash_arquivo)
+        temporario = self._criar_na_pasta_tipo(telefone, contato, tipo_arquivo, nome_arquivo,
+                                               lambda caminho_destino: self._criar_vinculo(blob, caminho_destino),
+                                               temporario=True)
+        return temporario, True
+    
+    def armazenar_stream(self, telefone: str, nome_arquivo: str,
+                         gravar: Callable[[str], Dict]) -> Dict:
+        """
+        Grava um arquivo no repositório de blobs numa única passada e o
+        vincula à pasta de tipo do contato
+        
+        O conteúdo vai para um temporário dentro da pasta de blobs e, com o hash
+        calculado durante a escrita, é renomeado atomicamente para o blob; se o
+        blob já existe o temporário é descartado (conteúdo repetido não ocupa
+        espaço de novo).
+        
+        Args:
+            telefone: Número do contato (já registrado)
+            nome_arquivo: Nome original do arquivo
+            gravar: Função que grava o conteúdo no caminho recebido e
+                    retorna {'bytes': int, 'hash': str} (hash ALGORITMO_HASH)
+            
+        Returns:
+            Dict no formato aceito por ingerir_mensagem; com nome_pendente o
+            arquivo ainda tem nome temporário, e o nome numerado é dado na
+            mesma tarefa do escritor que grava a mensagem
+        """
+        contato = self.obter_contato(telefone)
+        if not contato:
+            raise ValueError(f"Contato não encontrado: {telefone}")
+        
+        nome_arquivo = os.path.basename(nome_arquivo) or 'arquivo.bin'
+        tipo_arquivo = self.determinar_tipo_arquivo(nome_arquivo)
+        
+        pasta_temporaria = self.pasta_blobs / 'tmp'
+        self._garantir_pasta(pasta_temporaria)
+        temporario = pasta_temporaria / f"{uuid.uuid4().hex}.tmp"
+        try:
+            gravado = gravar(str(temporario))
+            blob = self._caminho_blob(gravado['hash'])
+            if blob.exists():
+                os.unlink(temporario)
+            else:
+                self._garantir_pasta(blob.parent)
+                os.replace(temporario, blob)
+        except BaseException:
+            try:
+                os.unlink(temporario)
+            except OSError:
+                pass
+            raise
+        
+        caminho_destino, nome_pendente = self._vincular_blob(
+            telefone, contato, tipo_arquivo, nome_arquivo, gravado['hash'])
+        
+        if not nome_pendente:
+            print(f"♻️ Conteúdo já recebido deste contato, reaproveitado: {caminho_destino}")
+        return {
+            'tipo_mensagem': tipo_arquivo,
+            'nome_arquivo': nome_arquivo if nome_pendente else caminho_destino.name,
+            'nome_original': nome_arquivo,
+            'caminho_arquivo': str(caminho_destino),
+            'tamanho_arquivo': gravado['bytes'],
+            'hash_arquivo': gravado['hash'],
+            'nome_pendente': nome_pendente
+        }
+    
+    def armazenar_blob_conhecido(self, telefone: str, nome_arquivo: str,
+                                 hash_arquivo: str) -> Optional[Dict]:
+        """
+        Reaproveita um arquivo que o próprio contato já enviou com o mesmo
+        hash, sem baixar nem gravar nada
+        
+        O hash vem do cliente e não é conferido, então só vale para o mesmo
+        contato: para outro contato o conteúdo é baixado (e deduplicado no
+        repositório de blobs pelo hash calculado no download).
+        
+        Args:
+            telefone: Número do contato (já registrado)
+            nome_arquivo: Nome original do arquivo
+            hash_arquivo: Hash (ALGORITMO_HASH) informado pela origem
+            
+        Returns:
+            Dict no formato aceito por ingerir_mensagem ou None se o contato
+            ainda não tem esse conteúdo
+        """
+        contato = self.obter_contato(telefone)
+        if not contato:
+            raise ValueError(f"Contato não encontrado: {telefone}")
+        
+        with self.pool.conexao() as conn:
+            anterior = conn.execute('''
+                SELECT caminho_arquivo, tamanho_arquivo FROM mensagens
+                WHERE hash_arquivo = ? AND contato_id = ? AND caminho_arquivo IS NOT NULL
+                LIMIT 1
+            ''', (hash_arquivo, contato['id'])).fetchone()
+        if not anterior or not os.path.exists(anterior[0]):
+            return None
+        
+        nome_arquivo = os.path.basename(nome_arquivo) or 'arquivo.bin'
+        caminho_destino = Path(anterior[0])
+        
+        print(f"♻️ Arquivo já armazenado, reaproveitado: {caminho_destino}")
+        return {
+            'tipo_mensagem': self.determinar_tipo_arquivo(nome_arquivo),
+            'nome_arquivo': caminho_destino.name,
+            'nome_original': nome_arquivo,
+            'caminho_arquivo': str(caminho_destino),
+            'tamanho_arquivo': anterior[1],
+            'hash_arquivo': hash_arquivo
+        }
+    
+    @staticmethod
+    def _copiar_com_hash(caminho_origem: str, caminho_destino: str) -> Dict:
+        """Copia o arquivo calculando o hash na mesma leitura"""
+        copiado = calculo_hash.copiar_com_hash(caminho_origem, caminho_destino, ALGORITMO_HASH)
+        shutil.copystat(caminho_origem, caminho_destino)
+        return copiado
+    
+    def armazenar_arquivo(self, telefone: str, caminho_origem: str) -> Dict:
+        """
+        Salva o arquivo na pasta do contato e coleta os dados para a mensagem
+        
+        Args:
+            telefone: Número do contato (já registrado)
+            caminho_origem: Caminho do arquivo recebido
+            
+        Returns:
+            Dict com tipo_mensagem, nome_arquivo, caminho_arquivo,
+            tamanho_arquivo e hash_arquivo (formato aceito por ingerir_mensagem)
+        """
+        if not os.path.exists(caminho_origem):
+            raise FileNotFoundError(f"Arquivo não encontrado: {caminho_origem}")
+        
+        return self.armazenar_stream(
+            telefone, Path(caminho_origem).name,
+            lambda temporario: self._copiar_com_hash(caminho_origem, temporario)
+        )
+    
+    def _inserir_mensagem(self, conn: sqlite3.Connection, contato_id: int, telefone: str,
+                          tipo_mensagem: str, conteudo_texto: str,
+                          nome_arquivo: Optional[str] = None,
+                          caminho_arquivo: Optional[str] = None,
+                          tamanho_arquivo: Optional[int] = None,
+                          hash_arquivo: Optional[str] = None,
+                          metadados: Optional[Dict] = None,
+                          nome_original: Optional[str] = None,
+                          nome_pendente: bool = False) -> int:
+        """
+        Insere uma mensagem dentro da transação do escritor
+        
+        Com nome_pendente, caminho_arquivo é o temporário de armazenar_stream
+        e o arquivo recebe aqui o nome numerado (nome_arquivo é o original).
+        """
+        if nome_pendente and caminho_arquivo:
+            caminho = self._nomear_arquivo_pendente(conn, contato_id, caminho_arquivo, nome_arquivo)
+            nome_arquivo, caminho_arquivo = caminho.name, str(caminho)
+        
+        cursor = conn.execute('''
             INSERT INTO mensagens (
                 contato_id, telefone, tipo_mensagem, conteudo_texto,
-                nome_arquivo, caminho_arquivo, tamanho_arquivo, hash_arquivo, metadados
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                nome_arquivo, caminho_arquivo, tamanho_arquivo, hash_arquivo, metadados,
+                nome_original
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-            contato_id, telefone, tipo_arquivo, legenda or '',
-            nome_arquivo, caminho_destino, tamanho_arquivo, hash_arquivo,
-            json.dumps(metadados or {})
+            contato_id, telefone, tipo_mensagem, conteudo_texto,
+            nome_arquivo, caminho_arquivo, tamanho_arquivo, hash_arquivo,
+            json.dumps(metadados or {}), nome_original
         ))
-        
-        mensagem_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        print(f"📎 Arquivo registrado - ID: {mensagem_id}, Tipo: {tipo_arquivo}")
-        return mensagem_id
+        # blobs.referencias é mantido pelos triggers (contadores.TRIGGERS_BLOBS)
+        return cursor.lastrowid
     
     def registrar_despesa(self, mensagem_id: int, tipo_despesa: str = 'comprovante',
                          valor: Optional[float] = None, descricao: Optional[str] = None,
@@ -368,18 +955,30 @@ class WhatsAppManager:
         Returns:
             ID da despesa registrada
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Obter contato_id da mensagem
-        cursor.execute('SELECT contato_id FROM mensagens WHERE id = ?', (mensagem_id,))
-        resultado = cursor.fetchone()
+        despesa_id = self.escritor.executar(
+            self._inserir_despesa, mensagem_id, None, tipo_despesa, valor,
+            descricao, categoria, data_despesa
+        )
         
-        if not resultado:
-            conn.close()
-            raise ValueError(f"Mensagem não encontrada: {mensagem_id}")
+        print(f"💰 Despesa registrada - ID: {despesa_id}")
+        return despesa_id
+    
+    def _inserir_despesa(self, conn: sqlite3.Connection, mensagem_id: int,
+                         contato_id: Optional[int], tipo_despesa: str,
+                         valor: Optional[float], descricao: Optional[str],
+                         categoria: Optional[str], data_despesa: Optional[str]) -> int:
+        """Insere uma despesa dentro da transação do escritor"""
+        cursor = conn.cursor()
         
-        contato_id = resultado[0]
+        if contato_id is None:
+            # Obter contato_id da mensagem
+            cursor.execute('SELECT contato_id FROM mensagens WHERE id = ?', (mensagem_id,))
+            resultado = cursor.fetchone()
+            
+            if not resultado:
+                raise ValueError(f"Mensagem não encontrada: {mensagem_id}")
+            
+            contato_id = resultado[0]
         
         cursor.execute('''
             INSERT INTO despesas (
@@ -391,30 +990,237 @@ class WhatsAppManager:
             descricao, categoria, data_despesa
         ))
         
-        despesa_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        return cursor.lastrowid
+    
+    def ingerir_mensagem(self, telefone: str, texto: str,
+                         nome_contato: Optional[str] = None,
+                         metadados: Optional[Dict] = None,
+                         arquivo: Optional[Dict] = None,
+                         despesa: Optional[Dict] = None) -> Dict:
+        """
+        Registra contato, mensagem e despesa opcional numa única transação
         
-        print(f"💰 Despesa registrada - ID: {despesa_id}")
-        return despesa_id
+        Substitui a sequência registrar_contato -> processar_mensagem_* ->
+        registrar_despesa: um único commit por mensagem e nada fica gravado
+        pela metade se alguma etapa falhar.
+        
+        Args:
+            telefone: Número do remetente
+            texto: Conteúdo da mensagem (ou legenda do arquivo)
+            nome_contato: Nome do contato
+            metadados: Dados adicionais da mensagem
+            arquivo: Dados do arquivo já salvo (retorno de armazenar_arquivo)
+            despesa: Campos da despesa (tipo_despesa, valor, descricao,
+                     categoria, data_despesa) ou None
+            
+        Returns:
+            Dict com contato_id, mensagem_id e despesa_id (None se não houver despesa)
+        """
+        resultado = self.escritor.executar(
+            self._ingerir_mensagem, telefone, texto, nome_contato, metadados, arquivo, despesa
+        )
+        
+        print(f"💬 Mensagem registrada - ID: {resultado['mensagem_id']}"
+              + (f", Despesa ID: {resultado['despesa_id']}" if resultado['despesa_id'] else ""))
+        return resultado
     
-    def listar_mensagens_contato(self, telefone: str, limite: int = 50) -> List[Dict]:
-        """Lista mensagens de um contato específico"""
-        conn = sqlite3.connect(self.db_path)
+    def _ingerir_mensagem(self, conn: sqlite3.Connection, telefone: str, texto: str,
+                          nome_contato: Optional[str], metadados: Optional[Dict],
+                          arquivo: Optional[Dict], despesa: Optional[Dict]) -> Dict:
+        """Executa as etapas de ingerir_mensagem dentro da transação do escritor"""
+        arquivo = arquivo or {}
+        
+        contato_id = self._registrar_contato(conn, telefone, nome_contato)
+        mensagem_id = self._inserir_mensagem(
+            conn, contato_id, telefone, arquivo.get('tipo_mensagem', 'texto'), texto or '',
+            nome_arquivo=arquivo.get('nome_arquivo'),
+            caminho_arquivo=arquivo.get('caminho_arquivo'),
+            tamanho_arquivo=arquivo.get('tamanho_arquivo'),
+            hash_arquivo=arquivo.get('hash_arquivo'),
+            nome_original=arquivo.get('nome_original'),
+            metadados=metadados,
+            nome_pendente=arquivo.get('nome_pendente', False)
+        )
+        
+        despesa_id = None
+        if despesa is not None:
+            despesa_id = self._inserir_despesa(
+                conn, mensagem_id, contato_id,
+                despesa.get('tipo_despesa', 'comprovante'),
+                despesa.get('valor'),
+                despesa.get('descricao'),
+                despesa.get('categoria'),
+                despesa.get('data_despesa')
+            )
+        
+        return {
+            'contato_id': contato_id,
+            'mensagem_id': mensagem_id,
+            'despesa_id': despesa_id
+        }
+    
+    def processar_lote(self, mensagens: Iterable[Dict], tamanho_lote: int = 1000,
+                       posicao: Optional[Callable[[], Any]] = None) -> Dict:
+        """
+        Importa mensagens de texto em massa (backfill de históricos exportados)
+
+        A entrada é consumida em blocos, então geradores de qualquer tamanho
+        usam memória constante. Cada bloco vira uma transação (mensagens
+        inseridas com a mesma instrução preparada, para obter o id de cada
+        uma, e despesas com executemany); enquanto o escritor grava um
+        bloco, o próximo já está sendo preparado.
+
+        Args:
+            mensagens: Iterável de dicts com telefone, texto e opcionalmente
+                       nome_contato, metadados, tipo_mensagem, data_recebimento
+                       (YYYY-MM-DD HH:MM:SS) e despesa (mesmo formato de ingerir_mensagem)
+            tamanho_lote: Mensagens por transação
+            posicao: Função que informa a posição atual na entrada (ex.: linha
+                     do arquivo), consultada ao fim da leitura de cada bloco
+
+        Returns:
+            Dict com totais de mensagens, despesas e contatos novos
+            
+        Raises:
+            ErroLote: se a entrada ou um bloco falhar; os blocos anteriores
+                já foram gravados (ErroLote.totais, até ErroLote.posicao_gravada)
+                e os seguintes não são processados
+        """
+        totais = {'mensagens': 0, 'despesas': 0, 'contatos_novos': 0}
+        # telefone -> contato_id, resolvido uma única vez por importação
+        contatos: Dict[str, int] = {}
+        iterador = iter(mensagens)
+        # (futuro, posição da entrada ao fim do bloco) do bloco em voo
+        pendente = None
+        gravada = None
+
+        def _concluir(enviado):
+            nonlocal gravada
+            futuro, fim_bloco = enviado
+            self._somar_totais(totais, futuro.result())
+            gravada = fim_bloco
+
+        try:
+            while True:
+                bloco = list(itertools.islice(iterador, max(1, tamanho_lote)))
+                if not bloco:
+                    break
+                fim_bloco = posicao() if posicao else None
+
+                # Só um bloco em voo: limita a memória e mantém a ordem
+                if pendente is not None:
+                    anterior, pendente = pendente, None
+                    _concluir(anterior)
+                pendente = (self.escritor.enviar(self._gravar_lote, bloco, contatos), fim_bloco)
+
+            if pendente is not None:
+                anterior, pendente = pendente, None
+                _concluir(anterior)
+        except Exception as e:
+            if pendente is not None:
+                # Erro na entrada com um bloco ainda em voo: ele é gravado mesmo assim
+                try:
+                    _concluir(pendente)
+                except Exception:
+                    pass
+            raise ErroLote(e, totais, gravada) from e
+
+        print(f"📦 Lote processado - {totais['mensagens']} mensagens, "
+              f"{totais['despesas']} despesas, {totais['contatos_novos']} contatos novos")
+        return totais
+
+    @staticmethod
+    def _somar_totais(totais: Dict, parcial: Dict):
+        for chave, valor in parcial.items():
+            totais[chave] += valor
+
+    def _gravar_lote(self, conn: sqlite3.Connection, bloco: List[Dict],
+                     contatos: Dict[str, int]) -> Dict:
+        """Grava um bloco de processar_lote dentro da transação do escritor"""
         cursor = conn.cursor()
+        contatos_novos = 0
+
+        # Resolver contatos ainda desconhecidos nesta importação
+        nomes: Dict[str, Optional[str]] = {}
+        for mensagem in bloco:
+            telefone = mensagem['telefone']
+            if telefone not in contatos:
+                nomes.setdefault(telefone, mensagem.get('nome_contato'))
+
+        for telefone, nome in nomes.items():
+            resultado = cursor.execute(
+                'SELECT id FROM contatos WHERE telefone = ?', (telefone,)
+            ).fetchone()
+            if resultado:
+                contatos[telefone] = resultado[0]
+            else:
+                pasta_contato = self.caminho_pasta_contato(telefone, nome)
+                cursor.execute('''
+                    INSERT INTO contatos (telefone, nome, pasta_contato)
+                    VALUES (?, ?, ?)
+                ''', (telefone, nome, str(pasta_contato)))
+                contatos[telefone] = cursor.lastrowid
+                contatos_novos += 1
+
+        # Um único UPDATE de último contato por telefone do bloco
+        cursor.executemany(
+            'UPDATE contatos SET ultimo_contato = CURRENT_TIMESTAMP WHERE id = ?',
+            [(contatos[telefone],) for telefone in {m['telefone'] for m in bloco}]
+        )
+
+        # Uma execução por mensagem (instrução já preparada no cache do
+        # sqlite3) para ligar cada despesa ao id realmente atribuído
+        mensagem_ids = [
+            cursor.execute('''
+                INSERT INTO mensagens (contato_id, telefone, tipo_mensagem, conteudo_texto,
+                                       metadados, data_recebimento)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', (contatos[m['telefone']], m['telefone'], m.get('tipo_mensagem', 'texto'),
+                  m.get('texto', ''), json.dumps(m.get('metadados') or {}),
+                  m.get('data_recebimento'))).lastrowid
+            for m in bloco
+        ]
+
+        despesas = [
+            (mensagem_id, contatos[m['telefone']],
+             m['despesa'].get('tipo_despesa', 'comprovante'), m['despesa'].get('valor'),
+             m['despesa'].get('descricao'), m['despesa'].get('categoria'),
+             m['despesa'].get('data_despesa'))
+            for mensagem_id, m in zip(mensagem_ids, bloco) if m.get('despesa')
+        ]
+        cursor.executemany('''
+            INSERT INTO despesas (
+                mensagem_id, contato_id, tipo_despesa, valor,
+                descricao, categoria, data_despesa
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', despesas)
+
+        return {'mensagens': len(bloco), 'despesas': len(despesas), 'contatos_novos': contatos_novos}
+
+    def listar_mensagens_contato(self, telefone: str, limite: int = 50,
+                                 apos_id: Optional[int] = None) -> List[Dict]:
+        """
+        Lista mensagens de um contato específico, das mais recentes para as mais antigas
         
-        cursor.execute('''
-            SELECT m.id, m.tipo_mensagem, m.conteudo_texto, m.nome_arquivo,
-                   m.caminho_arquivo, m.data_recebimento, c.nome
-            FROM mensagens m
-            JOIN contatos c ON m.contato_id = c.id
-            WHERE m.telefone = ?
-            ORDER BY m.data_recebimento DESC
-            LIMIT ?
-        ''', (telefone, limite))
+        Args:
+            telefone: Telefone do contato
+            limite: Máximo de mensagens
+            apos_id: Cursor; só mensagens com id menor (a próxima página
+                     começa após o id da última mensagem da anterior)
+        """
+        with self.pool.conexao() as conn:
+            rows = conn.execute('''
+                SELECT m.id, m.tipo_mensagem, m.conteudo_texto, m.nome_arquivo,
+                       m.caminho_arquivo, m.data_recebimento, c.nome, m.nome_original
+                FROM mensagens m
+                JOIN contatos c ON m.contato_id = c.id
+                WHERE m.telefone = ? AND m.id < ?
+                ORDER BY m.id DESC
+                LIMIT ?
+            ''', (telefone, apos_id or SEM_CURSOR, limite)).fetchall()
         
         mensagens = []
-        for row in cursor.fetchall():
+        for row in rows:
             mensagens.append({
                 'id': row[0],
                 'tipo': row[1],
@@ -422,30 +1228,76 @@ class WhatsAppManager:
                 'arquivo': row[3],
                 'caminho': row[4],
                 'data': row[5],
-                'nome_contato': row[6]
+                'nome_contato': row[6],
+                'nome_original': row[7]
             })
         
-        conn.close()
         return mensagens
     
-    def listar_despesas_pendentes(self) -> List[Dict]:
-        """Lista despesas com status pendente"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def listar_contatos(self, limite: int = 100, apos_id: Optional[int] = None) -> List[Dict]:
+        """
+        Lista os contatos com seus totais, dos mais recentes para os mais antigos
         
-        cursor.execute('''
-            SELECT d.id, d.tipo_despesa, d.valor, d.descricao, d.categoria,
-                   d.data_despesa, d.data_registro, c.nome, c.telefone,
-                   m.nome_arquivo, m.caminho_arquivo
-            FROM despesas d
-            JOIN contatos c ON d.contato_id = c.id
-            LEFT JOIN mensagens m ON d.mensagem_id = m.id
-            WHERE d.status = 'pendente'
-            ORDER BY d.data_registro DESC
-        ''')
+        Os totais vêm do contato_resumo (mantido por triggers, ver contadores.py),
+        então cada página lê só as linhas dos seus contatos.
+        
+        Args:
+            limite: Máximo de contatos
+            apos_id: Cursor; só contatos com id menor
+        """
+        with self.pool.conexao() as conn:
+            rows = conn.execute('''
+                SELECT c.id, c.telefone, c.nome, c.pasta_contato, c.data_criacao, c.ultimo_contato,
+                       IFNULL(r.total_mensagens, 0), IFNULL(r.total_despesas, 0),
+                       r.ultima_mensagem, IFNULL(r.valor_pendente, 0)
+                FROM contatos c
+                LEFT JOIN contato_resumo r ON r.contato_id = c.id
+                WHERE c.id < ?
+                ORDER BY c.id DESC
+                LIMIT ?
+            ''', (apos_id or SEM_CURSOR, limite)).fetchall()
+        
+        contatos = []
+        for row in rows:
+            contatos.append({
+                'id': row[0],
+                'telefone': row[1],
+                'nome': row[2],
+                'pasta_contato': row[3],
+                'data_criacao': row[4],
+                'ultimo_contato': row[5],
+                'total_mensagens': row[6],
+                'total_despesas': row[7],
+                'ultima_mensagem': row[8],
+                'valor_pendente': round(row[9], 2)
+            })
+        
+        return contatos
+    
+    def listar_despesas_pendentes(self, limite: Optional[int] = None,
+                                  apos_id: Optional[int] = None) -> List[Dict]:
+        """
+        Lista despesas com status pendente, das mais recentes para as mais antigas
+        
+        Args:
+            limite: Máximo de despesas (None = todas)
+            apos_id: Cursor; só despesas com id menor
+        """
+        with self.pool.conexao() as conn:
+            rows = conn.execute('''
+                SELECT d.id, d.tipo_despesa, d.valor, d.descricao, d.categoria,
+                       d.data_despesa, d.data_registro, c.nome, c.telefone,
+                       m.nome_arquivo, m.caminho_arquivo
+                FROM despesas d
+                JOIN contatos c ON d.contato_id = c.id
+                LEFT JOIN mensagens m ON d.mensagem_id = m.id
+                WHERE d.status = 'pendente' AND d.id < ?
+                ORDER BY d.id DESC
+                LIMIT ?
+            ''', (apos_id or SEM_CURSOR, -1 if limite is None else limite)).fetchall()
         
         despesas = []
-        for row in cursor.fetchall():
+        for row in rows:
             despesas.append({
                 'id': row[0],
                 'tipo': row[1],
@@ -460,66 +1312,385 @@ class WhatsAppManager:
                 'caminho_arquivo': row[10]
             })
         
-        conn.close()
         return despesas
     
+    def _ler_em_lotes(self, consulta: str, condicoes: List[str], parametros: List,
+                      coluna_id: str, colunas: List[str], tamanho_lote: int) -> Iterator[List[Dict]]:
+        """
+        Executa a consulta em páginas por id (keyset) e entrega lotes de dicts
+        
+        Cada página empresta uma conexão do pool só durante a consulta: um
+        cliente baixando devagar não prende a conexão nem um snapshot de
+        leitura aberto (que impediria o checkpoint do WAL). Linhas gravadas
+        durante a exportação com id acima do último lido também entram.
+        
+        Args:
+            consulta: SELECT ... FROM ... sem WHERE/ORDER BY (a 1ª coluna é o id)
+            condicoes: Condições SQL combinadas com AND
+            parametros: Parâmetros das condições
+            coluna_id: Coluna da paginação (ex.: 'd.id')
+        """
+        ultimo_id = 0
+        where = ' AND '.join([*condicoes, f'{coluna_id} > ?'])
+        while True:
+            with self.pool.conexao() as conn:
+                rows = conn.execute(
+                    f'{consulta} WHERE {where} ORDER BY {coluna_id} LIMIT ?',
+                    (*parametros, ultimo_id, tamanho_lote)
+                ).fetchall()
+            if not rows:
+                break
+            yield [dict(zip(colunas, row)) for row in rows]
+            if len(rows) < tamanho_lote:
+                break
+            ultimo_id = rows[-1][0]
+    
+    @staticmethod
+    def _condicoes_despesas(filtros: Dict) -> tuple:
+        """
+        Condições parametrizadas (lista de SQL, parâmetros) dos filtros de despesas
+        
+        Cada filtro usa um índice próprio: status/categoria (com id), contato_id,
+        data_despesa e valor. Filtros None são ignorados.
+        
+        Raises:
+            ValueError: filtro desconhecido
+        """
+        desconhecidos = set(filtros) - set(FILTROS_DESPESAS)
+        if desconhecidos:
+            raise ValueError(f"Filtro(s) desconhecido(s): {', '.join(sorted(desconhecidos))} "
+                             f"(aceitos: {', '.join(FILTROS_DESPESAS)})")
+        
+        condicoes, parametros = [], []
+        
+        # status e categoria aceitam um valor ou uma lista
+        for campo, coluna in (('status', 'd.status'), ('categoria', 'd.categoria')):
+            valor = filtros.get(campo)
+            if not valor:
+                continue
+            valores = [valor] if isinstance(valor, str) else list(valor)
+            if len(valores) == 1:
+                condicoes.append(f'{coluna} = ?')
+            else:
+                condicoes.append(f"{coluna} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(valores)
+        
+        if filtros.get('telefone') is not None:
+            condicoes.append('d.contato_id = (SELECT id FROM contatos WHERE telefone = ?)')
+            parametros.append(filtros['telefone'])
+        
+        for campo, condicao in (('contato_id', 'd.contato_id = ?'),
+                                ('data_inicio', 'd.data_despesa >= ?'),
+                                ('data_fim', 'd.data_despesa <= ?'),
+                                ('valor_min', 'd.valor >= ?'),
+                                ('valor_max', 'd.valor <= ?')):
+            if filtros.get(campo) is not None:
+                condicoes.append(condicao)
+                parametros.append(filtros[campo])
+        
+        return condicoes, parametros
+    
+    @staticmethod
+    def _codificar_cursor(chave, despesa_id: int) -> str:
+        """Cursor opaco (valor da ordenação + id) das ordenações que não são por id"""
+        return base64.urlsafe_b64encode(json.dumps([chave, despesa_id]).encode()).decode()
+    
+    @staticmethod
+    def _decodificar_cursor(cursor: str) -> tuple:
+        """Inverso de _codificar_cursor; ValueError se o cursor não for válido"""
+        try:
+            chave, despesa_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return chave, int(despesa_id)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Cursor inválido: {cursor}") from e
+    
+    def buscar_despesas(self, filtros: Optional[Dict] = None, ordenar: str = 'id',
+                        decrescente: bool = True, limite: int = 100,
+                        apos=None) -> Dict:
+        """
+        Busca despesas com filtros, ordenação e paginação por cursor, tudo no SQLite
+        
+        Args:
+            filtros: Dict com qualquer um de FILTROS_DESPESAS
+                     (status, categoria, telefone, contato_id, data_inicio,
+                     data_fim, valor_min, valor_max; datas YYYY-MM-DD inclusivas)
+            ordenar: Uma das chaves de ORDENACOES_DESPESAS (desempate por id)
+            decrescente: Ordem decrescente (padrão) ou crescente
+            limite: Despesas por página
+            apos: next_cursor da página anterior (id quando ordenar='id')
+            
+        Returns:
+            Dict com despesas e next_cursor (None na última página)
+            
+        Raises:
+            ValueError: filtro, ordenação ou cursor inválidos
+        """
+        if ordenar not in ORDENACOES_DESPESAS:
+            raise ValueError(f"Ordenação inválida: {ordenar} (use {', '.join(ORDENACOES_DESPESAS)})")
+        
+        condicoes, parametros = self._condicoes_despesas(filtros or {})
+        chave = ORDENACOES_DESPESAS[ordenar]
+        direcao, comparacao = ('DESC', '<') if decrescente else ('ASC', '>')
+        
+        if apos is not None:
+            if ordenar == 'id':
+                condicoes.append(f'd.id {comparacao} ?')
+                parametros.append(int(apos))
+            else:
+                # Forma expandida de (chave, id) < (?, ?): o SQLite só usa o
+                # índice de expressão para posicionar na 1ª coluna assim
+                valor_cursor, id_cursor = self._decodificar_cursor(apos)
+                condicoes.append(f'{chave} {comparacao}= ? AND ({chave} {comparacao} ? OR d.id {comparacao} ?)')
+                parametros.extend((valor_cursor, valor_cursor, id_cursor))
+        
+        sql = f'''
+            SELECT {', '.join(expressao for _, expressao in COLUNAS_DESPESAS)}, {chave}
+            FROM despesas d
+            JOIN contatos c ON d.contato_id = c.id
+            LEFT JOIN mensagens m ON d.mensagem_id = m.id
+            {'WHERE ' + ' AND '.join(condicoes) if condicoes else ''}
+            ORDER BY {chave} {direcao}, d.id {direcao}
+            LIMIT ?
+        '''
+        with self.pool.conexao() as conn:
+            rows = conn.execute(sql, (*parametros, limite + 1)).fetchall()
+        
+        colunas = [nome for nome, _ in COLUNAS_DESPESAS]
+        despesas = [dict(zip(colunas, row)) for row in rows[:limite]]
+        
+        proximo = None
+        if len(rows) > limite:
+            ultima = rows[limite - 1]
+            proximo = ultima[0] if ordenar == 'id' else self._codificar_cursor(ultima[-1], ultima[0])
+        
+        return {'despesas': despesas, 'next_cursor': proximo}
+    
+    def exportar_despesas(self, filtros: Optional[Dict] = None,
+                          tamanho_lote: int = 1000) -> Iterator[List[Dict]]:
+        """
+        Despesas em ordem de id, em lotes, para exportação sem carregar tudo na memória
+        
+        Args:
+            filtros: Mesmos filtros de buscar_despesas
+            tamanho_lote: Linhas por página
+            
+        Returns:
+            Gerador de listas de dicts (chaves de COLUNAS_DESPESAS)
+        """
+        condicoes, parametros = self._condicoes_despesas(filtros or {})
+        
+        consulta = f'''
+            SELECT {', '.join(expressao for _, expressao in COLUNAS_DESPESAS)}
+            FROM despesas d
+            JOIN contatos c ON d.contato_id = c.id
+            LEFT JOIN mensagens m ON d.mensagem_id = m.id
+        '''
+        colunas = [nome for nome, _ in COLUNAS_DESPESAS]
+        return self._ler_em_lotes(consulta, condicoes, parametros, 'd.id', colunas, tamanho_lote)
+    
+    def exportar_mensagens_contato(self, telefone: str, tamanho_lote: int = 1000) -> Iterator[List[Dict]]:
+        """Todas as mensagens de um contato em ordem de id, em lotes"""
+        consulta = f'''
+            SELECT {', '.join(expressao for _, expressao in COLUNAS_MENSAGENS)}
+            FROM mensagens m
+        '''
+        colunas = [nome for nome, _ in COLUNAS_MENSAGENS]
+        return self._ler_em_lotes(consulta, ['m.telefone = ?'], [telefone], 'm.id', colunas, tamanho_lote)
+    
     def atualizar_status_despesa(self, despesa_id: int, status: str, 
                                observacoes: Optional[str] = None) -> bool:
         """Atualiza status de uma despesa"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE despesas 
-            SET status = ?, observacoes = ?
-            WHERE id = ?
-        ''', (status, observacoes, despesa_id))
+        def _atualizar(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute('''
+                UPDATE despesas 
+                SET status = ?, observacoes = ?
+                WHERE id = ?
+            ''', (status, observacoes, despesa_id))
+            return cursor.rowcount > 0
         
-        sucesso = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+        sucesso = self.escritor.executar(_atualizar)
         
         if sucesso:
             print(f"✅ Status da despesa {despesa_id} atualizado para: {status}")
         
         return sucesso
     
-    def obter_estatisticas(self) -> Dict:
-        """Obtém estatísticas do sistema"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def obter_configuracao(self, chave: str) -> Optional[Dict]:
+        """Valor (texto), versão e data de atualização de uma configuração"""
+        with self.pool.conexao() as conn:
+            row = conn.execute(
+                'SELECT valor, versao, data_atualizacao FROM configuracoes WHERE chave = ?', (chave,)
+            ).fetchone()
         
-        # Contadores
-        cursor.execute('SELECT COUNT(*) FROM contatos')
-        total_contatos = cursor.fetchone()[0]
+        if not row:
+            return None
         
-        cursor.execute('SELECT COUNT(*) FROM mensagens')
-        total_mensagens = cursor.fetchone()[0]
+        return {'chave': chave, 'valor': row[0], 'versao': row[1], 'data_atualizacao': row[2]}
+    
+    @staticmethod
+    def _salvar_configuracao(conn: sqlite3.Connection, chave: str, valor: str) -> int:
+        """Grava a configuração incrementando a versão; devolve a nova versão"""
+        return conn.execute('''
+            INSERT INTO configuracoes (chave, valor) VALUES (?, ?)
+            ON CONFLICT(chave) DO UPDATE SET
+                valor = excluded.valor,
+                versao = versao + 1,
+                data_atualizacao = CURRENT_TIMESTAMP
+            RETURNING versao
+        ''', (chave, valor)).fetchone()[0]
+    
+    def salvar_configuracao(self, chave: str, valor: str) -> int:
+        """
+        Grava uma configuração
         
-        cursor.execute('SELECT COUNT(*) FROM despesas')
-        total_despesas = cursor.fetchone()[0]
+        Returns:
+            Nova versão da configuração (1 na primeira gravação)
+        """
+        return self.escritor.executar(self._salvar_configuracao, chave, valor)
+    
+    def extrator_despesas(self) -> ExtratorDespesas:
+        """
+        Extrator compilado com as categorias de despesa atuais
         
-        cursor.execute('SELECT COUNT(*) FROM despesas WHERE status = "pendente"')
-        despesas_pendentes = cursor.fetchone()[0]
+        A versão gravada no banco é consultada no máximo a cada
+        CATEGORIAS_VERIFICAR_SEGUNDOS. Quando muda, uma única thread compila o
+        novo extrator e o publica numa só atribuição; as demais (e as
+        requisições em andamento) seguem com o anterior até lá, sem esperar.
+        """
+        versao, extrator = self._extrator_despesas
+        if time.monotonic() < self._proxima_verificacao_categorias:
+            return extrator
+        if not self._lock_categorias.acquire(blocking=False):
+            return extrator
         
-        # Mensagens por tipo
-        cursor.execute('''
-            SELECT tipo_mensagem, COUNT(*) 
-            FROM mensagens 
-            GROUP BY tipo_mensagem
-        ''')
-        mensagens_por_tipo = dict(cursor.fetchall())
+        try:
+            self._proxima_verificacao_categorias = time.monotonic() + Config.CATEGORIAS_VERIFICAR_SEGUNDOS
+            configuracao = self.obter_configuracao(CHAVE_CATEGORIAS_DESPESA)
+            versao_atual = configuracao['versao'] if configuracao else 0
+            if versao_atual != versao:
+                try:
+                    categorias = (validar_categorias(json.loads(configuracao['valor']))
+                                  if configuracao else None)
+                    extrator = ExtratorDespesas(categorias)
+                    print(f"🏷️ Categorias de despesa carregadas (versão {versao_atual})")
+                except ValueError as e:
+                    # Mantém as categorias anteriores até uma versão válida ser gravada
+                    print(f"⚠️ Categorias de despesa inválidas (versão {versao_atual}): {e}")
+                self._extrator_despesas = (versao_atual, extrator)
+            return extrator
+        finally:
+            self._lock_categorias.release()
+    
+    def obter_categorias_despesa(self) -> Dict:
+        """Categorias de despesa gravadas (ou as padrão, versão 0) e sua versão"""
+        configuracao = self.obter_configuracao(CHAVE_CATEGORIAS_DESPESA)
+        if not configuracao:
+            return {'versao': 0, 'categorias': CATEGORIAS_PADRAO}
+        return {'versao': configuracao['versao'], 'categorias': json.loads(configuracao['valor'])}
+    
+    def _publicar_categorias(self, versao: int, categorias: Dict[str, List[str]]):
+        """Troca o extrator deste processo sem esperar a próxima verificação"""
+        extrator = ExtratorDespesas(categorias)
+        with self._lock_categorias:
+            if versao > self._extrator_despesas[0]:
+                self._extrator_despesas = (versao, extrator)
+    
+    def salvar_categorias_despesa(self, categorias: Dict[str, List[str]]) -> Dict:
+        """
+        Substitui todas as categorias de despesa
         
-        conn.close()
+        Args:
+            categorias: Categoria -> palavras-chave, em ordem de prioridade
+            
+        Returns:
+            Dict com versao e categorias gravadas
+            
+        Raises:
+            ValueError: formato inválido
+        """
+        categorias = validar_categorias(categorias)
+        versao = self.salvar_configuracao(CHAVE_CATEGORIAS_DESPESA,
+                                          json.dumps(categorias, ensure_ascii=False))
+        self._publicar_categorias(versao, categorias)
+        print(f"🏷️ Categorias de despesa gravadas (versão {versao})")
+        return {'versao': versao, 'categorias': categorias}
+    
+    def adicionar_palavras_categoria(self, categoria: str, palavras: List[str]) -> Dict:
+        """
+        Acrescenta palavras-chave a uma categoria (criada no fim da lista se não existir)
+        
+        A leitura e a gravação acontecem na mesma transação, então inclusões
+        simultâneas não se perdem.
+        
+        Returns:
+            Dict com versao e categorias gravadas
+            
+        Raises:
+            ValueError: categoria vazia ou palavras que não são uma lista de textos
+        """
+        validar_categorias({categoria: palavras})
+        
+        def _adicionar(conn: sqlite3.Connection):
+            row = conn.execute('SELECT valor FROM configuracoes WHERE chave = ?',
+                               (CHAVE_CATEGORIAS_DESPESA,)).fetchone()
+            atuais = json.loads(row[0]) if row else CATEGORIAS_PADRAO
+            categorias = {nome: list(lista) for nome, lista in atuais.items()}
+            categorias.setdefault(categoria, []).extend(palavras)
+            categorias = validar_categorias(categorias)
+            versao = self._salvar_configuracao(conn, CHAVE_CATEGORIAS_DESPESA,
+                                               json.dumps(categorias, ensure_ascii=False))
+            return versao, categorias
+        
+        versao, categorias = self.escritor.executar(_adicionar)
+        self._publicar_categorias(versao, categorias)
+        print(f"🏷️ Palavras-chave adicionadas a '{categoria}' (versão {versao})")
+        return {'versao': versao, 'categorias': categorias}
+    
+    def obter_estatisticas(self) -> Dict:
+        """
+        Obtém estatísticas do sistema
+        
+        Lê os contadores mantidos por triggers (ver contadores.py), sem
+        varrer as tabelas; `python contadores.py` os recalcula do zero.
+        """
+        with self.pool.conexao() as conn:
+            valores = contadores.ler(conn)
+        
+        def _por_prefixo(prefixo: str) -> Dict[str, int]:
+            return {chave[len(prefixo):]: total for chave, total in valores.items()
+                    if chave.startswith(prefixo) and total}
         
         return {
-            'total_contatos': total_contatos,
-            'total_mensagens': total_mensagens,
-            'total_despesas': total_despesas,
-            'despesas_pendentes': despesas_pendentes,
-            'mensagens_por_tipo': mensagens_por_tipo,
-            'pasta_raiz': str(self.pasta_raiz)
+            'total_contatos': valores.get('contatos', 0),
+            'total_mensagens': valores.get('mensagens', 0),
+            'total_despesas': valores.get('despesas', 0),
+            'despesas_pendentes': valores.get('despesas:pendente', 0),
+            'mensagens_por_tipo': _por_prefixo('mensagens:'),
+            'despesas_por_status': _por_prefixo('despesas:'),
+            'pasta_raiz': str(self.pasta_raiz),
+            # Repositório de blobs: espaço ocupado e espaço poupado pela deduplicação
+            'blobs': {
+                'total': valores.get('blobs', 0),
+                'bytes_armazenados': valores.get('blobs:bytes', 0),
+                'bytes_economizados': valores.get('blobs:economizados', 0)
+            },
+            'cache_contatos': {
+                **self.cache_contatos.estatisticas(),
+                'ultimo_contato_pendentes': len(self._ultimo_contato_pendente)
+            }
         }
+    
+    def fechar(self):
+        """Conclui as escritas pendentes e fecha as conexões com o banco"""
+        if self._thread_gravacao:
+            self._parar_gravacao.set()
+            self._thread_gravacao.join()
+            self._thread_gravacao = None
+        if self.escritor:
+            self.gravar_ultimo_contato()
+            self.escritor.fechar()
+        if self.pool:
+            self.pool.fechar()
 
 
 def exemplo_uso():
@@ -78,10 +78,10 @@ def verificar_estrutura():
         
         # Verificar subpastas
         subpastas = ["imagens", "documentos", "audios", "videos", "outros"]
-        print(f"\n📂 Subpastas criadas:")
+        print(f"\n📂 Subpastas (criadas no primeiro arquivo de cada tipo):")
         for subpasta in subpastas:
             sub_path = pasta_criada / subpasta
-            status = "✅" if sub_path.exists() else "❌"
+            status = "✅" if sub_path.exists() else "⏳"
             print(f"  {status} {subpasta}/")
             
         return True
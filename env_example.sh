@@ -2,6 +2,47 @@
 WEBHOOK_TOKEN=seu_token_webhook_seguro_aqui
 PASTA_RAIZ=arquivos_clientes
 DATABASE_PATH=whatsapp_dados.db
+# Repositório de blobs (padrão: pasta 'blobs' ao lado de PASTA_RAIZ; use o mesmo disco para hardlinks)
+# PASTA_BLOBS=storage/blobs
+# Layout das pastas de contatos: plano ou fragmentado (migrar com: python layout_pastas.py fragmentado)
+LAYOUT_PASTAS=plano
+
+# Banco de dados (conexões persistentes)
+DB_POOL_SIZE=8
+DB_TIMEOUT=30
+# Perfil de armazenamento: wal (leituras não bloqueiam escritas; synchronous=NORMAL,
+# o último commit pode se perder numa queda de energia, exceto a fila de webhooks) ou padrao
+DB_PERFIL=wal
+# Ajustes opcionais do perfil
+# DB_BUSY_TIMEOUT=5000
+# DB_MMAP_SIZE=268435456
+# DB_CACHE_SIZE=-65536
+
+# Cache de contatos em memória
+CACHE_CONTATOS_TAMANHO=10000
+CACHE_CONTATOS_TTL=300
+# Intervalo (s) para gravar o "último contato" acumulado
+ULTIMO_CONTATO_INTERVALO=5
+
+# Fila de webhooks (o /webhook responde 202 e processa em segundo plano)
+WEBHOOK_ASSINCRONO=True
+FILA_WORKERS=4
+FILA_MAX_TENTATIVAS=5
+# Espera (s) antes da 1ª nova tentativa; dobra a cada falha
+FILA_ATRASO_BASE=2
+FILA_RETENCAO_HORAS=24
+
+# Hash dos arquivos (sha256, blake2b, blake3, xxh3_128); não troque depois de armazenar arquivos
+HASH_ALGORITMO=sha256
+
+# Download de mídias (sessão compartilhada, retomada via Range)
+MIDIA_CONEXOES_POR_HOST=8
+MIDIA_TIMEOUT_CONEXAO=5
+MIDIA_TIMEOUT_LEITURA=30
+MIDIA_TENTATIVAS=3
+
+# Categorias de despesa (editáveis via /categorias): segundos entre verificações de nova versão
+CATEGORIAS_VERIFICAR_SEGUNDOS=5
 
 # Configurações da API
 API_HOST=0.0.0.0
@@ -16,4 +57,16 @@ ALLOWED_EXTENSIONS=jpg,jpeg,png,pdf,doc,docx,mp3,mp4,wav
 # Configurações de backup (opcional)
 BACKUP_INTERVAL=24h
 BACKUP_PATH=backups/
-AUTO_BACKUP=True
\ No newline at end of file
+AUTO_BACKUP=True
+# Incrementais (python backup_sistema.py incremental) antes de um novo backup completo
+BACKUP_INCREMENTAIS_MAX=6
+# Cópia do banco durante o backup (API de backup do SQLite, sem parar a API)
+BACKUP_PAGINAS_POR_PASSO=1024
+BACKUP_PAUSA_PASSO=0.05
+# Threads que leem e calculam o hash dos arquivos no backup (padrão: núcleos) e MB lidos à frente da gravação no zip
+# BACKUP_WORKERS=4
+BACKUP_MB_EM_MEMORIA=256
+# Retenção GFS (python backup_sistema.py reter): dias, semanas e meses com backup mantidos
+BACKUP_RETER_DIARIOS=7
+BACKUP_RETER_SEMANAIS=4
+BACKUP_RETER_MENSAIS=12